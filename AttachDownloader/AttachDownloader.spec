@@ -8,16 +8,25 @@
 block_cipher = None
 
 import sys
-from PyInstaller.utils.hooks import collect_submodules
+from PyInstaller.utils.hooks import collect_data_files, collect_submodules
 
 # Some google packages are dynamically imported; ensure they are collected
 hidden_imports = [
     'googleapiclient.discovery',
+    'googleapiclient.discovery_cache',
+    'google_auth_httplib2',
+    # Se importan dentro de main() para acelerar el arranque
+    'gmail_downloader.auth',
+    'gmail_downloader.downloader',
     'google.auth.transport.requests',
     'google.oauth2.credentials',
     'httplib2',
     'oauthlib',
     'requests',
+    # Perfilado (--profile / --trace-memory): se importan bajo demanda
+    'cProfile',
+    'pstats',
+    'tracemalloc',
 ]
 # Add any other dynamically imported submodules under google
 hidden_imports += collect_submodules('google')
@@ -27,7 +36,9 @@ a = Analysis(
     pathex=['.', 'src'],  # Añadir 'src' para que se resuelva el paquete local
     binaries=[],
     # Incluir el paquete local 'gmail_downloader' para asegurarnos que se empaqueta
-    datas=[('src/gmail_downloader', 'gmail_downloader')],
+    # y el documento de descubrimiento de Gmail, para no descargarlo en el primer arranque
+    datas=[('src/gmail_downloader', 'gmail_downloader')]
+    + collect_data_files('googleapiclient', includes=['discovery_cache/documents/gmail.v1.json']),
     hiddenimports=hidden_imports,
     hookspath=[],
     runtime_hooks=[],
@@ -0,0 +1,312 @@
+"""
+Benchmark de extremo a extremo del descargador sobre un buzón sintético
+
+Ejecuta GmailAttachmentDownloader con un FakeGmailService (benchmarks/fake_gmail.py)
+en cada modo de ejecución (secuencial, batch, concurrente, pipeline) y mide
+mensajes/s, adjuntos/s, MB/s y el pico de memoria (RSS). Cada modo se ejecuta
+en un subproceso para que el pico de RSS de uno no contamine al siguiente.
+
+Con --http el buzón se sirve con el emulador HTTP local (gmail_emulator.py)
+y el descargador usa el cliente real de googleapiclient contra él, de modo que
+también se miden la capa HTTP, el parseo JSON y el framing de los lotes.
+
+Los resultados se comparan con benchmarks/baseline.json (generado en la misma
+máquina con --save-baseline); si algún modo empeora más que la tolerancia,
+el script termina con código 1.
+
+Uso:
+    python benchmarks/bench_download.py [--messages 2000] [--latency-ms 2]
+    python benchmarks/bench_download.py --save-baseline
+    python benchmarks/bench_download.py --http --rate-429 0.01
+    python benchmarks/bench_download.py --modes sequential,pipeline --tolerance 0.3
+"""
+
+import argparse
+import contextlib
+import io
+import json
+import subprocess
+import sys
+import tempfile
+import time
+from pathlib import Path
+from typing import Dict, List, Optional
+
+BENCH_DIR = Path(__file__).resolve().parent
+sys.path.insert(0, str(BENCH_DIR.parent / "src"))
+sys.path.insert(0, str(BENCH_DIR))
+
+from fake_gmail import FakeGmailService, SyntheticMailbox  # noqa: E402
+from gmail_emulator import GmailEmulator, start_emulator  # noqa: E402
+
+
+# Opciones de [ADVANCED] de cada modo de ejecución
+MODES: Dict[str, Dict[str, object]] = {
+    "sequential": {"max_workers": 1, "batch_size": 1},
+    "batch": {"max_workers": 1, "batch_size": 50},
+    "concurrent": {"max_workers": 8, "batch_size": 1},
+    "concurrent_batch": {"max_workers": 4, "batch_size": 50},
+    "pipeline": {"use_pipeline": True, "batch_size": 50},
+}
+
+DEFAULT_BASELINE = BENCH_DIR / "baseline.json"
+
+# Métricas comparadas con la línea base: (clave, mayor es mejor)
+COMPARED = (("messages_per_s", True), ("attachments_per_s", True), ("mb_per_s", True), ("peak_rss_mb", False))
+
+CONFIG = """
+[DOWNLOADS]
+download_folder = {root}/downloads
+deduplicate = none
+
+[GMAIL_API]
+api_endpoint = {endpoint}
+max_emails_to_process = 0
+max_attachments_to_download = 0
+
+[FILTERS]
+allowed_extensions = pdf
+white_list = factura
+black_list = proforma
+case_sensitive_filters = False
+
+[SENDERS]
+whitelist_senders =
+blacklist_senders =
+
+[DATES]
+date_from =
+date_to =
+
+[LOGGING]
+log_successful_downloads = False
+log_filtered_files = False
+metrics_file =
+metrics_summary_file =
+
+[ADVANCED]
+http_transport = {transport}
+execution_mode = full
+history_file = {root}/history.db
+sync_state_file = {root}/sync_state.json
+journal_file = {root}/journal.json
+discovery_cache_file = {root}/gmail_discovery.json
+retry_delay = 0
+quota_units_per_second = {quota}
+max_concurrent_requests = 32
+pipeline_monitor_interval = 0
+{mode_options}
+"""
+
+
+def peak_rss_mb() -> Optional[float]:
+    """Pico de memoria residente del proceso (None si no se puede medir)"""
+    try:
+        import resource
+    except ImportError:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # Linux informa en KiB y macOS en bytes
+    return round(peak / 1024 / 1024 if sys.platform == "darwin" else peak / 1024, 1)
+
+
+def run_mode(mode: str, mailbox: Optional[SyntheticMailbox], quota: int = 1_000_000,
+             endpoint: Optional[str] = None, transport: str = "requests") -> dict:
+    """
+    Descarga el buzón sintético completo con las opciones de un modo
+
+    Args:
+        mode: Clave de MODES
+        mailbox: Buzón sintético servido en proceso (None si se usa endpoint)
+        quota: Unidades de cuota por segundo (alta para medir el propio código)
+        endpoint: URL del emulador HTTP en lugar del servicio en proceso
+        transport: Transporte HTTP con el emulador (requests o httplib2)
+
+    Returns:
+        dict: Estadísticas de la ejecución y rendimiento medido
+    """
+    from gmail_downloader.config import ConfigManager
+    from gmail_downloader.downloader import GmailAttachmentDownloader
+
+    with tempfile.TemporaryDirectory() as root:
+        mode_options = "\n".join(f"{key} = {value}" for key, value in MODES[mode].items())
+        config_file = Path(root) / "config.cfg"
+        config_file.write_text(
+            CONFIG.format(root=Path(root).as_posix(), quota=quota, endpoint=endpoint or "",
+                          transport=transport,
+                          mode_options=mode_options),
+            encoding="utf-8",
+        )
+        config = ConfigManager(str(config_file))
+        service_factory = None if endpoint else (lambda: FakeGmailService(mailbox))
+        downloader = GmailAttachmentDownloader(credentials=None, config=config, service_factory=service_factory)
+        # La salida por consola del descargador no forma parte de lo medido
+        start = time.perf_counter()
+        with contextlib.redirect_stdout(io.StringIO()):
+            try:
+                stats = downloader.download_all_attachments()
+            finally:
+                downloader.close()
+        elapsed = time.perf_counter() - start
+
+    return {
+        "mode": mode,
+        "seconds": round(elapsed, 3),
+        "messages": stats["total_emails"],
+        "attachments": stats["files_downloaded"],
+        "bytes": stats["bytes_downloaded"],
+        "messages_per_s": round(stats["total_emails"] / elapsed, 1),
+        "attachments_per_s": round(stats["files_downloaded"] / elapsed, 1),
+        "mb_per_s": round(stats["bytes_downloaded"] / elapsed / 1024 / 1024, 2),
+        "peak_rss_mb": peak_rss_mb(),
+        "api_calls": dict(sorted(mailbox.calls.items())) if mailbox else {},
+    }
+
+
+def mailbox_from_args(args) -> SyntheticMailbox:
+    """Crea el buzón sintético con los parámetros de la línea de comandos"""
+    return SyntheticMailbox(
+        messages=args.messages,
+        attachments=args.attachments,
+        median_kb=args.median_kb,
+        size_sigma=args.size_sigma,
+        max_kb=args.max_kb,
+        hit_rate=args.hit_rate,
+        latency_ms=args.latency_ms,
+        seed=args.seed,
+    )
+
+
+def run_isolated(mode: str, argv: List[str]) -> dict:
+    """Ejecuta un modo en un subproceso y devuelve su resultado"""
+    completed = subprocess.run(
+        [sys.executable, __file__, "--child", mode] + argv,
+        check=True, stdout=subprocess.PIPE, text=True,
+    )
+    return json.loads(completed.stdout.strip().splitlines()[-1])
+
+
+def compare(results: List[dict], baseline: dict, tolerance: float) -> List[str]:
+    """
+    Compara los resultados con la línea base
+
+    Returns:
+        List[str]: Descripción de cada regresión encontrada
+    """
+    regressions = []
+    for result in results:
+        reference = baseline.get("results", {}).get(result["mode"])
+        if not reference:
+            continue
+        for key, higher_is_better in COMPARED:
+            current, previous = result.get(key), reference.get(key)
+            if not current or not previous:
+                continue
+            change = (current - previous) / previous
+            if (higher_is_better and change < -tolerance) or (not higher_is_better and change > tolerance):
+                regressions.append(f"{result['mode']}: {key} {previous} -> {current} ({change:+.0%})")
+    return regressions
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("--messages", type=int, default=2000, help="Mensajes del buzón sintético")
+    parser.add_argument("--attachments", default="0:1,1:5,2:3,3:1",
+                        help="Distribución de adjuntos por mensaje (valor:peso,...)")
+    parser.add_argument("--median-kb", type=float, default=120, help="Mediana del tamaño de adjunto")
+    parser.add_argument("--size-sigma", type=float, default=1.0, help="Dispersión log-normal de tamaños")
+    parser.add_argument("--max-kb", type=float, default=10240, help="Tamaño máximo de adjunto")
+    parser.add_argument("--hit-rate", type=float, default=0.6, help="Fracción de adjuntos que pasan los filtros")
+    parser.add_argument("--latency-ms", type=float, default=2.0, help="Latencia simulada por llamada HTTP")
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--quota", type=int, default=1_000_000, help="Unidades de cuota por segundo")
+    parser.add_argument("--http", action="store_true", help="Servir el buzón con el emulador HTTP local")
+    parser.add_argument("--transport", default="requests", choices=("requests", "httplib2"),
+                        help="Con --http, transporte HTTP del descargador")
+    parser.add_argument("--rate-429", type=float, default=0.0, help="Con --http, fracción de operaciones con 429")
+    parser.add_argument("--rate-5xx", type=float, default=0.0, help="Con --http, fracción de operaciones con 503")
+    parser.add_argument("--modes", default=",".join(MODES), help="Modos a medir, separados por comas")
+    parser.add_argument("--baseline", type=Path, default=DEFAULT_BASELINE, help="Archivo de línea base")
+    parser.add_argument("--save-baseline", action="store_true", help="Guardar los resultados como línea base")
+    parser.add_argument("--tolerance", type=float, default=0.2, help="Empeoramiento admitido (0.2 = 20%%)")
+    parser.add_argument("--child", help=argparse.SUPPRESS)
+    parser.add_argument("--endpoint", help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.child:
+        mailbox = None if args.endpoint else mailbox_from_args(args)
+        print(json.dumps(run_mode(args.child, mailbox, args.quota, args.endpoint, args.transport)))
+        return
+
+    modes = [mode.strip() for mode in args.modes.split(",") if mode.strip()]
+    unknown = [mode for mode in modes if mode not in MODES]
+    if unknown:
+        parser.error(f"Modos desconocidos: {', '.join(unknown)} (usa {', '.join(MODES)})")
+
+    mailbox = mailbox_from_args(args)
+    print(f"Buzón sintético: {args.messages} mensajes, {mailbox.expected_files} adjuntos a descargar "
+          f"({mailbox.expected_bytes / 1024 / 1024:.1f} MB), latencia {args.latency_ms} ms")
+    emulator = server = None
+    if args.http:
+        # La latencia la pone el emulador; el buzón en proceso no la aplica
+        emulator = GmailEmulator(mailbox, latency_ms=args.latency_ms, rate_429=args.rate_429,
+                                 rate_5xx=args.rate_5xx, seed=args.seed)
+        server = start_emulator(emulator)
+        print(f"Emulador HTTP en http://127.0.0.1:{server.server_address[1]}/")
+    else:
+        del mailbox
+
+    # Todas las opciones salvo las propias del script padre se pasan al subproceso
+    child_argv = [
+        "--messages", str(args.messages), "--attachments", args.attachments,
+        "--median-kb", str(args.median_kb), "--size-sigma", str(args.size_sigma),
+        "--max-kb", str(args.max_kb), "--hit-rate", str(args.hit_rate),
+        "--latency-ms", str(args.latency_ms), "--seed", str(args.seed), "--quota", str(args.quota),
+        "--transport", args.transport,
+    ]
+    if server is not None:
+        child_argv += ["--endpoint", f"http://127.0.0.1:{server.server_address[1]}/"]
+    results = []
+    print(f"\n{'modo':<18}{'s':>8}{'msg/s':>10}{'adj/s':>10}{'MB/s':>9}{'RSS MB':>9}")
+    for mode in modes:
+        calls_before = emulator.stats()["calls"] if emulator else {}
+        result = run_isolated(mode, child_argv)
+        if emulator:
+            result["api_calls"] = {method: count - calls_before.get(method, 0)
+                                   for method, count in sorted(emulator.stats()["calls"].items())}
+        results.append(result)
+        rss = f"{result['peak_rss_mb']:.0f}" if result["peak_rss_mb"] is not None else "-"
+        print(f"{mode:<18}{result['seconds']:>8.2f}{result['messages_per_s']:>10.1f}"
+              f"{result['attachments_per_s']:>10.1f}{result['mb_per_s']:>9.2f}{rss:>9}")
+
+    parameters = {key: value for key, value in vars(args).items()
+                  if key not in ("modes", "baseline", "save_baseline", "tolerance", "child", "endpoint")}
+    if server is not None:
+        server.shutdown()
+    if args.save_baseline:
+        args.baseline.write_text(json.dumps({
+            "created_at": time.strftime("%Y-%m-%dT%H:%M:%S"),
+            "parameters": parameters,
+            "results": {result["mode"]: result for result in results},
+        }, indent=2) + "\n", encoding="utf-8")
+        print(f"\nLínea base guardada en {args.baseline}")
+        return
+
+    if not args.baseline.exists():
+        print(f"\nSin línea base ({args.baseline}); genera una con --save-baseline")
+        return
+
+    baseline = json.loads(args.baseline.read_text(encoding="utf-8"))
+    if baseline.get("parameters") != parameters:
+        print("\n⚠️ La línea base se generó con otros parámetros; la comparación es orientativa")
+    regressions = compare(results, baseline, args.tolerance)
+    if regressions:
+        print(f"\n❌ Regresiones (tolerancia {args.tolerance:.0%}):")
+        for line in regressions:
+            print(f"   {line}")
+        sys.exit(1)
+    print(f"\n✅ Sin regresiones frente a {args.baseline} (tolerancia {args.tolerance:.0%})")
+
+
+if __name__ == "__main__":
+    main()
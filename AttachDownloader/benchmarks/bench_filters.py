@@ -0,0 +1,92 @@
+"""
+Micro-benchmark del filtrado de nombres de adjuntos
+
+Compara el filtrado anterior (propiedades de ConfigManager leídas y listas
+reconstruidas por cada adjunto) con FilterPlan compilado una sola vez.
+
+Uso:
+    python benchmarks/bench_filters.py [--count 1000000]
+"""
+
+import argparse
+import random
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent / "src"))
+
+from gmail_downloader.config import ConfigManager  # noqa: E402
+from gmail_downloader.filters import FilterPlan  # noqa: E402
+
+
+CONFIG = """
+[FILTERS]
+allowed_extensions = pdf, xml, xlsx, docx
+white_list = factura, invoice, receipt, recibo, albaran, ticket
+black_list = proforma, draft, borrador, temporal
+case_sensitive_filters = False
+"""
+
+WORDS = ["Factura", "invoice", "Receipt", "proforma", "draft", "informe", "foto", "contrato", "nomina"]
+EXTENSIONS = ["pdf", "PDF", "xml", "jpg", "png", "xlsx", "docx", "zip"]
+
+
+def synthetic_filenames(count: int, seed: int = 42) -> list:
+    """Genera nombres de adjunto sintéticos con una mezcla realista de aciertos"""
+    rng = random.Random(seed)
+    return [
+        f"{rng.choice(WORDS)}_{rng.randint(1, 99999)}_{rng.choice(WORDS)}.{rng.choice(EXTENSIONS)}"
+        for _ in range(count)
+    ]
+
+
+def legacy_accepts(config: ConfigManager, filename: str) -> bool:
+    """Réplica del filtrado anterior de _download_attachment"""
+    if config.allowed_extensions:
+        file_ext = filename.rsplit(".", 1)[-1].lower() if "." in filename else ""
+        if file_ext not in config.allowed_extensions:
+            return False
+    filename_check = filename if config.case_sensitive_filters else filename.lower()
+    if config.white_list:
+        white_list = config.white_list if config.case_sensitive_filters else [w.lower() for w in config.white_list]
+        if not any(word in filename_check for word in white_list):
+            return False
+    if config.black_list:
+        black_list = config.black_list if config.case_sensitive_filters else [b.lower() for b in config.black_list]
+        if any(word in filename_check for word in black_list):
+            return False
+    return True
+
+
+def timed(label: str, func, filenames: list) -> tuple:
+    """Ejecuta func sobre todos los nombres e imprime el tiempo"""
+    start = time.perf_counter()
+    accepted = sum(1 for filename in filenames if func(filename))
+    elapsed = time.perf_counter() - start
+    print(f"{label:<12} {elapsed:8.3f} s  {len(filenames) / elapsed:12,.0f} nombres/s  aceptados={accepted}")
+    return elapsed, accepted
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Micro-benchmark de FilterPlan")
+    parser.add_argument("--count", type=int, default=1_000_000, help="Nombres sintéticos a filtrar")
+    args = parser.parse_args()
+
+    with tempfile.NamedTemporaryFile("w", suffix=".cfg", delete=False, encoding="utf-8") as f:
+        f.write(CONFIG)
+    config = ConfigManager(f.name)
+    plan = FilterPlan(config)
+    filenames = synthetic_filenames(args.count)
+
+    legacy_time, legacy_accepted = timed("anterior", lambda name: legacy_accepts(config, name), filenames)
+    plan_time, plan_accepted = timed("FilterPlan", plan.accepts_filename, filenames)
+
+    if legacy_accepted != plan_accepted:
+        sys.exit("❌ FilterPlan no acepta los mismos nombres que el filtrado anterior")
+    print(f"⚡ Mejora: x{legacy_time / plan_time:.1f}")
+
+
+if __name__ == "__main__":
+    main()
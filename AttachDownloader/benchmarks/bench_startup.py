@@ -0,0 +1,134 @@
+"""
+Benchmark de arranque: tiempo hasta la primera petición a Gmail API
+
+Lanza el programa completo (python src/main.py o el ejecutable de PyInstaller)
+en una carpeta temporal cuya config/config.cfg apunta al emulador local
+(gmail_emulator.py) y mide:
+
+    --help             tiempo hasta que el proceso termina
+    primera petición   desde que se lanza el proceso hasta que el emulador
+                       recibe la primera operación de la API
+    total              ejecución completa sobre un buzón pequeño
+
+La primera ejecución crea la copia fijada del documento de descubrimiento;
+las siguientes la reutilizan, como en un uso normal.
+
+Uso:
+    python benchmarks/bench_startup.py [--repeat 5]
+    python benchmarks/bench_startup.py --exe dist/AttachDownloader/AttachDownloader
+"""
+
+import argparse
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+from pathlib import Path
+from typing import List, Optional
+
+BENCH_DIR = Path(__file__).resolve().parent
+PROJECT_DIR = BENCH_DIR.parent
+sys.path.insert(0, str(BENCH_DIR))
+
+from fake_gmail import SyntheticMailbox  # noqa: E402
+from gmail_emulator import GmailEmulator, start_emulator  # noqa: E402
+
+
+# Ejecutable de PyInstaller por defecto (se mide también si existe)
+DEFAULT_EXE = PROJECT_DIR / "dist" / "AttachDownloader" / ("AttachDownloader.exe" if sys.platform == "win32" else "AttachDownloader")
+
+CONFIG = """
+[GMAIL_API]
+api_endpoint = {endpoint}
+
+[FILTERS]
+allowed_extensions = pdf
+white_list = factura
+black_list =
+
+[SENDERS]
+blacklist_senders =
+
+[DATES]
+date_from =
+date_to =
+
+[LOGGING]
+log_successful_downloads = False
+
+[ADVANCED]
+quota_units_per_second = 1000000
+retry_delay = 0
+"""
+
+
+def run_once(command: List[str], workdir: Path, messages: int) -> dict:
+    """
+    Ejecuta el programa una vez contra un emulador nuevo
+
+    Returns:
+        dict: Segundos hasta la primera petición y hasta terminar
+    """
+    emulator = GmailEmulator(SyntheticMailbox(messages=messages, median_kb=4, max_kb=16))
+    server = start_emulator(emulator)
+    try:
+        (workdir / "config" / "config.cfg").write_text(
+            CONFIG.format(endpoint=f"http://127.0.0.1:{server.server_address[1]}/"), encoding="utf-8"
+        )
+        start = time.perf_counter()
+        subprocess.run(command, cwd=workdir, check=True, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+        total = time.perf_counter() - start
+    finally:
+        server.shutdown()
+    first = emulator.first_request_at - start if emulator.first_request_at else None
+    return {"first_request": first, "total": total}
+
+
+def time_help(command: List[str], workdir: Path) -> float:
+    """Segundos de una ejecución con --help"""
+    start = time.perf_counter()
+    subprocess.run(command + ["--help"], cwd=workdir, check=True, stdout=subprocess.DEVNULL)
+    return time.perf_counter() - start
+
+
+def summarize(values: List[Optional[float]]) -> str:
+    """Primera ejecución, mediana y mínimo de las siguientes (en ms)"""
+    values = [value for value in values if value is not None]
+    if not values:
+        return "-"
+    rest = values[1:] or values
+    return (f"primera {values[0] * 1000:7.0f} ms  mediana {statistics.median(rest) * 1000:7.0f} ms  "
+            f"mínimo {min(rest) * 1000:7.0f} ms")
+
+
+def benchmark(name: str, command: List[str], repeat: int, messages: int) -> None:
+    """Mide un programa y muestra los resultados"""
+    with tempfile.TemporaryDirectory() as tmp:
+        workdir = Path(tmp)
+        (workdir / "config").mkdir()
+        runs = [run_once(command, workdir, messages) for _ in range(repeat)]
+        helps = [time_help(command, workdir) for _ in range(repeat)]
+    print(f"\n{name}: {' '.join(command)}")
+    print(f"   --help             {summarize(helps)}")
+    print(f"   primera petición   {summarize([run['first_request'] for run in runs])}")
+    print(f"   total              {summarize([run['total'] for run in runs])}")
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("--repeat", type=int, default=5, help="Ejecuciones de cada medida")
+    parser.add_argument("--messages", type=int, default=5, help="Mensajes del buzón del emulador")
+    parser.add_argument("--exe", type=Path, help=f"Ejecutable de PyInstaller (por defecto {DEFAULT_EXE}, si existe)")
+    args = parser.parse_args()
+
+    benchmark("Código fuente", [sys.executable, str(PROJECT_DIR / "src" / "main.py")], args.repeat, args.messages)
+    exe = args.exe or (DEFAULT_EXE if DEFAULT_EXE.exists() else None)
+    if exe:
+        benchmark("PyInstaller", [str(Path(exe).resolve())], args.repeat, args.messages)
+    else:
+        print(f"\n(Sin ejecutable de PyInstaller en {DEFAULT_EXE}: genera uno con BUILD.md o usa --exe)")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,236 @@
+"""
+Buzón sintético de Gmail en memoria para benchmarks
+
+FakeGmailService imita la parte del cliente de googleapiclient que usa
+GmailAttachmentDownloader (users().messages().list/get, attachments().get,
+history().list, getProfile y peticiones batch) sobre un SyntheticMailbox
+generado a partir de unos parámetros: número de mensajes, distribución de
+adjuntos por mensaje y de tamaños, tasa de acierto de los filtros y latencia
+por llamada.
+"""
+
+import base64
+import math
+import os
+import random
+import threading
+import time
+from typing import Callable, Dict, List, Optional
+
+
+# Dirección de todos los remitentes sintéticos (dominio compartido)
+SENDER_DOMAIN = "proveedor.example.com"
+
+# Nombres que pasan los filtros del benchmark y nombres que no
+MATCHING_NAME = "factura_{index}.pdf"
+FILTERED_NAMES = ("foto_{index}.jpg", "proforma_{index}.pdf", "informe_{index}.docx")
+
+# internalDate base: 2025-01-01 00:00:00 UTC (ms)
+BASE_INTERNAL_DATE = 1735689600000
+
+
+def parse_weights(spec: str) -> Dict[int, float]:
+    """
+    Interpreta una distribución discreta "valor:peso,valor:peso"
+
+    Args:
+        spec: Por ejemplo "0:1,1:5,2:3,3:1"
+
+    Returns:
+        Dict[int, float]: Peso de cada valor
+    """
+    weights = {}
+    for item in spec.split(","):
+        value, weight = item.split(":")
+        weights[int(value)] = float(weight)
+    return weights
+
+
+class SyntheticMailbox:
+    """Buzón generado de forma determinista a partir de una semilla"""
+
+    def __init__(self, messages: int = 1000, attachments: str = "0:1,1:5,2:3,3:1",
+                 median_kb: float = 120, size_sigma: float = 1.0, max_kb: float = 10240,
+                 hit_rate: float = 0.6, latency_ms: float = 0.0, seed: int = 42):
+        """
+        Genera el buzón
+
+        Args:
+            messages: Número de mensajes
+            attachments: Distribución de adjuntos por mensaje ("valor:peso,...")
+            median_kb: Mediana del tamaño de los adjuntos (distribución log-normal)
+            size_sigma: Dispersión de la log-normal de tamaños
+            max_kb: Tamaño máximo de un adjunto
+            hit_rate: Fracción de adjuntos que pasan los filtros del benchmark
+            latency_ms: Latencia simulada de cada llamada HTTP (un lote cuenta como una)
+            seed: Semilla del generador
+        """
+        rng = random.Random(seed)
+        weights = parse_weights(attachments)
+        counts, count_weights = list(weights), list(weights.values())
+        self.latency = latency_ms / 1000
+        self.messages: Dict[str, dict] = {}
+        self.order: List[str] = []
+        self.expected_files = 0
+        self.expected_bytes = 0
+
+        for index in range(messages):
+            msg_id = f"{index:012x}"
+            parts = []
+            for part_index in range(rng.choices(counts, count_weights)[0]):
+                size_kb = min(rng.lognormvariate(math.log(median_kb), size_sigma), max_kb)
+                size = max(int(size_kb * 1024), 1)
+                if rng.random() < hit_rate:
+                    filename = MATCHING_NAME.format(index=index * 10 + part_index)
+                    self.expected_files += 1
+                    self.expected_bytes += size
+                else:
+                    filename = rng.choice(FILTERED_NAMES).format(index=index * 10 + part_index)
+                parts.append({
+                    "partId": str(part_index + 1),
+                    "filename": filename,
+                    "body": {"attachmentId": f"att-{msg_id}-{part_index}", "size": size},
+                })
+            self.messages[msg_id] = {
+                "id": msg_id,
+                "internalDate": str(BASE_INTERNAL_DATE + index * 3600 * 1000),
+                "payload": {
+                    "headers": [
+                        {"name": "From", "value": f"Proveedor {index % 50} <facturas{index % 50}@{SENDER_DOMAIN}>"},
+                        {"name": "Subject", "value": f"Factura {index}"},
+                    ],
+                    "parts": parts,
+                },
+            }
+            self.order.append(msg_id)
+
+        # Un único bloque aleatorio del que se recortan todos los adjuntos
+        largest = max((part["body"]["size"] for msg in self.messages.values()
+                       for part in msg["payload"]["parts"]), default=1)
+        self._blob = base64.urlsafe_b64encode(os.urandom(largest + 3)).decode("ascii")
+        self._attachments = {
+            part["body"]["attachmentId"]: part["body"]["size"]
+            for msg in self.messages.values() for part in msg["payload"]["parts"]
+        }
+        self.calls: Dict[str, int] = {}
+        self._lock = threading.Lock()
+
+    def count(self, method: str) -> None:
+        """Anota una llamada a un método"""
+        with self._lock:
+            self.calls[method] = self.calls.get(method, 0) + 1
+
+    def list_page(self, max_results: int = 100, page_token: Optional[str] = None) -> dict:
+        """Página de messages.list"""
+        start = int(page_token or 0)
+        end = min(start + max_results, len(self.order))
+        page = {"messages": [{"id": msg_id} for msg_id in self.order[start:end]],
+                "resultSizeEstimate": len(self.order)}
+        if end < len(self.order):
+            page["nextPageToken"] = str(end)
+        return page
+
+    def attachment(self, attachment_id: str) -> dict:
+        """Respuesta de attachments.get (base64 url-safe)"""
+        size = self._attachments[attachment_id]
+        return {"size": size, "data": self._blob[:4 * math.ceil(size / 3)]}
+
+    def profile(self) -> dict:
+        """Respuesta de getProfile"""
+        return {"emailAddress": "benchmark@example.com", "historyId": "1000",
+                "messagesTotal": len(self.order)}
+
+
+class FakeRequest:
+    """HttpRequest simulada: ejecutar espera la latencia y devuelve la respuesta"""
+
+    def __init__(self, mailbox: SyntheticMailbox, method: str, respond: Callable[[], dict]):
+        self.mailbox = mailbox
+        self.method = method
+        self.respond = respond
+
+    def execute(self, latency: bool = True) -> dict:
+        self.mailbox.count(self.method)
+        if latency and self.mailbox.latency:
+            time.sleep(self.mailbox.latency)
+        return self.respond()
+
+
+class FakeBatch:
+    """BatchHttpRequest simulada: una sola latencia para todo el lote"""
+
+    def __init__(self, mailbox: SyntheticMailbox, callback):
+        self.mailbox = mailbox
+        self.callback = callback
+        self.requests = []
+
+    def add(self, request: FakeRequest, request_id: str) -> None:
+        self.requests.append((request_id, request))
+
+    def execute(self) -> None:
+        self.mailbox.count("batch")
+        if self.mailbox.latency:
+            time.sleep(self.mailbox.latency)
+        for request_id, request in self.requests:
+            try:
+                self.callback(request_id, request.execute(latency=False), None)
+            except Exception as e:
+                self.callback(request_id, None, e)
+
+
+class _Attachments:
+    def __init__(self, mailbox):
+        self.mailbox = mailbox
+
+    def get(self, userId, messageId, id):
+        return FakeRequest(self.mailbox, "attachments.get", lambda: self.mailbox.attachment(id))
+
+
+class _Messages:
+    def __init__(self, mailbox):
+        self.mailbox = mailbox
+
+    def list(self, userId, maxResults=100, q=None, pageToken=None, **kwargs):
+        return FakeRequest(self.mailbox, "messages.list",
+                           lambda: self.mailbox.list_page(maxResults, pageToken))
+
+    def get(self, userId, id, **kwargs):
+        return FakeRequest(self.mailbox, "messages.get", lambda: self.mailbox.messages[id])
+
+    def attachments(self):
+        return _Attachments(self.mailbox)
+
+
+class _History:
+    def __init__(self, mailbox):
+        self.mailbox = mailbox
+
+    def list(self, userId, startHistoryId=None, pageToken=None, **kwargs):
+        return FakeRequest(self.mailbox, "history.list", lambda: {"historyId": "1000"})
+
+
+class _Users:
+    def __init__(self, mailbox):
+        self.mailbox = mailbox
+
+    def getProfile(self, userId):
+        return FakeRequest(self.mailbox, "getProfile", self.mailbox.profile)
+
+    def messages(self):
+        return _Messages(self.mailbox)
+
+    def history(self):
+        return _History(self.mailbox)
+
+
+class FakeGmailService:
+    """Sustituto del Resource de build("gmail", "v1") sobre un SyntheticMailbox"""
+
+    def __init__(self, mailbox: SyntheticMailbox):
+        self.mailbox = mailbox
+
+    def users(self):
+        return _Users(self.mailbox)
+
+    def new_batch_http_request(self, callback=None):
+        return FakeBatch(self.mailbox, callback)
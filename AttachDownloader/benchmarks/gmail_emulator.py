@@ -0,0 +1,344 @@
+"""
+Emulador HTTP local de Gmail API para pruebas de carga e inyección de fallos
+
+Sirve sobre un SyntheticMailbox (benchmarks/fake_gmail.py) el subconjunto de
+la API REST de Gmail que usa el proyecto:
+
+    GET  /gmail/v1/users/{userId}/profile
+    GET  /gmail/v1/users/{userId}/messages
+    GET  /gmail/v1/users/{userId}/messages/{id}
+    GET  /gmail/v1/users/{userId}/messages/{messageId}/attachments/{id}
+    GET  /gmail/v1/users/{userId}/history
+    POST /batch  (multipart/mixed, igual que BatchHttpRequest)
+    GET  /__stats  (llamadas, unidades de cuota y fallos inyectados)
+
+Cada petición HTTP espera la latencia configurada (un lote cuenta como una) y
+cada operación, también dentro de un lote, puede fallar con 429 o 5xx según
+las tasas indicadas y gasta unidades de una cuota por usuario y segundo.
+La consulta q= de messages.list se ignora: el buzón sintético ya es el resultado.
+
+Para apuntar el descargador al emulador, en config/config.cfg:
+
+    [GMAIL_API]
+    api_endpoint = http://127.0.0.1:8765/
+
+Uso:
+    python benchmarks/gmail_emulator.py [--port 8765] [--messages 10000]
+        [--latency-ms 20] [--rate-429 0.01] [--rate-5xx 0.005] [--quota 250]
+"""
+
+import argparse
+import json
+import random
+import re
+import sys
+import threading
+import time
+from email.parser import BytesParser
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from pathlib import Path
+from typing import Dict, Optional, Tuple
+from urllib.parse import parse_qs, urlsplit
+
+BENCH_DIR = Path(__file__).resolve().parent
+sys.path.insert(0, str(BENCH_DIR.parent / "src"))
+sys.path.insert(0, str(BENCH_DIR))
+
+from fake_gmail import SyntheticMailbox  # noqa: E402
+from gmail_downloader.scheduler import DEFAULT_QUOTA_UNITS, QUOTA_UNITS  # noqa: E402
+
+
+# Rutas de la API: (método HTTP, patrón, método de Gmail API)
+ROUTES = (
+    ("GET", re.compile(r"^/gmail/v1/users/([^/]+)/profile$"), "getProfile"),
+    ("GET", re.compile(r"^/gmail/v1/users/([^/]+)/messages$"), "messages.list"),
+    ("GET", re.compile(r"^/gmail/v1/users/([^/]+)/messages/([^/]+)$"), "messages.get"),
+    ("GET", re.compile(r"^/gmail/v1/users/([^/]+)/messages/([^/]+)/attachments/([^/]+)$"), "attachments.get"),
+    ("GET", re.compile(r"^/gmail/v1/users/([^/]+)/history$"), "history.list"),
+)
+
+# Errores inyectados, con el formato de error de Google APIs
+ERRORS = {
+    429: ("rateLimitExceeded", "User-rate limit exceeded"),
+    503: ("backendError", "The service is currently unavailable."),
+    404: ("notFound", "Requested entity was not found."),
+}
+
+
+def error_body(status: int) -> dict:
+    """Cuerpo JSON de un error de Google APIs"""
+    reason, message = ERRORS[status]
+    return {"error": {"code": status, "message": message,
+                      "errors": [{"domain": "global", "reason": reason, "message": message}]}}
+
+
+class QuotaLedger:
+    """Cubo de tokens de unidades de cuota por usuario (None = sin límite)"""
+
+    def __init__(self, units_per_second: Optional[int]):
+        self.rate = units_per_second
+        self._lock = threading.Lock()
+        self._buckets: Dict[str, Tuple[float, float]] = {}
+
+    def take(self, user: str, units: int) -> bool:
+        """Gasta unidades de un usuario; False si no hay suficientes"""
+        if not self.rate:
+            return True
+        now = time.monotonic()
+        with self._lock:
+            tokens, updated = self._buckets.get(user, (float(self.rate), now))
+            tokens = min(float(self.rate), tokens + (now - updated) * self.rate)
+            if tokens < units:
+                self._buckets[user] = (tokens, now)
+                return False
+            self._buckets[user] = (tokens - units, now)
+            return True
+
+
+class GmailEmulator:
+    """Lógica del emulador, independiente del servidor HTTP"""
+
+    def __init__(self, mailbox: SyntheticMailbox, latency_ms: float = 0.0, jitter_ms: float = 0.0,
+                 rate_429: float = 0.0, rate_5xx: float = 0.0, quota: Optional[int] = None,
+                 seed: int = 42):
+        """
+        Inicializa el emulador
+
+        Args:
+            mailbox: Buzón sintético servido
+            latency_ms: Latencia fija de cada petición HTTP
+            jitter_ms: Variación aleatoria máxima sumada a la latencia
+            rate_429: Fracción de operaciones que fallan con 429
+            rate_5xx: Fracción de operaciones que fallan con 503
+            quota: Unidades de cuota por usuario y segundo (None = sin límite)
+            seed: Semilla de los fallos inyectados
+        """
+        self.mailbox = mailbox
+        self.latency = latency_ms / 1000
+        self.jitter = jitter_ms / 1000
+        self.rate_429 = rate_429
+        self.rate_5xx = rate_5xx
+        self.quota = QuotaLedger(quota)
+        self._random = random.Random(seed)
+        self._lock = threading.Lock()
+        self.calls: Dict[str, int] = {}
+        self.statuses: Dict[str, int] = {}
+        self.units: Dict[str, int] = {}
+        # perf_counter() de la primera operación recibida (tiempo hasta la primera petición)
+        self.first_request_at: Optional[float] = None
+
+    def _record(self, key: str, counter: Dict[str, int], amount: int = 1) -> None:
+        with self._lock:
+            counter[key] = counter.get(key, 0) + amount
+
+    def count_connection(self) -> None:
+        """Anota una conexión TCP nueva"""
+        self._record("connections", self.calls)
+
+    def wait(self) -> None:
+        """Latencia simulada de una petición HTTP"""
+        delay = self.latency + (self._random.uniform(0, self.jitter) if self.jitter else 0.0)
+        if delay:
+            time.sleep(delay)
+
+    def dispatch(self, method: str, target: str) -> Tuple[int, dict]:
+        """
+        Atiende una operación de la API
+
+        Args:
+            method: Método HTTP
+            target: Ruta con query string
+
+        Returns:
+            Tuple[int, dict]: Código de estado y cuerpo JSON
+        """
+        parts = urlsplit(target)
+        query = {key: values[-1] for key, values in parse_qs(parts.query).items()}
+        for route_method, pattern, api_method in ROUTES:
+            match = pattern.match(parts.path)
+            if route_method == method and match:
+                break
+        else:
+            return 404, error_body(404)
+
+        self._record(api_method, self.calls)
+        if self.first_request_at is None:
+            self.first_request_at = time.perf_counter()
+        status, body = self._inject(match.group(1), api_method)
+        if status == 200:
+            status, body = self._respond(api_method, match.groups(), query)
+        self._record(str(status), self.statuses)
+        return status, body
+
+    def _inject(self, user: str, api_method: str) -> Tuple[int, Optional[dict]]:
+        """Aplica la cuota y los fallos inyectados a una operación"""
+        units = QUOTA_UNITS.get(api_method, DEFAULT_QUOTA_UNITS)
+        if not self.quota.take(user, units):
+            return 429, error_body(429)
+        self._record(api_method, self.units, units)
+        with self._lock:
+            roll = self._random.random()
+        if roll < self.rate_429:
+            return 429, error_body(429)
+        if roll < self.rate_429 + self.rate_5xx:
+            return 503, error_body(503)
+        return 200, None
+
+    def _respond(self, api_method: str, groups: tuple, query: dict) -> Tuple[int, dict]:
+        """Respuesta correcta de una operación"""
+        mailbox = self.mailbox
+        if api_method == "getProfile":
+            return 200, mailbox.profile()
+        if api_method == "messages.list":
+            return 200, mailbox.list_page(int(query.get("maxResults", 100)), query.get("pageToken"))
+        if api_method == "history.list":
+            return 200, {"historyId": mailbox.profile()["historyId"]}
+        if api_method == "messages.get":
+            message = mailbox.messages.get(groups[1])
+            return (200, message) if message else (404, error_body(404))
+        try:
+            return 200, mailbox.attachment(groups[2])
+        except KeyError:
+            return 404, error_body(404)
+
+    def batch(self, content_type: str, body: bytes) -> bytes:
+        """
+        Atiende una petición batch multipart/mixed
+
+        Args:
+            content_type: Cabecera Content-Type (con el boundary)
+            body: Cuerpo de la petición
+
+        Returns:
+            bytes: Cuerpo multipart/mixed de la respuesta (mismo boundary)
+        """
+        self._record("batch", self.calls)
+        message = BytesParser().parsebytes(b"Content-Type: " + content_type.encode() + b"\r\n\r\n" + body)
+        boundary = message.get_boundary()
+        chunks = []
+        for part in message.get_payload():
+            request_line = part.get_payload().lstrip().split("\n", 1)[0]
+            method, target, _ = request_line.split(" ", 2)
+            status, payload = self.dispatch(method, target)
+            content = json.dumps(payload)
+            content_id = part["Content-ID"][1:-1]
+            chunks.append(
+                f"--{boundary}\r\nContent-Type: application/http\r\n"
+                f"Content-ID: <response-{content_id}>\r\n\r\n"
+                f"HTTP/1.1 {status} {'OK' if status == 200 else 'Error'}\r\n"
+                f"Content-Type: application/json; charset=UTF-8\r\n"
+                f"Content-Length: {len(content)}\r\n\r\n{content}\r\n"
+            )
+        chunks.append(f"--{boundary}--\r\n")
+        return "".join(chunks).encode("utf-8")
+
+    def stats(self) -> dict:
+        """Llamadas por método, respuestas por código y unidades de cuota gastadas"""
+        with self._lock:
+            return {"calls": dict(self.calls), "statuses": dict(self.statuses),
+                    "quota_units": dict(self.units)}
+
+
+class EmulatorHandler(BaseHTTPRequestHandler):
+    """Manejador HTTP/1.1 con keep-alive"""
+
+    protocol_version = "HTTP/1.1"
+    # Cabeceras y cuerpo en un solo envío: con keep-alive, Nagle más el ACK
+    # retardado añadiría ~40 ms a cada respuesta
+    disable_nagle_algorithm = True
+    emulator: GmailEmulator = None
+
+    def setup(self):
+        super().setup()
+        # Conexiones TCP abiertas por los clientes (keep-alive las reutiliza)
+        self.emulator.count_connection()
+
+    def do_GET(self):
+        self.emulator.wait()
+        if self.path == "/__stats":
+            self._send(200, "application/json", json.dumps(self.emulator.stats()).encode())
+            return
+        status, body = self.emulator.dispatch("GET", self.path)
+        self._send(status, "application/json; charset=UTF-8", json.dumps(body).encode())
+
+    def do_POST(self):
+        body = self.rfile.read(int(self.headers.get("Content-Length", 0)))
+        self.emulator.wait()
+        if urlsplit(self.path).path.rstrip("/") not in ("/batch", "/batch/gmail/v1"):
+            self._send(404, "application/json", json.dumps(error_body(404)).encode())
+            return
+        content_type = self.headers.get("Content-Type", "")
+        response = self.emulator.batch(content_type, body)
+        boundary = BytesParser().parsebytes(b"Content-Type: " + content_type.encode() + b"\r\n\r\n").get_boundary()
+        self._send(200, f'multipart/mixed; boundary="{boundary}"', response)
+
+    def _send(self, status: int, content_type: str, body: bytes) -> None:
+        self.send_response(status)
+        self.send_header("Content-Type", content_type)
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        # Sin una línea por petición: a escala de producción sería el cuello de botella
+        pass
+
+
+def start_emulator(emulator: GmailEmulator, host: str = "127.0.0.1", port: int = 0) -> ThreadingHTTPServer:
+    """
+    Arranca el emulador en un hilo en segundo plano
+
+    Args:
+        emulator: Lógica del emulador
+        host: Dirección de escucha
+        port: Puerto (0 = uno libre)
+
+    Returns:
+        ThreadingHTTPServer: Servidor en marcha (server_address tiene el puerto real;
+            detener con shutdown())
+    """
+    handler = type("BoundEmulatorHandler", (EmulatorHandler,), {"emulator": emulator})
+    server = ThreadingHTTPServer((host, port), handler)
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, name="gmail-emulator", daemon=True).start()
+    return server
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--messages", type=int, default=10000, help="Mensajes del buzón sintético")
+    parser.add_argument("--attachments", default="0:1,1:5,2:3,3:1",
+                        help="Distribución de adjuntos por mensaje (valor:peso,...)")
+    parser.add_argument("--median-kb", type=float, default=120, help="Mediana del tamaño de adjunto")
+    parser.add_argument("--hit-rate", type=float, default=0.6, help="Fracción de adjuntos que pasan los filtros")
+    parser.add_argument("--latency-ms", type=float, default=20.0, help="Latencia por petición HTTP")
+    parser.add_argument("--jitter-ms", type=float, default=0.0, help="Variación aleatoria de la latencia")
+    parser.add_argument("--rate-429", type=float, default=0.0, help="Fracción de operaciones con 429")
+    parser.add_argument("--rate-5xx", type=float, default=0.0, help="Fracción de operaciones con 503")
+    parser.add_argument("--quota", type=int, default=250, help="Unidades por usuario y segundo (0 = sin límite)")
+    parser.add_argument("--seed", type=int, default=42)
+    args = parser.parse_args()
+
+    mailbox = SyntheticMailbox(messages=args.messages, attachments=args.attachments,
+                               median_kb=args.median_kb, hit_rate=args.hit_rate, seed=args.seed)
+    emulator = GmailEmulator(mailbox, latency_ms=args.latency_ms, jitter_ms=args.jitter_ms,
+                             rate_429=args.rate_429, rate_5xx=args.rate_5xx,
+                             quota=args.quota or None, seed=args.seed)
+    server = start_emulator(emulator, args.host, args.port)
+    host, port = server.server_address[:2]
+    print(f"📡 Emulador de Gmail API en http://{host}:{port}/ "
+          f"({args.messages} mensajes, {mailbox.expected_files} adjuntos que pasan los filtros)")
+    print(f"   En config.cfg: [GMAIL_API] api_endpoint = http://{host}:{port}/")
+    print(f"   Estadísticas: http://{host}:{port}/__stats  (Ctrl-C para parar)")
+    try:
+        while True:
+            time.sleep(3600)
+    except KeyboardInterrupt:
+        server.shutdown()
+        print(json.dumps(emulator.stats(), indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,334 @@
+"""
+Emulador HTTP local de almacenamiento compatible con S3 (estilo MinIO)
+
+Sirve en memoria el subconjunto de la API REST de S3 que usa S3Storage
+(src/gmail_downloader/storage.py), con direccionamiento por ruta:
+
+    PUT    /{bucket}/{key}                            PutObject
+    POST   /{bucket}/{key}?uploads                    CreateMultipartUpload
+    PUT    /{bucket}/{key}?partNumber=N&uploadId=U    UploadPart
+    POST   /{bucket}/{key}?uploadId=U                 CompleteMultipartUpload
+    DELETE /{bucket}/{key}?uploadId=U                 AbortMultipartUpload
+    DELETE /{bucket}/{key}                            DeleteObject
+    HEAD   /{bucket}/{key}                            HeadObject
+    GET    /{bucket}/{key}                            GetObject
+    GET    /{bucket}?list-type=2&prefix=P&delimiter=/ ListObjectsV2
+    GET    /__stats  (llamadas, conexiones y peticiones simultáneas)
+
+Cada petición debe ir firmada con SigV4 con las claves del emulador y con el
+hash real del cuerpo (403 si no). Los buckets se crean al primer uso.
+
+Para apuntar el descargador al emulador, en config/config.cfg:
+
+    [DOWNLOADS]
+    storage_backend = s3
+    s3_endpoint = http://127.0.0.1:9000/
+    s3_bucket = facturas
+
+y en el entorno AWS_ACCESS_KEY_ID=emulator AWS_SECRET_ACCESS_KEY=emulator-secret
+
+Uso:
+    python benchmarks/s3_emulator.py [--port 9000] [--latency-ms 0]
+"""
+
+import argparse
+import hashlib
+import json
+import re
+import sys
+import threading
+import time
+import uuid
+import xml.etree.ElementTree as ET
+from collections import Counter
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from pathlib import Path
+from typing import Dict, Optional, Tuple
+from urllib.parse import parse_qsl, unquote, urlsplit
+from xml.sax.saxutils import escape
+
+BENCH_DIR = Path(__file__).resolve().parent
+sys.path.insert(0, str(BENCH_DIR.parent / "src"))
+
+from gmail_downloader.storage import MIN_PART_SIZE, sign_v4  # noqa: E402
+
+
+# Espacio de nombres de las respuestas XML de S3
+S3_NS = "http://s3.amazonaws.com/doc/2006-03-01/"
+
+# Campos de la cabecera Authorization de SigV4
+AUTHORIZATION = re.compile(
+    r"^AWS4-HMAC-SHA256 Credential=([^/]+)/(\d{8})/([^/]+)/s3/aws4_request, "
+    r"SignedHeaders=([a-z0-9;-]+), Signature=[0-9a-f]{64}$"
+)
+
+# Cabeceras que sign_v4 añade siempre (las demás firmadas se le pasan aparte)
+BASE_SIGNED = ("host", "x-amz-date", "x-amz-content-sha256", "x-amz-security-token")
+
+
+def error_xml(code: str, message: str) -> bytes:
+    """Cuerpo XML de un error de S3"""
+    return f"<Error><Code>{code}</Code><Message>{escape(message)}</Message></Error>".encode()
+
+
+class S3Emulator:
+    """Estado del emulador: objetos, subidas multiparte en curso y estadísticas"""
+
+    def __init__(self, access_key: str = "emulator", secret_key: str = "emulator-secret",
+                 region: str = "us-east-1", latency_ms: float = 0.0):
+        """
+        Args:
+            access_key: Clave de acceso aceptada
+            secret_key: Clave secreta con la que se comprueban las firmas
+            region: Región de las firmas
+            latency_ms: Latencia añadida a cada petición
+        """
+        self.access_key = access_key
+        self.secret_key = secret_key
+        self.region = region
+        self.latency = latency_ms / 1000
+        self.objects: Dict[Tuple[str, str], bytes] = {}
+        self._uploads: Dict[str, dict] = {}
+        self._lock = threading.Lock()
+        self._calls = Counter()
+        self._in_flight = 0
+        self._max_in_flight = 0
+
+    def stats(self) -> dict:
+        """Llamadas por operación, conexiones y máximo de peticiones simultáneas"""
+        with self._lock:
+            return {"calls": dict(self._calls), "max_in_flight": self._max_in_flight,
+                    "open_uploads": len(self._uploads), "objects": len(self.objects)}
+
+    def count_connection(self) -> None:
+        """Cuenta una conexión TCP nueva"""
+        with self._lock:
+            self._calls["connections"] += 1
+
+    def handle(self, method: str, raw_path: str, headers, body: bytes) -> Tuple[int, dict, bytes]:
+        """
+        Atiende una petición
+
+        Returns:
+            Tuple[int, dict, bytes]: Estado, cabeceras y cuerpo de la respuesta
+        """
+        with self._lock:
+            self._in_flight += 1
+            self._max_in_flight = max(self._max_in_flight, self._in_flight)
+        try:
+            if self.latency:
+                time.sleep(self.latency)
+            error = self._check_signature(method, raw_path, headers, body)
+            if error:
+                return 403, {}, error_xml(*error)
+            url = urlsplit(raw_path)
+            query = dict(parse_qsl(url.query, keep_blank_values=True))
+            bucket, _, key = unquote(url.path).lstrip("/").partition("/")
+            operation, result = self._dispatch(method, bucket, key, query, body)
+            with self._lock:
+                self._calls[operation] += 1
+            return result
+        finally:
+            with self._lock:
+                self._in_flight -= 1
+
+    def _check_signature(self, method: str, raw_path: str, headers, body: bytes) -> Optional[Tuple[str, str]]:
+        """Comprueba la firma SigV4 y el hash del cuerpo (None si son correctos)"""
+        authorization = headers.get("Authorization", "")
+        match = AUTHORIZATION.match(authorization)
+        if not match or match.group(1) != self.access_key:
+            return "InvalidAccessKeyId", "Clave de acceso desconocida"
+        payload_hash = headers.get("x-amz-content-sha256", "")
+        if payload_hash != hashlib.sha256(body).hexdigest():
+            return "XAmzContentSHA256Mismatch", "El hash no coincide con el cuerpo"
+        signed = match.group(4).split(";")
+        extra = {name: headers.get(name, "") for name in signed if name not in BASE_SIGNED}
+        expected = sign_v4(method, f"http://{headers.get('Host', '')}{raw_path}", payload_hash,
+                           self.access_key, self.secret_key, match.group(3),
+                           amz_date=headers.get("x-amz-date", ""),
+                           session_token=headers.get("x-amz-security-token"), extra_headers=extra)
+        if expected["Authorization"] != authorization:
+            return "SignatureDoesNotMatch", "La firma no coincide"
+        return None
+
+    def _dispatch(self, method: str, bucket: str, key: str, query: dict, body: bytes):
+        """Ejecuta la operación: (nombre de la operación, (estado, cabeceras, cuerpo))"""
+        if not key:
+            if method == "GET" and query.get("list-type") == "2":
+                return "ListObjectsV2", self._list(bucket, query)
+            return "Unsupported", (400, {}, error_xml("NotImplemented", "Operación no soportada"))
+
+        with self._lock:
+            if method == "PUT" and "uploadId" in query:
+                upload = self._uploads.get(query["uploadId"])
+                if upload is None:
+                    return "UploadPart", (404, {}, error_xml("NoSuchUpload", query["uploadId"]))
+                upload["parts"][int(query["partNumber"])] = body
+                return "UploadPart", (200, {"ETag": self._etag(body)}, b"")
+            if method == "PUT":
+                self.objects[(bucket, key)] = body
+                return "PutObject", (200, {"ETag": self._etag(body)}, b"")
+            if method == "POST" and "uploads" in query:
+                upload_id = uuid.uuid4().hex
+                self._uploads[upload_id] = {"bucket": bucket, "key": key, "parts": {}}
+                return "CreateMultipartUpload", (200, {}, (
+                    f'<InitiateMultipartUploadResult xmlns="{S3_NS}"><Bucket>{escape(bucket)}</Bucket>'
+                    f"<Key>{escape(key)}</Key><UploadId>{upload_id}</UploadId></InitiateMultipartUploadResult>"
+                ).encode())
+            if method == "POST" and "uploadId" in query:
+                return "CompleteMultipartUpload", self._complete(query["uploadId"], body)
+            if method == "DELETE" and "uploadId" in query:
+                found = self._uploads.pop(query["uploadId"], None)
+                return "AbortMultipartUpload", (204 if found else 404, {}, b"")
+            if method == "DELETE":
+                self.objects.pop((bucket, key), None)
+                return "DeleteObject", (204, {}, b"")
+            if method in ("GET", "HEAD"):
+                data = self.objects.get((bucket, key))
+                operation = "GetObject" if method == "GET" else "HeadObject"
+                if data is None:
+                    return operation, (404, {}, error_xml("NoSuchKey", key))
+                return operation, (200, {"ETag": self._etag(data)}, data)
+        return "Unsupported", (400, {}, error_xml("NotImplemented", "Operación no soportada"))
+
+    @staticmethod
+    def _etag(data: bytes) -> str:
+        return '"' + hashlib.md5(data).hexdigest() + '"'
+
+    def _complete(self, upload_id: str, body: bytes) -> Tuple[int, dict, bytes]:
+        """Une las partes indicadas (llamar con el bloqueo tomado)"""
+        upload = self._uploads.get(upload_id)
+        if upload is None:
+            return 404, {}, error_xml("NoSuchUpload", upload_id)
+        requested = [
+            (int(part.findtext("PartNumber")), part.findtext("ETag"))
+            for part in ET.fromstring(body).iter("Part")
+        ]
+        parts = []
+        for index, (number, etag) in enumerate(requested):
+            data = upload["parts"].get(number)
+            if data is None or self._etag(data) != etag:
+                return 400, {}, error_xml("InvalidPart", f"Parte {number}")
+            if index + 1 < len(requested) and len(data) < MIN_PART_SIZE:
+                return 400, {}, error_xml("EntityTooSmall", f"Parte {number}")
+            parts.append(data)
+        del self._uploads[upload_id]
+        self.objects[(upload["bucket"], upload["key"])] = b"".join(parts)
+        return 200, {}, (
+            f'<CompleteMultipartUploadResult xmlns="{S3_NS}"><Key>{escape(upload["key"])}</Key>'
+            f"</CompleteMultipartUploadResult>"
+        ).encode()
+
+    def _list(self, bucket: str, query: dict) -> Tuple[int, dict, bytes]:
+        """ListObjectsV2 con prefijo, delimitador y paginación"""
+        prefix = query.get("prefix", "")
+        delimiter = query.get("delimiter", "")
+        max_keys = int(query.get("max-keys", 1000))
+        start = int(query.get("continuation-token", 0) or 0)
+        with self._lock:
+            keys = sorted(key for (name, key) in self.objects if name == bucket and key.startswith(prefix))
+        contents = [key for key in keys if not delimiter or delimiter not in key[len(prefix):]]
+        page = contents[start:start + max_keys]
+        truncated = start + max_keys < len(contents)
+        body = "".join(f"<Contents><Key>{escape(key)}</Key></Contents>" for key in page)
+        if truncated:
+            body += f"<NextContinuationToken>{start + max_keys}</NextContinuationToken>"
+        return 200, {}, (
+            f'<ListBucketResult xmlns="{S3_NS}"><Name>{escape(bucket)}</Name><Prefix>{escape(prefix)}</Prefix>'
+            f"<KeyCount>{len(page)}</KeyCount><IsTruncated>{str(truncated).lower()}</IsTruncated>"
+            f"{body}</ListBucketResult>"
+        ).encode()
+
+
+class S3Handler(BaseHTTPRequestHandler):
+    """Manejador HTTP/1.1 con keep-alive"""
+
+    protocol_version = "HTTP/1.1"
+    disable_nagle_algorithm = True
+    emulator: S3Emulator = None
+
+    def setup(self):
+        super().setup()
+        self.emulator.count_connection()
+
+    def _handle(self, method: str) -> None:
+        body = self.rfile.read(int(self.headers.get("Content-Length", 0)))
+        if self.path == "/__stats":
+            status, headers, body = 200, {"Content-Type": "application/json"}, json.dumps(self.emulator.stats()).encode()
+        else:
+            status, headers, body = self.emulator.handle(method, self.path, self.headers, body)
+        self.send_response(status)
+        for name, value in headers.items():
+            self.send_header(name, value)
+        if body and "Content-Type" not in headers:
+            self.send_header("Content-Type", "application/xml" if body.startswith(b"<") else "application/octet-stream")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        if method != "HEAD":
+            self.wfile.write(body)
+
+    def do_GET(self):
+        self._handle("GET")
+
+    def do_HEAD(self):
+        self._handle("HEAD")
+
+    def do_PUT(self):
+        self._handle("PUT")
+
+    def do_POST(self):
+        self._handle("POST")
+
+    def do_DELETE(self):
+        self._handle("DELETE")
+
+    def log_message(self, format, *args):
+        pass
+
+
+def start_s3_emulator(emulator: S3Emulator, host: str = "127.0.0.1", port: int = 0) -> ThreadingHTTPServer:
+    """
+    Arranca el emulador en un hilo en segundo plano
+
+    Args:
+        emulator: Lógica del emulador
+        host: Dirección de escucha
+        port: Puerto (0 = uno libre)
+
+    Returns:
+        ThreadingHTTPServer: Servidor en marcha (server_address tiene el puerto real;
+            detener con shutdown())
+    """
+    handler = type("BoundS3Handler", (S3Handler,), {"emulator": emulator})
+    server = ThreadingHTTPServer((host, port), handler)
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, name="s3-emulator", daemon=True).start()
+    return server
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=9000)
+    parser.add_argument("--access-key", default="emulator")
+    parser.add_argument("--secret-key", default="emulator-secret")
+    parser.add_argument("--latency-ms", type=float, default=0.0, help="Latencia por petición HTTP")
+    args = parser.parse_args()
+
+    emulator = S3Emulator(args.access_key, args.secret_key, latency_ms=args.latency_ms)
+    server = start_s3_emulator(emulator, args.host, args.port)
+    host, port = server.server_address[:2]
+    print(f"🪣 Emulador de S3 en http://{host}:{port}/")
+    print(f"   En config.cfg: [DOWNLOADS] storage_backend = s3, s3_endpoint = http://{host}:{port}/")
+    print(f"   En el entorno: AWS_ACCESS_KEY_ID={args.access_key} AWS_SECRET_ACCESS_KEY={args.secret_key}")
+    print(f"   Estadísticas: http://{host}:{port}/__stats  (Ctrl-C para parar)")
+    try:
+        while True:
+            time.sleep(3600)
+    except KeyboardInterrupt:
+        server.shutdown()
+        print(json.dumps(emulator.stats(), indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,571 @@
+"""
+AttachDownloader - Módulo de archivos comprimidos por trimestre
+Los adjuntos se escriben directamente, sin temporales en disco, en un único
+archivo <Año>/<Trimestre>.<zip|tar|tar.zst> con un índice lateral de miembros
+que permite buscarlos sin recorrer el archivo y continuar tras una interrupción
+"""
+
+import hashlib
+import importlib.util
+import json
+import os
+import tarfile
+import tempfile
+import threading
+import zipfile
+from abc import ABC, abstractmethod
+from datetime import datetime
+from pathlib import Path
+from typing import Callable, Dict, Iterable, Iterator, List, Optional, Set, Tuple
+
+from .storage import StorageBackend
+
+
+# Formatos disponibles ([BACKUP] archive_format); tar.zst requiere zstandard
+ARCHIVE_FORMATS = ("zip", "tar", "tar.zst")
+
+# Sufijo del índice lateral de cada archivo (<archivo>.index, JSON por líneas)
+INDEX_SUFFIX = ".index"
+
+# Miembros entre dos sincronizaciones (fsync) del archivo y su índice
+SYNC_EVERY = 256
+
+# Nivel de compresión zstd de tar.zst
+ZSTD_LEVEL = 3
+
+# Marca de fin de un tar: dos bloques a cero
+END_OF_ARCHIVE = b"\0" * (2 * tarfile.BLOCKSIZE)
+
+
+def zstd_available() -> bool:
+    """Indica si está instalado zstandard (necesario para tar.zst)"""
+    return importlib.util.find_spec("zstandard") is not None
+
+
+class _Archive(ABC):
+    """
+    Un archivo de trimestre abierto para añadir miembros
+
+    Cada miembro se registra en el índice lateral después de escribirse
+    entero, con su posición en el archivo. Al reabrirlo, lo que haya detrás
+    del último miembro registrado (un miembro a medias, la marca de fin o el
+    directorio central) se descarta y se sigue escribiendo desde ahí.
+    """
+
+    def __init__(self, path: Path):
+        """
+        Args:
+            path: Ruta del archivo
+        """
+        self.path = path
+        self.index_path = path.with_name(path.name + INDEX_SUFFIX)
+        # Solo un miembro a la vez por archivo (los de otros trimestres van en paralelo)
+        self.lock = threading.Lock()
+        self.members: Dict[str, dict] = {}
+        self.names: Dict[str, Set[str]] = {}
+        self._file = None
+        self._index = None
+        self._pending = 0
+        # Último miembro añadido y tamaño del índice antes de registrarlo
+        # (lo único que se puede retirar sin reescribir el archivo)
+        self._last: Optional[Tuple[dict, int]] = None
+
+    def open(self) -> None:
+        """Abre el archivo para añadir, reconciliándolo con su índice"""
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        entries, intact = self._read_index()
+        exists = self.path.exists()
+        self._file = open(self.path, "r+b" if exists else "w+b")
+        size = os.fstat(self._file.fileno()).st_size
+        # Miembros registrados cuyo contenido no llegó al disco
+        committed = [entry for entry in entries if entry["end"] <= size]
+        members = self._open_archive(committed, size)
+        if not intact or members != entries:
+            self._rewrite_index(members)
+        for entry in members:
+            self._remember(entry)
+        self._index = open(self.index_path, "a", encoding="utf-8")
+
+    def _read_index(self) -> Tuple[List[dict], bool]:
+        """
+        Lee el índice lateral
+
+        Returns:
+            Tuple[List[dict], bool]: Miembros y si el índice estaba completo
+                (una última línea a medias indica una escritura interrumpida)
+        """
+        entries = []
+        try:
+            with open(self.index_path, encoding="utf-8") as index:
+                for line in index:
+                    try:
+                        entries.append(json.loads(line))
+                    except ValueError:
+                        return entries, False
+        except FileNotFoundError:
+            pass
+        return entries, True
+
+    def _rewrite_index(self, entries: List[dict]) -> None:
+        """Sustituye el índice de forma atómica"""
+        fd, tmp_name = tempfile.mkstemp(dir=str(self.path.parent), prefix=".", suffix=INDEX_SUFFIX)
+        with os.fdopen(fd, "w", encoding="utf-8") as index:
+            for entry in entries:
+                index.write(json.dumps(entry, ensure_ascii=False) + "\n")
+            index.flush()
+            os.fsync(index.fileno())
+        os.replace(tmp_name, self.index_path)
+
+    def _remember(self, entry: dict) -> None:
+        """Añade un miembro a las tablas de búsqueda"""
+        self.members[entry["name"]] = entry
+        folder, _, filename = entry["name"].rpartition("/")
+        self.names.setdefault(folder, set()).add(filename)
+
+    def add(self, name: str, size: int, chunks: Iterable[bytes], mtime: datetime,
+            sha256: Optional[str] = None) -> str:
+        """
+        Escribe un miembro y lo registra en el índice (llamar con lock tomado)
+
+        Args:
+            name: Nombre del miembro <Remitente>/<archivo>
+            size: Tamaño exacto del contenido
+            chunks: Bloques del contenido
+            mtime: Fecha de modificación del miembro
+            sha256: Hash del contenido si ya se conoce (no se vuelve a calcular)
+
+        Raises:
+            ValueError: Si los bloques no suman size bytes (no queda nada escrito)
+
+        Returns:
+            str: Hash SHA-256 del contenido
+        """
+        digest = None if sha256 else hashlib.sha256()
+        entry = self._write_member(name, size, self._checked(chunks, size, digest), mtime)
+        entry.update(name=name, size=size, sha256=sha256 or digest.hexdigest())
+        index_size = os.fstat(self._index.fileno()).st_size
+        self._index.write(json.dumps(entry, ensure_ascii=False) + "\n")
+        self._index.flush()
+        self._remember(entry)
+        self._last = (entry, index_size)
+        self._pending += 1
+        if self._pending >= SYNC_EVERY:
+            self.sync()
+        return entry["sha256"]
+
+    def remove_last(self, name: str) -> bool:
+        """
+        Retira un miembro si es el último añadido (llamar con lock tomado)
+
+        Args:
+            name: Nombre del miembro
+
+        Returns:
+            bool: True si se ha retirado; False si ya hay otro detrás y se conserva
+        """
+        if self._last is None or self._last[0]["name"] != name:
+            return False
+        entry, index_size = self._last
+        self._last = None
+        self._drop_member(name, entry["offset"])
+        self._index.truncate(index_size)
+        del self.members[name]
+        folder, _, filename = name.rpartition("/")
+        self.names.get(folder, set()).discard(filename)
+        return True
+
+    @staticmethod
+    def _checked(chunks: Iterable[bytes], size: int, digest) -> Iterator[bytes]:
+        """Calcula el hash de los bloques (si digest no es None) y comprueba que suman size bytes"""
+        written = 0
+        for chunk in chunks:
+            written += len(chunk)
+            if written > size:
+                raise ValueError(f"El contenido supera los {size} bytes anunciados")
+            if digest is not None:
+                digest.update(chunk)
+            yield chunk
+        if written != size:
+            raise ValueError(f"Contenido incompleto: {written} de {size} bytes")
+
+    def sync(self) -> None:
+        """Lleva al disco el archivo y, después, su índice"""
+        self._file.flush()
+        os.fsync(self._file.fileno())
+        self._index.flush()
+        os.fsync(self._index.fileno())
+        self._pending = 0
+
+    def close(self) -> None:
+        """Cierra el archivo dejándolo legible por las herramientas habituales"""
+        if self._file is None:
+            return
+        self._last = None
+        self._finish()
+        self.sync()
+        self._index.close()
+        self._file.close()
+        self._file = None
+
+    @abstractmethod
+    def _open_archive(self, entries: List[dict], size: int) -> List[dict]:
+        """Prepara el archivo para añadir y devuelve sus miembros"""
+
+    @abstractmethod
+    def _write_member(self, name: str, size: int, chunks: Iterable[bytes], mtime: datetime) -> dict:
+        """Escribe un miembro (deshaciendo la escritura si falla) y devuelve su posición"""
+
+    @abstractmethod
+    def _drop_member(self, name: str, offset: int) -> None:
+        """Descarta el último miembro, escrito a partir de offset"""
+
+    @abstractmethod
+    def read(self, name: str) -> bytes:
+        """Contenido de un miembro (llamar con lock tomado)"""
+
+    @abstractmethod
+    def _finish(self) -> None:
+        """Escribe lo que cierra el archivo (directorio central, marca de fin)"""
+
+
+class _ZipArchive(_Archive):
+    """Archivo .zip (deflate) escrito con zipfile en modo de adición"""
+
+    def _open_archive(self, entries: List[dict], size: int) -> List[dict]:
+        infos = None
+        if size:
+            try:
+                with zipfile.ZipFile(self._file) as existing:
+                    infos = sorted(existing.infolist(), key=lambda info: info.header_offset)
+                    directory = existing.start_dir
+            except zipfile.BadZipFile:
+                # Ejecución interrumpida: sin directorio central
+                pass
+
+        if infos is not None:
+            # Directorio central válido: manda sobre el índice (que puede faltar).
+            # Cada miembro acaba donde empieza el siguiente o el directorio
+            by_name = {entry["name"]: entry for entry in entries}
+            ends = [info.header_offset for info in infos[1:]] + [directory]
+            members = [by_name.get(info.filename) or self._entry(info, end) for info, end in zip(infos, ends)]
+            self._file.seek(0)
+            self._zip = zipfile.ZipFile(self._file, "a", zipfile.ZIP_DEFLATED)
+            return members
+
+        # Sin directorio central: se conservan los miembros del índice y se
+        # reconstruye el directorio a partir de él al cerrar
+        end = entries[-1]["end"] if entries else 0
+        self._file.truncate(end)
+        self._file.seek(0)
+        self._zip = zipfile.ZipFile(self._file, "a", zipfile.ZIP_DEFLATED)
+        for entry in entries:
+            info = self._info(entry)
+            self._zip.filelist.append(info)
+            self._zip.NameToInfo[info.filename] = info
+        return entries
+
+    @staticmethod
+    def _entry(info: zipfile.ZipInfo, end: int) -> dict:
+        """Registro del índice de un miembro zip"""
+        return {
+            "name": info.filename,
+            "offset": info.header_offset,
+            "end": end,
+            "size": info.file_size,
+            "sha256": None,
+            "crc": info.CRC,
+            "compress_size": info.compress_size,
+            "compress_type": info.compress_type,
+            "date_time": list(info.date_time),
+            "flag_bits": info.flag_bits,
+            "extract_version": info.extract_version,
+        }
+
+    @staticmethod
+    def _info(entry: dict) -> zipfile.ZipInfo:
+        """Reconstruye la entrada del directorio central de un miembro del índice"""
+        info = zipfile.ZipInfo(entry["name"], tuple(entry["date_time"]))
+        info.compress_type = entry["compress_type"]
+        info.CRC = entry["crc"]
+        info.compress_size = entry["compress_size"]
+        info.file_size = entry["size"]
+        info.header_offset = entry["offset"]
+        info.flag_bits = entry["flag_bits"]
+        info.extract_version = entry["extract_version"]
+        info.external_attr = 0o644 << 16
+        return info
+
+    def _write_member(self, name: str, size: int, chunks: Iterable[bytes], mtime: datetime) -> dict:
+        # ZIP no admite fechas anteriores a 1980
+        date_time = max(mtime.timetuple()[:6], (1980, 1, 1, 0, 0, 0))
+        info = zipfile.ZipInfo(name, date_time)
+        info.compress_type = zipfile.ZIP_DEFLATED
+        info.external_attr = 0o644 << 16
+        # Con el tamaño conocido de antemano zipfile decide si necesita ZIP64
+        info.file_size = size
+        start = self._zip.start_dir
+        try:
+            with self._zip.open(info, "w") as member:
+                for chunk in chunks:
+                    member.write(chunk)
+        except BaseException:
+            self._drop_member(name, start)
+            raise
+        return self._entry(info, self._zip.start_dir)
+
+    def _drop_member(self, name: str, offset: int) -> None:
+        # zipfile registra el miembro al cerrarlo aunque haya fallado
+        info = self._zip.NameToInfo.pop(name, None)
+        if info in self._zip.filelist:
+            self._zip.filelist.remove(info)
+        self._zip.start_dir = offset
+        self._file.seek(offset)
+        self._file.truncate()
+
+    def read(self, name: str) -> bytes:
+        return self._zip.read(name)
+
+    def _finish(self) -> None:
+        self._zip.close()
+
+
+class _TarArchive(_Archive):
+    """
+    Archivo .tar, o .tar.zst con cada miembro en su propia trama zstd
+
+    Las tramas zstd concatenadas forman un flujo válido (tar --zstd lo lee
+    entero) y permiten leer un miembro descomprimiendo solo su trama.
+    """
+
+    def __init__(self, path: Path, zstd: bool = False):
+        """
+        Args:
+            path: Ruta del archivo
+            zstd: Comprimir cada miembro con zstd
+        """
+        super().__init__(path)
+        self._compressor = None
+        if zstd:
+            import zstandard
+
+            self._zstd = zstandard
+            self._compressor = zstandard.ZstdCompressor(level=ZSTD_LEVEL)
+
+    def _open_archive(self, entries: List[dict], size: int) -> List[dict]:
+        if not entries and size:
+            # Archivo sin índice (o solo con la marca de fin): reconstruirlo
+            entries = self._scan()
+        end = entries[-1]["end"] if entries else 0
+        self._file.truncate(end)
+        self._file.seek(end)
+        return entries
+
+    def _scan(self) -> List[dict]:
+        """Reconstruye el índice recorriendo el archivo (una sola vez)"""
+        self._file.seek(0)
+        if self._compressor is not None:
+            # Sin posiciones de las tramas no se puede añadir de forma segura
+            # salvo que el archivo esté vacío (solo la marca de fin)
+            reader = self._zstd.ZstdDecompressor().stream_reader(self._file, read_across_frames=True)
+            block = reader.read(1024 * 1024)
+            while block:
+                if block.strip(b"\0"):
+                    raise ValueError(f"Falta el índice {self.index_path}: no se puede añadir a {self.path}")
+                block = reader.read(1024 * 1024)
+            return []
+        entries = []
+        with tarfile.open(fileobj=self._file, mode="r:", ignore_zeros=True) as tar:
+            for member in tar:
+                if member.isfile():
+                    entries.append({
+                        "name": member.name,
+                        "offset": member.offset,
+                        "header": member.offset_data - member.offset,
+                        "end": member.offset_data + member.size + (-member.size % tarfile.BLOCKSIZE),
+                        "size": member.size,
+                        "sha256": None,
+                    })
+        return entries
+
+    def _write_member(self, name: str, size: int, chunks: Iterable[bytes], mtime: datetime) -> dict:
+        info = tarfile.TarInfo(name)
+        info.size = size
+        info.mtime = int(mtime.timestamp())
+        info.mode = 0o644
+        header = info.tobuf(tarfile.PAX_FORMAT, "utf-8", "surrogateescape")
+        offset = self._file.tell()
+        try:
+            if self._compressor is not None:
+                frame = self._compressor.compressobj()
+                self._file.write(frame.compress(header))
+                for chunk in chunks:
+                    self._file.write(frame.compress(chunk))
+                self._file.write(frame.compress(b"\0" * (-size % tarfile.BLOCKSIZE)))
+                self._file.write(frame.flush())
+            else:
+                self._file.write(header)
+                for chunk in chunks:
+                    self._file.write(chunk)
+                self._file.write(b"\0" * (-size % tarfile.BLOCKSIZE))
+        except BaseException:
+            self._drop_member(name, offset)
+            raise
+        return {"offset": offset, "header": len(header), "end": self._file.tell()}
+
+    def _drop_member(self, name: str, offset: int) -> None:
+        self._file.seek(offset)
+        self._file.truncate()
+
+    def read(self, name: str) -> bytes:
+        entry = self.members[name]
+        position = self._file.tell()
+        try:
+            if self._compressor is not None:
+                self._file.seek(entry["offset"])
+                frame = self._file.read(entry["end"] - entry["offset"])
+                data = self._zstd.ZstdDecompressor().decompressobj().decompress(frame)
+                return data[entry["header"]:entry["header"] + entry["size"]]
+            self._file.seek(entry["offset"] + entry["header"])
+            return self._file.read(entry["size"])
+        finally:
+            self._file.seek(position)
+
+    def _finish(self) -> None:
+        # La marca de fin no se registra: la siguiente ejecución la descarta
+        end = self._file.tell()
+        if self._compressor is not None:
+            self._file.write(self._compressor.compress(END_OF_ARCHIVE))
+        else:
+            self._file.write(END_OF_ARCHIVE)
+        self._file.seek(end)
+
+
+class ArchiveSink(StorageBackend):
+    """
+    Destino de descargas en archivos <raíz>/<Año>/<Trimestre>.<formato>
+
+    La clave <Año>/<Trimestre>/<Remitente>/<archivo> se guarda como miembro
+    <Remitente>/<archivo> del archivo de su trimestre; su ubicación en el
+    manifiesto es <raíz>/<Año>/<Trimestre>.<formato>/<Remitente>/<archivo>.
+    Los archivos se abren la primera vez que se usan y se cierran con close().
+    """
+
+    def __init__(self, root: Path, archive_format: str = "zip"):
+        """
+        Args:
+            root: Carpeta raíz de descargas
+            archive_format: zip, tar o tar.zst
+
+        Raises:
+            ValueError: Si el formato no existe o falta zstandard para tar.zst
+        """
+        if archive_format not in ARCHIVE_FORMATS:
+            raise ValueError(f"Formato de archivo desconocido: {archive_format} (usa {', '.join(ARCHIVE_FORMATS)})")
+        if archive_format == "tar.zst" and not zstd_available():
+            raise ValueError("El formato tar.zst necesita el paquete zstandard (pip install zstandard)")
+        super().__init__()
+        self.root = Path(root)
+        self.format = archive_format
+        self._archives: Dict[Path, _Archive] = {}
+        self._archives_lock = threading.Lock()
+
+    def archive_path(self, year: int, trimester: str) -> Path:
+        """Ruta del archivo de un trimestre"""
+        return self.root / str(year) / f"{trimester}.{self.format}"
+
+    def _archive(self, path: Path, create: bool = True) -> Optional[_Archive]:
+        """Archivo abierto de una ruta (None si no existe y create es False)"""
+        with self._archives_lock:
+            archive = self._archives.get(path)
+            if archive is None:
+                if not create and not path.exists():
+                    return None
+                archive = _ZipArchive(path) if self.format == "zip" else _TarArchive(path, self.format == "tar.zst")
+                archive.open()
+                self._archives[path] = archive
+            return archive
+
+    def _split(self, key: str) -> Tuple[Path, str]:
+        """Archivo y miembro de una clave <Año>/<Trimestre>/<Remitente>/<archivo>"""
+        year, trimester, name = key.split("/", 2)
+        return self.archive_path(int(year), trimester), name
+
+    def reserve(self, folder: str, filename: str, sanitize: Callable[[str], str],
+                keep_existing: bool = True) -> str:
+        # Un miembro no se puede sobrescribir sin reescribir el archivo: si el
+        # nombre ya está en el archivo se usa otro con timestamp
+        return super().reserve(folder, filename, sanitize, keep_existing=True)
+
+    def list_names(self, folder: str) -> Set[str]:
+        archive_path, sender = self._split(folder)
+        archive = self._archive(archive_path, create=False)
+        if archive is None:
+            return set()
+        with archive.lock:
+            return set(archive.names.get(sender, set()))
+
+    def put(self, key: str, chunks: Iterable[bytes], size: int, sha256: Optional[str] = None,
+            mtime: Optional[datetime] = None) -> str:
+        archive_path, name = self._split(key)
+        archive = self._archive(archive_path)
+        with archive.lock:
+            return archive.add(name, size, chunks, mtime or datetime.now(), sha256)
+
+    def location(self, key: str) -> str:
+        archive_path, name = self._split(key)
+        return str(archive_path / name)
+
+    def key(self, location) -> Optional[str]:
+        archive_path, name = self._locate(location)
+        if archive_path is None:
+            return None
+        trimester = archive_path.name[:-len(self.format) - 1]
+        return f"{archive_path.parent.name}/{trimester}/{name}"
+
+    def _locate(self, path) -> Tuple[Optional[Path], Optional[str]]:
+        """Archivo y miembro de una ruta del manifiesto (None si no es un miembro)"""
+        path = Path(path)
+        try:
+            parts = path.relative_to(self.root).parts
+        except ValueError:
+            return None, None
+        if len(parts) < 3 or not parts[1].endswith("." + self.format):
+            return None, None
+        return self.root / parts[0] / parts[1], "/".join(parts[2:])
+
+    def _delete(self, key: str) -> bool:
+        # Solo se retira si nadie ha añadido otro miembro detrás en el mismo
+        # archivo: un miembro intermedio no se borra sin reescribir el archivo
+        archive_path, name = self._split(key)
+        archive = self._archive(archive_path, create=False)
+        if archive is None:
+            return False
+        with archive.lock:
+            return archive.remove_last(name)
+
+    def _exists(self, key: str) -> bool:
+        archive_path, name = self._split(key)
+        archive = self._archive(archive_path, create=False)
+        return archive is not None and name in archive.members
+
+    def read(self, key: str) -> bytes:
+        """
+        Contenido de un miembro
+
+        Raises:
+            KeyError: Si la clave no es un miembro de ningún archivo
+        """
+        archive_path, name = self._split(key)
+        archive = self._archive(archive_path, create=False)
+        if archive is None or name not in archive.members:
+            raise KeyError(key)
+        with archive.lock:
+            return archive.read(name)
+
+    def close(self) -> None:
+        """Cierra todos los archivos abiertos"""
+        with self._archives_lock:
+            for archive in self._archives.values():
+                with archive.lock:
+                    archive.close()
+            self._archives.clear()
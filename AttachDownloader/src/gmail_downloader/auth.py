@@ -4,13 +4,12 @@ Gestión segura de credenciales OAuth 2.0
 """
 
 import os
-import pickle
-from pathlib import Path
 from google.auth.transport.requests import Request
 from google.oauth2.credentials import Credentials
 from google.auth.exceptions import RefreshError
 from google_auth_oauthlib.flow import InstalledAppFlow
 from .config import ConfigManager
+from .credential_provider import CredentialProvider, SharedCredentials, TokenStore
 
 
 class GmailAuthenticator:
@@ -28,37 +27,69 @@ class GmailAuthenticator:
         self.token_file = str(self.config.token_file)
         self.scopes = self.config.gmail_scopes
         self.creds = None
+        self.provider = None
 
     def authenticate(self) -> Credentials:
         """
         Autentica con Gmail API
 
+        El token se lee, renueva y guarda bajo el bloqueo del archivo del token,
+        así varios procesos no lo pisan. La autorización en el navegador se
+        hace sin el bloqueo (puede durar lo que tarde el usuario); al terminar
+        se vuelve a leer el token por si otro proceso ha guardado uno entretanto.
+        Las credenciales devueltas se comparten entre hilos y se renuevan en
+        segundo plano antes de caducar (cierra el autenticador con close() al
+        terminar).
+
         Returns:
             Credentials: Objeto de credenciales autenticado
         """
-        # Cargar token existente si está disponible
-        if os.path.exists(self.token_file):
-            with open(self.token_file, "rb") as token:
-                self.creds = pickle.load(token)
+        store = TokenStore(self.token_file)
+        with store.lock():
+            # Cargar token existente si está disponible
+            self.creds = store.load()
 
-        # Si no hay credenciales válidas, obtener nuevas
-        if not self.creds or not self.creds.valid:
-            if self.creds and self.creds.expired and self.creds.refresh_token:
-                try:
-                    self.creds.refresh(Request())
-                except RefreshError:
-                    self._authorize_new()
-            else:
-                self._authorize_new()
+            # Si el token ha caducado, renovarlo sin intervención del usuario
+            if self.creds and not self.creds.valid:
+                if self.creds.expired and self.creds.refresh_token:
+                    try:
+                        self.creds.refresh(Request())
+                        store.save(self.creds)
+                    except RefreshError:
+                        self.creds = None
+                else:
+                    self.creds = None
 
-            # Guardar credenciales para próximas ejecuciones
-            with open(self.token_file, "wb") as token:
-                pickle.dump(self.creds, token)
+        if self.creds is None:
+            creds = self._authorize_new()
+            with store.lock():
+                stored = store.load()
+                if stored is not None and stored.valid:
+                    # Otro proceso completó su autorización mientras tanto: usar su token
+                    self.creds = stored
+                else:
+                    # Guardar credenciales para próximas ejecuciones
+                    self.creds = creds
+                    store.save(self.creds)
 
+        self.creds = SharedCredentials.from_credentials(self.creds)
+        self.provider = CredentialProvider(self.creds, store, self.config.token_refresh_margin)
+        self.provider.start()
         return self.creds
 
-    def _authorize_new(self) -> None:
-        """Realiza una nueva autorización interactiva"""
+    def close(self) -> None:
+        """Detiene la renovación del token en segundo plano"""
+        if self.provider:
+            self.provider.stop()
+            self.provider = None
+
+    def _authorize_new(self) -> Credentials:
+        """
+        Realiza una nueva autorización interactiva
+
+        Returns:
+            Credentials: Credenciales obtenidas en el navegador
+        """
         if not os.path.exists(self.credentials_file):
             raise FileNotFoundError(
                 f"El archivo {self.credentials_file} no existe. "
@@ -68,4 +99,4 @@ class GmailAuthenticator:
         flow = InstalledAppFlow.from_client_secrets_file(
             self.credentials_file, self.scopes
         )
-        self.creds = flow.run_local_server(port=0)
+        return flow.run_local_server(port=0)
@@ -0,0 +1,119 @@
+"""
+AttachDownloader - Módulo de peticiones por lotes
+Agrupa llamadas a Gmail API en peticiones batch de hasta 100 operaciones
+"""
+
+from typing import Any, Callable, Dict, Tuple
+from .scheduler import (
+    QUOTA_UNITS,
+    DEFAULT_QUOTA_UNITS,
+    RequestScheduler,
+    is_retryable_error,
+    is_throttle_error,
+)
+
+
+# Máximo de operaciones por petición batch admitido por Gmail API
+MAX_BATCH_SIZE = 100
+
+
+class BatchExecutor:
+    """Ejecuta peticiones de Gmail API agrupadas en lotes con reintentos por elemento"""
+
+    def __init__(self, service, batch_size: int = 50, scheduler: RequestScheduler = None):
+        """
+        Inicializa el ejecutor de lotes
+
+        Args:
+            service: Cliente de Gmail API (uno por hilo)
+            batch_size: Operaciones por lote (máximo 100)
+            scheduler: Planificador de cuota y reintentos (si es None, se crea uno por defecto)
+        """
+        self.service = service
+        self.batch_size = min(max(batch_size, 1), MAX_BATCH_SIZE)
+        self.scheduler = scheduler or RequestScheduler()
+
+    def execute(self, requests: Dict[str, Callable[[], Any]], method: str) -> Tuple[Dict[str, Any], Dict[str, Exception]]:
+        """
+        Ejecuta todas las peticiones en lotes, reencolando solo las que fallan
+
+        Args:
+            requests: Diccionario clave -> función que construye la HttpRequest
+            method: Método de Gmail API de las peticiones (para la cuota)
+
+        Returns:
+            Tuple[Dict[str, Any], Dict[str, Exception]]: Respuestas y errores por clave
+        """
+        results: Dict[str, Any] = {}
+        errors: Dict[str, Exception] = {}
+        pending = list(requests)
+
+        for attempt in range(self.scheduler.retry_attempts + 1):
+            if attempt > 0:
+                self.scheduler.backoff(attempt - 1)
+
+            retry = []
+            for start in range(0, len(pending), self.batch_size):
+                chunk = pending[start:start + self.batch_size]
+                retry.extend(self._execute_chunk(chunk, requests, method, results, errors))
+
+            pending = retry
+            if not pending:
+                break
+
+        return results, errors
+
+    def _execute_chunk(
+        self,
+        chunk: list,
+        requests: Dict[str, Callable[[], Any]],
+        method: str,
+        results: Dict[str, Any],
+        errors: Dict[str, Exception],
+    ) -> list:
+        """
+        Envía un lote y clasifica cada respuesta
+
+        Args:
+            chunk: Claves incluidas en el lote
+            requests: Constructores de peticiones por clave
+            method: Método de Gmail API de las peticiones
+            results: Respuestas correctas (se rellena)
+            errors: Errores definitivos o del último intento (se rellena)
+
+        Returns:
+            list: Claves que deben reintentarse
+        """
+        retry = []
+
+        def callback(request_id, response, exception):
+            if exception is None:
+                results[request_id] = response
+                errors.pop(request_id, None)
+                return
+            errors[request_id] = exception
+            if is_retryable_error(exception):
+                retry.append(request_id)
+
+        batch = self.service.new_batch_http_request(callback=callback)
+        for key in chunk:
+            batch.add(requests[key](), request_id=key)
+
+        units = QUOTA_UNITS.get(method, DEFAULT_QUOTA_UNITS) * len(chunk)
+        try:
+            self.scheduler.execute(batch, method, units=units, retry=False)
+        except Exception as e:
+            # Fallo del lote completo: los elementos sin respuesta se reintentan
+            # solo si el error es transitorio; si no, fallan todos a la vez
+            retryable = is_retryable_error(e)
+            for key in chunk:
+                if key not in results and key not in retry:
+                    errors[key] = e
+                    if retryable:
+                        retry.append(key)
+
+        # Los 429 dentro del lote también reducen la concurrencia
+        if any(is_throttle_error(errors[key]) for key in retry if key in errors):
+            self.scheduler.record_throttle()
+
+        return retry
@@ -5,8 +5,129 @@ Gestiona la lectura y parseo del archivo config.cfg
 
 import os
 from configparser import ConfigParser
+from dataclasses import dataclass, fields
+from datetime import datetime
 from pathlib import Path
-from typing import List, Optional, Dict, Any
+from typing import List, Optional, Dict, Any, Tuple
+
+
+# Valores aceptados en las opciones booleanas
+TRUE_VALUES = ("true", "1", "yes", "on")
+FALSE_VALUES = ("false", "0", "no", "off")
+
+
+@dataclass(frozen=True)
+class ConfigSnapshot:
+    """
+    Configuración ya interpretada y validada, inmutable
+
+    Se genera una sola vez al cargar config.cfg: leer un atributo no vuelve a
+    parsear el archivo ni a tocar el disco. Usa __slots__ y se serializa con
+    pickle como una tupla de valores, para enviarla a procesos worker.
+    """
+
+    # GENERAL
+    project_name: str
+    version: str
+    mode: str
+
+    # DOWNLOADS
+    download_folder: Path
+    folder_structure: str
+    create_folders_if_not_exist: bool
+    deduplicate: str
+    max_folders_to_create: int
+    storage_backend: str
+    s3_endpoint: Optional[str]
+    s3_bucket: str
+    s3_prefix: str
+    s3_region: str
+    s3_part_size_mb: int
+    s3_upload_workers: int
+
+    # GMAIL_API
+    credentials_file: Path
+    token_file: Path
+    gmail_scopes: Tuple[str, ...]
+    max_emails_to_process: int
+    max_attachments_to_download: int
+    gmail_labels: Tuple[str, ...]
+    api_endpoint: Optional[str]
+    token_refresh_margin: int
+
+    # FILTERS
+    allowed_extensions: Tuple[str, ...]
+    white_list: Tuple[str, ...]
+    black_list: Tuple[str, ...]
+    case_sensitive_filters: bool
+
+    # SENDERS
+    whitelist_senders: Tuple[str, ...]
+    blacklist_senders: Tuple[str, ...]
+    use_domain_only: bool
+
+    # DATES
+    date_format: str
+    use_email_date: bool
+    date_from: Optional[str]
+    date_to: Optional[str]
+
+    # SANITIZATION
+    max_filename_length: int
+    replace_spaces_with_underscores: bool
+    add_timestamp_on_duplicate: bool
+
+    # LOGGING
+    log_level: str
+    log_file: Path
+    console_output: bool
+    log_successful_downloads: bool
+    metrics_file: Optional[Path]
+    metrics_summary_file: Optional[Path]
+
+    # NOTIFICATIONS
+    send_notification: bool
+    notification_type: str
+    notification_recipient: str
+
+    # ADVANCED
+    execution_mode: str
+    save_download_history: bool
+    history_file: Path
+    sync_state_file: Path
+    journal_file: Path
+    journal_flush_interval: int
+    query_pushdown: bool
+    query_has_attachment: bool
+    retry_attempts: int
+    retry_delay: int
+    batch_size: int
+    max_workers: int
+    use_pipeline: bool
+    metadata_workers: int
+    fetch_workers: int
+    writer_workers: int
+    pipeline_queue_size: int
+    pipeline_monitor_interval: int
+    quota_units_per_second: int
+    max_concurrent_requests: int
+    connection_timeout: int
+    read_timeout: int
+    http_transport: str
+    http_pool_size: int
+    discovery_cache_file: Optional[Path]
+
+    # BACKUP
+    backup_folder: Path
+    compress_downloads: bool
+    archive_format: str
+
+    __slots__ = tuple(__annotations__)
+
+    def __reduce__(self):
+        # Los dataclass congelados con __slots__ no se pueden restaurar con
+        # setattr: se reconstruyen pasando los valores al constructor
+        return (self.__class__, tuple(getattr(self, field.name) for field in fields(self)))
 
 
 class ConfigManager:
@@ -22,6 +143,7 @@ class ConfigManager:
         self.config_file = Path(config_file)
         self.config = ConfigParser()
         self._load_config()
+        self._snapshot = self._build_snapshot()
 
     def _load_config(self) -> None:
         """Carga y valida el archivo de configuración"""
@@ -38,6 +160,32 @@ class ConfigManager:
         except Exception as e:
             raise ValueError(f"Error al parsear config.cfg: {e}")
 
+    def snapshot(self) -> ConfigSnapshot:
+        """Devuelve la configuración interpretada y validada al cargar"""
+        return self._snapshot
+
+    def _build_snapshot(self) -> ConfigSnapshot:
+        """
+        Interpreta y valida todas las opciones una sola vez
+
+        Raises:
+            ValueError: Si alguna opción tiene un valor no válido
+        """
+        values = {}
+        for field in fields(ConfigSnapshot):
+            value = getattr(self, field.name)
+            values[field.name] = tuple(value) if isinstance(value, list) else value
+        snapshot = ConfigSnapshot(**values)
+
+        for option in ("date_from", "date_to"):
+            value = getattr(snapshot, option)
+            if value:
+                try:
+                    datetime.strptime(value, "%Y-%m-%d")
+                except ValueError:
+                    raise ValueError(f"[DATES] {option} = {value!r}: se esperaba una fecha YYYY-MM-DD")
+        return snapshot
+
     # ========================================================================
     # GENERAL
     # ========================================================================
@@ -78,11 +226,62 @@ class ConfigManager:
         """Crear carpetas automáticamente"""
         return self._get_bool("DOWNLOADS", "create_folders_if_not_exist", True)
 
+    @property
+    def deduplicate(self) -> str:
+        """Tratamiento de adjuntos con contenido repetido (hardlink, reference o none)"""
+        return self._get_choice("DOWNLOADS", "deduplicate", ("hardlink", "reference", "none"), "hardlink")
+
     @property
     def max_folders_to_create(self) -> int:
         """Máximo de carpetas a crear (0 = sin límite)"""
         return self._get_int("DOWNLOADS", "max_folders_to_create", 0)
 
+    @property
+    def storage_backend(self) -> str:
+        """Destino de los adjuntos (local = carpetas en download_folder, memory o s3)"""
+        backend = self._get_choice("DOWNLOADS", "storage_backend", ("local", "memory", "s3"), "local")
+        if backend != "local" and self.compress_downloads:
+            raise ValueError(f"[BACKUP] compress_downloads solo es compatible con storage_backend = local, no {backend}")
+        return backend
+
+    @property
+    def s3_endpoint(self) -> Optional[str]:
+        """URL del servicio compatible con S3 (vacío = S3 de AWS en s3_region)"""
+        endpoint = self._get("DOWNLOADS", "s3_endpoint", "").strip()
+        if not endpoint:
+            return None
+        if not endpoint.startswith(("http://", "https://")):
+            raise ValueError(f"[DOWNLOADS] s3_endpoint = {endpoint!r}: debe empezar por http:// o https://")
+        return endpoint.rstrip("/") + "/"
+
+    @property
+    def s3_bucket(self) -> str:
+        """Bucket de destino (obligatorio con storage_backend = s3)"""
+        bucket = self._get("DOWNLOADS", "s3_bucket", "").strip()
+        if not bucket and self.storage_backend == "s3":
+            raise ValueError("[DOWNLOADS] s3_bucket es obligatorio con storage_backend = s3")
+        return bucket
+
+    @property
+    def s3_prefix(self) -> str:
+        """Prefijo de las claves dentro del bucket (vacío = raíz)"""
+        return self._get("DOWNLOADS", "s3_prefix", "").strip().strip("/")
+
+    @property
+    def s3_region(self) -> str:
+        """Región de la firma de las peticiones a S3"""
+        return self._get("DOWNLOADS", "s3_region", "us-east-1").strip() or "us-east-1"
+
+    @property
+    def s3_part_size_mb(self) -> int:
+        """Tamaño de parte de las subidas multiparte (MiB, mínimo 5)"""
+        return max(self._get_int("DOWNLOADS", "s3_part_size_mb", 8), 5)
+
+    @property
+    def s3_upload_workers(self) -> int:
+        """Partes de un mismo objeto que se suben en paralelo"""
+        return max(self._get_int("DOWNLOADS", "s3_upload_workers", 4), 1)
+
     # ========================================================================
     # GMAIL API
     # ========================================================================
@@ -119,6 +318,29 @@ class ConfigManager:
         """Máximo de adjuntos a descargar (0 = todos)"""
         return self._get_int("GMAIL_API", "max_attachments_to_download", 0)
 
+    @property
+    def gmail_labels(self) -> List[str]:
+        """Etiquetas de Gmail a las que se limita la búsqueda (vacío = todas)"""
+        labels_str = self._get("GMAIL_API", "gmail_labels", "")
+        if not labels_str.strip():
+            return []
+        return [label.strip() for label in labels_str.split(",") if label.strip()]
+
+    @property
+    def api_endpoint(self) -> Optional[str]:
+        """URL base alternativa de Gmail API, p. ej. un emulador local (vacío = Google)"""
+        endpoint = self._get("GMAIL_API", "api_endpoint", "").strip()
+        if not endpoint:
+            return None
+        if not endpoint.startswith(("http://", "https://")):
+            raise ValueError(f"[GMAIL_API] api_endpoint = {endpoint!r}: debe empezar por http:// o https://")
+        return endpoint.rstrip("/") + "/"
+
+    @property
+    def token_refresh_margin(self) -> int:
+        """Segundos antes de la caducidad del token en que se renueva en segundo plano (0 = solo al caducar)"""
+        return max(self._get_int("GMAIL_API", "token_refresh_margin", 600), 0)
+
     # ========================================================================
     # FILTERS
     # ========================================================================
@@ -245,6 +467,18 @@ class ConfigManager:
         """Registrar descargas exitosas"""
         return self._get_bool("LOGGING", "log_successful_downloads", True)
 
+    @property
+    def metrics_file(self) -> Optional[Path]:
+        """Textfile de Prometheus con las métricas de la ejecución (vacío = no escribir)"""
+        metrics_path = self._get("LOGGING", "metrics_file", "logs/metrics.prom").strip()
+        return Path(metrics_path) if metrics_path else None
+
+    @property
+    def metrics_summary_file(self) -> Optional[Path]:
+        """Resumen JSON de las métricas de la ejecución (vacío = no escribir)"""
+        summary_path = self._get("LOGGING", "metrics_summary_file", "logs/metrics.json").strip()
+        return Path(summary_path) if summary_path else None
+
     # ========================================================================
     # NOTIFICATIONS
     # ========================================================================
@@ -271,18 +505,132 @@ class ConfigManager:
     @property
     def execution_mode(self) -> str:
         """Modo de ejecución (full o incremental)"""
-        return self._get("ADVANCED", "execution_mode", "full")
+        return self._get_choice("ADVANCED", "execution_mode", ("full", "incremental"), "full")
+
+    @property
+    def save_download_history(self) -> bool:
+        """Guardar historial de descargas para no repetirlas"""
+        return self._get_bool("ADVANCED", "save_download_history", True)
+
+    @property
+    def history_file(self) -> Path:
+        """Archivo SQLite con el historial de descargas"""
+        history_path = self._get("ADVANCED", "history_file", "logs/download_history.db")
+        return Path(history_path)
+
+    @property
+    def sync_state_file(self) -> Path:
+        """Archivo con el último historyId sincronizado (modo incremental)"""
+        state_path = self._get("ADVANCED", "sync_state_file", "logs/sync_state.json")
+        return Path(state_path)
+
+    @property
+    def journal_file(self) -> Path:
+        """Diario de la ejecución en curso (para reanudar con --resume)"""
+        journal_path = self._get("ADVANCED", "journal_file", "logs/run_journal.json")
+        return Path(journal_path)
+
+    @property
+    def journal_flush_interval(self) -> int:
+        """Segundos entre escrituras del diario de ejecución"""
+        return max(self._get_int("ADVANCED", "journal_flush_interval", 30), 0)
+
+    @property
+    def query_pushdown(self) -> bool:
+        """Trasladar los filtros a la búsqueda de Gmail (q=)"""
+        return self._get_bool("ADVANCED", "query_pushdown", True)
+
+    @property
+    def query_has_attachment(self) -> bool:
+        """Añadir has:attachment a la búsqueda de Gmail (excluye partes inline con nombre)"""
+        return self._get_bool("ADVANCED", "query_has_attachment", True)
 
     @property
     def retry_attempts(self) -> int:
         """Intentos de reintento"""
         return self._get_int("ADVANCED", "retry_attempts", 3)
 
+    @property
+    def retry_delay(self) -> int:
+        """Espera base entre reintentos (segundos)"""
+        return self._get_int("ADVANCED", "retry_delay", 5)
+
+    @property
+    def batch_size(self) -> int:
+        """Operaciones por petición batch (máximo 100, 0 o 1 = sin batch)"""
+        return min(max(self._get_int("ADVANCED", "batch_size", 50), 0), 100)
+
+    @property
+    def max_workers(self) -> int:
+        """Número de workers concurrentes (1 = secuencial)"""
+        return max(self._get_int("ADVANCED", "max_workers", 1), 1)
+
+    @property
+    def use_pipeline(self) -> bool:
+        """Procesar en pipeline por etapas con colas acotadas"""
+        return self._get_bool("ADVANCED", "use_pipeline", False)
+
+    @property
+    def metadata_workers(self) -> int:
+        """Workers de la etapa de metadatos del pipeline"""
+        return max(self._get_int("ADVANCED", "metadata_workers", 4), 1)
+
+    @property
+    def fetch_workers(self) -> int:
+        """Workers de la etapa de descarga de adjuntos del pipeline"""
+        return max(self._get_int("ADVANCED", "fetch_workers", 8), 1)
+
+    @property
+    def writer_workers(self) -> int:
+        """Workers de la etapa de escritura en disco del pipeline"""
+        return max(self._get_int("ADVANCED", "writer_workers", 1), 1)
+
+    @property
+    def pipeline_queue_size(self) -> int:
+        """Capacidad de cada cola entre etapas del pipeline"""
+        return max(self._get_int("ADVANCED", "pipeline_queue_size", 100), 1)
+
+    @property
+    def pipeline_monitor_interval(self) -> int:
+        """Segundos entre informes de profundidad de colas (0 = sin informe)"""
+        return max(self._get_int("ADVANCED", "pipeline_monitor_interval", 10), 0)
+
+    @property
+    def quota_units_per_second(self) -> int:
+        """Unidades de cuota de Gmail API por segundo y usuario"""
+        return max(self._get_int("ADVANCED", "quota_units_per_second", 250), 1)
+
+    @property
+    def max_concurrent_requests(self) -> int:
+        """Máximo de peticiones simultáneas a Gmail API"""
+        return max(self._get_int("ADVANCED", "max_concurrent_requests", 10), 1)
+
     @property
     def connection_timeout(self) -> int:
         """Timeout de conexión (segundos)"""
         return self._get_int("ADVANCED", "connection_timeout", 30)
 
+    @property
+    def read_timeout(self) -> int:
+        """Timeout de lectura de cada respuesta (segundos, transporte requests)"""
+        return max(self._get_int("ADVANCED", "read_timeout", 60), 1)
+
+    @property
+    def http_transport(self) -> str:
+        """Transporte HTTP (requests con pool compartido o httplib2 por hilo)"""
+        return self._get_choice("ADVANCED", "http_transport", ("requests", "httplib2"), "requests")
+
+    @property
+    def http_pool_size(self) -> int:
+        """Conexiones keep-alive del pool (0 = max_concurrent_requests)"""
+        return max(self._get_int("ADVANCED", "http_pool_size", 0), 0)
+
+    @property
+    def discovery_cache_file(self) -> Optional[Path]:
+        """Copia fijada del documento de descubrimiento de Gmail API (vacío = sin caché)"""
+        cache_path = self._get("ADVANCED", "discovery_cache_file", "logs/gmail_discovery.json").strip()
+        return Path(cache_path) if cache_path else None
+
     # ========================================================================
     # BACKUP
     # ========================================================================
@@ -295,9 +643,20 @@ class ConfigManager:
 
     @property
     def compress_downloads(self) -> bool:
-        """Comprimir descargas en ZIP"""
+        """Guardar las descargas en un archivo por trimestre en lugar de en carpetas"""
         return self._get_bool("BACKUP", "compress_downloads", False)
 
+    @property
+    def archive_format(self) -> str:
+        """Formato de los archivos por trimestre (zip, tar o tar.zst)"""
+        archive_format = self._get_choice("BACKUP", "archive_format", ("zip", "tar", "tar.zst"), "zip")
+        if archive_format == "tar.zst" and self.compress_downloads:
+            from .archive import zstd_available
+
+            if not zstd_available():
+                raise ValueError("[BACKUP] archive_format = tar.zst necesita el paquete zstandard (pip install zstandard)")
+        return archive_format
+
     # ========================================================================
     # UTILIDADES PRIVADAS
     # ========================================================================
@@ -311,18 +670,34 @@ class ConfigManager:
 
     def _get_bool(self, section: str, option: str, default: bool = False) -> bool:
         """Obtiene valor de configuración (booleano)"""
-        try:
-            value = self.config.get(section, option).lower().strip()
-            return value in ("true", "1", "yes", "on")
-        except Exception:
+        value = self._get(section, option).lower().strip()
+        if not value:
             return default
+        if value in TRUE_VALUES:
+            return True
+        if value in FALSE_VALUES:
+            return False
+        raise ValueError(
+            f"[{section}] {option} = {value!r}: se esperaba un booleano "
+            f"({', '.join(TRUE_VALUES + FALSE_VALUES)})"
+        )
 
     def _get_int(self, section: str, option: str, default: int = 0) -> int:
         """Obtiene valor de configuración (entero)"""
-        try:
-            return int(self.config.get(section, option))
-        except Exception:
+        value = self._get(section, option).strip()
+        if not value:
             return default
+        try:
+            return int(value)
+        except ValueError:
+            raise ValueError(f"[{section}] {option} = {value!r}: se esperaba un número entero")
+
+    def _get_choice(self, section: str, option: str, choices: Tuple[str, ...], default: str) -> str:
+        """Obtiene valor de configuración (uno de varios valores permitidos)"""
+        value = self._get(section, option, default).strip().lower()
+        if value not in choices:
+            raise ValueError(f"[{section}] {option} = {value!r}: valores permitidos: {', '.join(choices)}")
+        return value
 
     def to_dict(self) -> Dict[str, Any]:
         """Convierte toda la configuración a diccionario"""
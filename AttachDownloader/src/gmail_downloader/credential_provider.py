@@ -0,0 +1,274 @@
+"""
+AttachDownloader - Proveedor de credenciales compartidas
+Token OAuth 2.0 renovado en segundo plano antes de caducar, con un único
+refresco para todos los hilos y coordinación entre procesos mediante un
+bloqueo de archivo. El token se guarda de forma atómica.
+"""
+
+import json
+import os
+import pickle
+import tempfile
+import threading
+import time
+from contextlib import contextmanager
+from datetime import datetime, timezone
+from pathlib import Path
+from typing import Optional
+
+from google.oauth2.credentials import Credentials
+
+
+# Reintento del refresco en segundo plano tras un fallo y espera mínima entre
+# refrescos, aunque el token dure menos que el margen (segundos)
+REFRESH_RETRY_DELAY = 30
+
+# Un token obtenido hace menos de estos segundos no se vuelve a renovar bajo
+# demanda: quien lo pide comprobó la validez antes de que otro hilo lo renovara
+RECENT_REFRESH_WINDOW = 30
+
+
+def seconds_left(creds: Credentials) -> Optional[float]:
+    """Segundos hasta que caduca el token (None si no tiene caducidad)"""
+    if creds is None or not creds.token or creds.expiry is None:
+        return None
+    expiry = creds.expiry
+    # google-auth guarda expiry en UTC sin zona horaria; se marca como UTC
+    # para compararlo con una hora con zona, no por convención
+    if expiry.tzinfo is None:
+        expiry = expiry.replace(tzinfo=timezone.utc)
+    return (expiry - datetime.now(timezone.utc)).total_seconds()
+
+
+class TokenStore:
+    """
+    Archivo del token (pickle) protegido por un bloqueo entre procesos
+
+    El bloqueo es un archivo <token>.lock aparte (flock en POSIX, msvcrt en
+    Windows), de modo que lectores y escritores de varios procesos no pisan
+    el token. La escritura va a un temporal que sustituye al archivo con
+    os.replace: nunca queda un token a medio escribir.
+    """
+
+    def __init__(self, token_file):
+        """
+        Args:
+            token_file: Ruta del archivo del token
+        """
+        self.token_file = Path(token_file)
+        self.lock_file = self.token_file.with_name(self.token_file.name + ".lock")
+
+    @contextmanager
+    def lock(self):
+        """Bloqueo exclusivo entre procesos (espera a que lo libere quien lo tenga)"""
+        self.lock_file.parent.mkdir(parents=True, exist_ok=True)
+        with open(self.lock_file, "a+b") as handle:
+            if os.name == "nt":
+                import msvcrt
+
+                handle.seek(0)
+                while True:
+                    try:
+                        # LK_LOCK reintenta durante 10 s antes de fallar
+                        msvcrt.locking(handle.fileno(), msvcrt.LK_LOCK, 1)
+                        break
+                    except OSError:
+                        continue
+                try:
+                    yield
+                finally:
+                    handle.seek(0)
+                    msvcrt.locking(handle.fileno(), msvcrt.LK_UNLCK, 1)
+            else:
+                import fcntl
+
+                fcntl.flock(handle.fileno(), fcntl.LOCK_EX)
+                try:
+                    yield
+                finally:
+                    fcntl.flock(handle.fileno(), fcntl.LOCK_UN)
+
+    def load(self) -> Optional[Credentials]:
+        """
+        Lee el token guardado
+
+        Returns:
+            Optional[Credentials]: Credenciales, o None si no hay token legible
+        """
+        try:
+            with open(self.token_file, "rb") as token:
+                return pickle.load(token)
+        except FileNotFoundError:
+            return None
+        except (pickle.UnpicklingError, EOFError, AttributeError, ValueError) as e:
+            print(f"⚠️  Token ilegible en {self.token_file}, se ignorará: {e}")
+            return None
+
+    def save(self, creds: Credentials) -> None:
+        """
+        Guarda el token de forma atómica (temporal + os.replace)
+
+        Args:
+            creds: Credenciales a guardar (se guarda una copia sin estado compartido)
+        """
+        plain = Credentials.from_authorized_user_info(json.loads(creds.to_json()))
+        self.token_file.parent.mkdir(parents=True, exist_ok=True)
+        fd, tmp_path = tempfile.mkstemp(prefix=self.token_file.name + ".", suffix=".tmp",
+                                        dir=str(self.token_file.parent))
+        try:
+            with os.fdopen(fd, "wb") as token:
+                pickle.dump(plain, token)
+                token.flush()
+                os.fsync(token.fileno())
+            os.replace(tmp_path, self.token_file)
+        except BaseException:
+            try:
+                os.unlink(tmp_path)
+            except OSError:
+                pass
+            raise
+
+
+class SharedCredentials(Credentials):
+    """
+    Credenciales compartidas por todos los hilos del proceso
+
+    Los transportes (AuthorizedSession, AuthorizedHttp) llaman a refresh()
+    cuando el token deja de ser válido o tras un 401. Aquí ese refresco se
+    delega en el CredentialProvider, que lo serializa: el primer hilo
+    refresca y los demás reutilizan el token nuevo.
+    """
+
+    provider = None
+
+    @classmethod
+    def from_credentials(cls, creds: Credentials) -> "SharedCredentials":
+        """Copia unas credenciales OAuth de usuario"""
+        return cls.from_authorized_user_info(json.loads(creds.to_json()))
+
+    def refresh(self, request) -> None:
+        """Refresca el token a través del proveedor (una vez para todos los hilos)"""
+        if self.provider is None:
+            self._refresh_now(request)
+        else:
+            # El token con el que ha fallado: si al llegar al proveedor ya es
+            # otro, algún hilo lo ha renovado y no hace falta pedir uno nuevo
+            self.provider.refresh(request, stale_token=self.token)
+
+    def _refresh_now(self, request) -> None:
+        """Refresco real contra el servidor de tokens de Google"""
+        super().refresh(request)
+
+
+class CredentialProvider:
+    """
+    Mantiene vigente el token de unas SharedCredentials durante toda la ejecución
+
+    Un hilo en segundo plano refresca el token refresh_margin segundos antes
+    de que caduque, así los workers nunca lo ven caducado ni reciben 401. Si
+    otro proceso ya lo ha refrescado (el archivo del token tiene uno vigente),
+    se adopta ese token en lugar de pedir otro.
+    """
+
+    def __init__(self, credentials: SharedCredentials, store: TokenStore, refresh_margin: int = 600):
+        """
+        Args:
+            credentials: Credenciales compartidas (se enlazan a este proveedor)
+            store: Archivo del token
+            refresh_margin: Segundos antes de la caducidad en que se refresca (0 = solo bajo demanda)
+        """
+        self.credentials = credentials
+        self.store = store
+        self.refresh_margin = refresh_margin
+        self.refreshes = 0
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+        self._request = None
+        self._refreshed_at = float("-inf")
+        credentials.provider = self
+
+    def _is_fresh(self, margin: float) -> bool:
+        """Indica si el token actual es válido y le quedan más de margin segundos"""
+        if not self.credentials.valid:
+            return False
+        left = seconds_left(self.credentials)
+        return left is None or left > margin
+
+    def _adopt(self, stored: Credentials) -> None:
+        """Usa el token que otro proceso acaba de guardar"""
+        self.credentials.token = stored.token
+        self.credentials.expiry = stored.expiry
+        self._refreshed_at = time.monotonic()
+
+    def refresh(self, request=None, margin: float = 0, stale_token: Optional[str] = None) -> bool:
+        """
+        Refresca el token si no es válido o le quedan menos de margin segundos
+
+        Los hilos que llegan mientras otro refresca esperan y reutilizan su
+        resultado; entre procesos, el bloqueo del archivo hace lo mismo.
+
+        Args:
+            request: Transporte de google.auth (por defecto, uno propio)
+            margin: Segundos de vigencia que se exigen al token actual
+            stale_token: Token rechazado por la API (p. ej. tras un 401): se
+                renueva aunque parezca vigente, salvo que ya no sea el actual
+
+        Returns:
+            bool: True si se ha pedido un token nuevo a Google
+        """
+        with self._lock:
+            if stale_token is not None:
+                recent = time.monotonic() - self._refreshed_at < RECENT_REFRESH_WINDOW
+                if self.credentials.valid and (self.credentials.token != stale_token or recent):
+                    return False
+            elif self._is_fresh(margin):
+                return False
+            with self.store.lock():
+                stored = self.store.load()
+                if (stored is not None and stored.token
+                        and stored.token not in (self.credentials.token, stale_token)):
+                    left = seconds_left(stored)
+                    if left is not None and left > max(margin, 0) and not stored.expired:
+                        self._adopt(stored)
+                        return False
+                if request is None:
+                    if self._request is None:
+                        from google.auth.transport.requests import Request
+
+                        self._request = Request()
+                    request = self._request
+                self.credentials._refresh_now(request)
+                self.store.save(self.credentials)
+                self._refreshed_at = time.monotonic()
+                self.refreshes += 1
+                return True
+
+    def start(self) -> None:
+        """Arranca el refresco en segundo plano (si hay margen configurado)"""
+        if self.refresh_margin <= 0 or self._thread is not None:
+            return
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._run, name="token-refresh", daemon=True)
+        self._thread.start()
+
+    def stop(self) -> None:
+        """Detiene el refresco en segundo plano"""
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join(timeout=5)
+            self._thread = None
+
+    def _run(self) -> None:
+        """Bucle del hilo: espera hasta refresh_margin antes de la caducidad y refresca"""
+        while not self._stop.is_set():
+            left = seconds_left(self.credentials)
+            wait = self.refresh_margin if left is None else max(left - self.refresh_margin, REFRESH_RETRY_DELAY)
+            if self._stop.wait(wait):
+                return
+            try:
+                self.refresh(margin=self.refresh_margin)
+            except Exception as e:
+                print(f"⚠️  No se pudo renovar el token en segundo plano: {e}")
+                if self._stop.wait(REFRESH_RETRY_DELAY):
+                    return
@@ -0,0 +1,103 @@
+"""
+AttachDownloader - Módulo de documento de descubrimiento
+Carga el documento de descubrimiento de Gmail API una sola vez por proceso,
+desde una copia fijada en disco, sin descargarlo ni reparsearlo en cada build()
+"""
+
+import json
+import os
+import threading
+from pathlib import Path
+from typing import Dict, Optional, Tuple
+
+
+# Documento de descubrimiento de Gmail API v1 en los servidores de Google
+DISCOVERY_URL = "https://gmail.googleapis.com/$discovery/rest?version=v1"
+
+# Documentos ya cargados en este proceso: (archivo de caché, endpoint) -> JSON
+_documents: Dict[Tuple[Optional[str], Optional[str]], str] = {}
+_lock = threading.Lock()
+
+
+def load_discovery_document(cache_file: Optional[Path] = None, api_endpoint: Optional[str] = None,
+                            timeout: int = 30) -> str:
+    """
+    Devuelve el documento de descubrimiento de Gmail API v1
+
+    Orden de búsqueda: memoria del proceso, cache_file, copia incluida en
+    googleapiclient y, como último recurso, descarga desde Google. La primera
+    vez se guarda en cache_file, que queda fijado: actualizar googleapiclient
+    no cambia el documento usado hasta que se borre el archivo.
+
+    Args:
+        cache_file: Copia en disco del documento (None = no usar caché en disco)
+        api_endpoint: URL base alternativa (p. ej. el emulador local)
+        timeout: Timeout de la descarga (segundos)
+
+    Returns:
+        str: Documento en JSON, listo para build_from_document()
+    """
+    key = (str(cache_file) if cache_file else None, api_endpoint)
+    with _lock:
+        document = _documents.get(key)
+        if document is None:
+            document = _read_document(Path(cache_file) if cache_file else None, timeout)
+            if api_endpoint:
+                document = _point_to(document, api_endpoint)
+            _documents[key] = document
+    # Se devuelve el texto y no el dict: build_from_document() modifica el
+    # documento al crear cada recurso y los workers construyen clientes en paralelo
+    return document
+
+
+def _read_document(cache_file: Optional[Path], timeout: int) -> str:
+    """Lee el documento de la caché en disco o lo obtiene y lo guarda en ella"""
+    if cache_file is not None:
+        try:
+            document = cache_file.read_text(encoding="utf-8")
+            json.loads(document)
+            return document
+        except FileNotFoundError:
+            pass
+        except (OSError, ValueError) as e:
+            print(f"⚠️ Documento de descubrimiento en caché no válido ({cache_file}): {e}")
+
+    from googleapiclient.discovery_cache import get_static_doc
+
+    document = get_static_doc("gmail", "v1")
+    if document is None:
+        document = _fetch(timeout)
+    if cache_file is not None:
+        try:
+            cache_file.parent.mkdir(parents=True, exist_ok=True)
+            tmp_path = cache_file.with_name(cache_file.name + ".tmp")
+            tmp_path.write_text(document, encoding="utf-8")
+            os.replace(tmp_path, cache_file)
+        except OSError as e:
+            print(f"⚠️ No se pudo guardar el documento de descubrimiento: {e}")
+    return document
+
+
+def _fetch(timeout: int) -> str:
+    """Descarga el documento de los servidores de Google"""
+    import httplib2
+
+    response, content = httplib2.Http(timeout=timeout).request(DISCOVERY_URL)
+    if response.status != 200:
+        raise RuntimeError(f"No se pudo descargar el documento de descubrimiento de Gmail (HTTP {response.status})")
+    document = content.decode("utf-8")
+    json.loads(document)
+    return document
+
+
+def _point_to(document: str, api_endpoint: str) -> str:
+    """
+    Reescribe las URLs del documento para usar otro endpoint
+
+    client_options={"api_endpoint": ...} no cambia la URL de las peticiones
+    batch (se toma de rootUrl), así que se reescribe rootUrl en el documento.
+    """
+    data = json.loads(document)
+    data["rootUrl"] = data["mtlsRootUrl"] = api_endpoint
+    data["baseUrl"] = api_endpoint + data.get("servicePath", "")
+    return json.dumps(data)
@@ -3,95 +3,710 @@ AttachDownloader - Módulo para descargar y organizar adjuntos de Gmail
 Estructura inteligente: <Año>/<Trimestre>/<Remitente>/
 """
 
-import base64
-import os
-from typing import List
+import hashlib
+import threading
+import time
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+from itertools import islice
+from typing import TYPE_CHECKING, Callable, Iterable, Iterator, List, Optional, Union
 from pathlib import Path
 from datetime import datetime
-from googleapiclient.discovery import build
-from google.oauth2.credentials import Credentials
-from .config import ConfigManager
+from googleapiclient.errors import HttpError
+from .archive import ArchiveSink
+from .batch import BatchExecutor
+from .config import ConfigManager, ConfigSnapshot
+from .discovery import load_discovery_document
+from .filters import FilterPlan
+from .file_writer import decoded_size, iter_decoded_chunks
+from .journal import RunJournal
+from .manifest import DownloadManifest
+from .metrics import MetricsRegistry
+from .pipeline import Pipeline
+from .plan import DownloadPlan
+from .query import GmailQueryBuilder, MAX_PAGE_SIZE
+from .scheduler import RequestScheduler
+from .storage import create_storage
+from .sync_state import SyncStateStore
+from .transport import create_transport
+
+if TYPE_CHECKING:
+    from google.oauth2.credentials import Credentials
+
+
+# Máscara de campos de messages.get: solo cabeceras, fecha interna y la
+# descripción de las partes (sin cuerpos ni datos en línea)
+MESSAGE_FIELDS = "id,internalDate,payload(headers(name,value),parts(partId,filename,body(attachmentId,size)))"
+
+# Tope de datos (según body.size) por petición batch de adjuntos: la respuesta
+# de un batch llega entera a memoria, así que los adjuntos grandes se piden solos
+BATCH_ATTACHMENT_BYTES = 8 * 1024 * 1024
+
+
+# Contadores que siempre aparecen en las estadísticas, aunque valgan 0
+STAT_KEYS = (
+    "total_emails",
+    "emails_with_attachments",
+    "files_downloaded",
+    "files_filtered",
+    "files_skipped",
+    "files_deduplicated",
+    "bytes_deduplicated",
+    "bytes_downloaded",
+    "emails_excluded_by_query",
+    "download_errors",
+    "api_retries",
+    "api_throttled",
+)
 
 
 class GmailAttachmentDownloader:
     """Clase para descargar adjuntos de Gmail"""
 
-    def __init__(self, credentials: Credentials, config: ConfigManager = None):
+    def __init__(self, credentials: "Credentials", config: Union[ConfigManager, ConfigSnapshot] = None,
+                 service_factory: Optional[Callable[[], object]] = None):
         """
         Inicializa el descargador
 
         Args:
             credentials: Credenciales de Gmail API
-            config: Instancia de ConfigManager (si es None, carga la configuración por defecto)
+            config: ConfigManager o ConfigSnapshot (si es None, carga la configuración por defecto)
+            service_factory: Crea el cliente de Gmail API en lugar de build() (p. ej. un
+                buzón sintético en los benchmarks); se llama una vez por hilo
         """
-        self.config = config or ConfigManager()
-        self.service = build("gmail", "v1", credentials=credentials)
+        config = config or ConfigManager()
+        # Solo se lee la instantánea validada: sin reparseos en el camino caliente
+        self.config = config if isinstance(config, ConfigSnapshot) else config.snapshot()
+        self.credentials = credentials
+        self._service_factory = service_factory
+        # Transporte HTTP compartido por los clientes de todos los hilos (si es thread-safe)
+        self._shared_http = None
+        self._http_lock = threading.Lock()
+        self.service = self._build_service()
+        self.metrics = MetricsRegistry()
+        self.scheduler = RequestScheduler(
+            quota_units_per_second=self.config.quota_units_per_second,
+            max_concurrency=self.config.max_concurrent_requests,
+            retry_attempts=self.config.retry_attempts,
+            retry_delay=self.config.retry_delay,
+            metrics=self.metrics,
+        )
+        self._thread_local = threading.local()
+        self._write_lock = threading.Lock()
         self.download_folder = self.config.download_folder
-        self.download_folder.mkdir(parents=True, exist_ok=True)
-        self.stats = {
-            "total_emails": 0,
-            "emails_with_attachments": 0,
-            "files_downloaded": 0,
-            "files_filtered": 0,
-        }
+        # Destino de los adjuntos: con compress_downloads, un archivo por
+        # trimestre; si no, el de storage_backend (carpetas locales, memoria, S3)
+        self.storage = (
+            ArchiveSink(self.download_folder, self.config.archive_format)
+            if self.config.compress_downloads
+            else create_storage(self.config)
+        )
+        self.filters = FilterPlan(self.config)
+        self.sync_state = SyncStateStore(self.config.sync_state_file)
+        self.manifest = (
+            DownloadManifest(self.config.history_file)
+            if self.config.save_download_history
+            else None
+        )
+        self.journal = RunJournal(self.config.journal_file, self.config.journal_flush_interval)
+        self._open_jobs = {}
+        self._open_jobs_lock = threading.Lock()
+        # Mensajes con algún fallo: quedan pendientes en el diario para reintentarlos
+        self._failed_messages = set()
+        self._failed_lock = threading.Lock()
+        self._profile = None
+        # El historyId solo avanza si se ha listado todo el buzón, sin límite y sin errores
+        self._listing_complete = False
+        self._truncated = False
+        self.plan: Optional[DownloadPlan] = None
+
+    @property
+    def stats(self) -> dict:
+        """Contadores de la ejecución (vista de las métricas, con los habituales a 0)"""
+        stats = dict.fromkeys(STAT_KEYS, 0)
+        stats.update(self.metrics.counters())
+        return stats
 
-    def download_all_attachments(self) -> dict:
+    def download_all_attachments(self, resume: bool = False, plan: Optional[DownloadPlan] = None) -> dict:
         """
         Descarga todos los adjuntos de todos los correos
 
+        Los mensajes se procesan a medida que se listan, sin esperar a tener
+        todos los IDs del buzón en memoria. El progreso se registra en el diario
+        de ejecución para poder reanudar si la ejecución se interrumpe.
+
+        Args:
+            resume: Continuar desde el diario de una ejecución interrumpida
+            plan: Plan generado con build_plan(); solo se descargan sus adjuntos,
+                sin listar el buzón
+
         Returns:
             dict: Estadísticas de la descarga
         """
+        self.plan = plan
+        if plan is not None:
+            print(f"📋 Ejecutando plan: {len(plan.attachments)} adjuntos, "
+                  f"{plan.total_bytes / 1024 / 1024:.1f} MB")
+
+        if resume:
+            if not self.journal.load():
+                print("⚠️ No hay ninguna ejecución interrumpida: se empieza desde el principio")
+        elif self.journal.exists():
+            print("⚠️ Se descarta el diario de una ejecución interrumpida (usa --resume para continuarla)")
+
+        completed = False
         try:
-            # Obtener lista de mensajes
-            messages = self._get_all_messages()
-            print(f"📧 Total de correos encontrados: {len(messages)}")
-            self.stats["total_emails"] = len(messages)
+            batch_size = self.config.batch_size
+            max_workers = self.config.max_workers
+            if batch_size > 1:
+                print(f"📦 Peticiones batch de hasta {batch_size} operaciones")
 
-            # Procesar cada mensaje
-            for msg_id in messages:
-                self._download_message_attachments(msg_id)
+            if self.config.use_pipeline:
+                self._run_pipeline()
+            elif max_workers > 1:
+                # Procesar cada mensaje (o cada grupo si se usan peticiones batch)
+                print(f"⚡ Descarga concurrente con {max_workers} workers")
+                if batch_size > 1:
+                    task = self._download_message_batch
+                    work = self._chunked(self.iter_message_ids(), batch_size)
+                else:
+                    task = self._download_message_attachments
+                    work = self.iter_message_ids()
+                self._run_concurrent(task, work, max_workers)
+            elif batch_size > 1:
+                for msg_ids in self._chunked(self.iter_message_ids(), batch_size):
+                    self._download_message_batch(msg_ids)
+            else:
+                for part, msg_id, subject, sender, email_date in self.iter_attachments():
+                    self._download_attachment(part, msg_id, subject, sender, email_date)
 
+            print(f"📧 Total de correos encontrados: {self.stats['total_emails']}")
+            if self.plan is None:
+                self._save_sync_state()
+            completed = True
             return self.stats
 
         except Exception as e:
             print(f"❌ Error al descargar adjuntos: {e}")
             raise
 
-    def _get_all_messages(self) -> List[str]:
+        finally:
+            if completed and not self.stats["download_errors"]:
+                self.journal.finish()
+            else:
+                # Error, Ctrl-C o SIGTERM: guardar el progreso antes de salir
+                self.journal.flush(force=True)
+                print(f"💾 Progreso guardado en {self.journal.journal_file}")
+            self._write_metrics()
+
+    def build_plan(self) -> DownloadPlan:
         """
-        Obtiene IDs de todos los mensajes
+        Calcula qué se descargaría, sin descargar nada
+
+        Lista los mensajes y obtiene sus metadatos igual que una ejecución normal,
+        aplica los mismos filtros (incluido el historial de descargas) y anota
+        cada adjunto con su carpeta destino y su tamaño (body.size).
 
         Returns:
-            List[str]: Lista de IDs de mensajes
+            DownloadPlan: Plan con los adjuntos previstos y la cuota estimada
         """
+        plan = DownloadPlan(query=self._build_query())
+        for msg_ids in self._chunked(self.iter_message_ids(), max(self.config.batch_size, 1)):
+            for part, msg_id, part_id, sender, email_date in self._prepare_attachment_jobs(msg_ids):
+                plan.add(
+                    self._relative_folder(sender, email_date).as_posix(),
+                    self._sanitize_filename(part["filename"]),
+                    msg_id,
+                    part_id,
+                    part["body"].get("size", 0),
+                )
+
+        units = self.scheduler.units_used
+        plan.listing_units = sum(units.get(method, 0) for method in ("getProfile", "history.list", "messages.list"))
+        plan.metadata_units = units.get("messages.get", 0)
+        plan.messages_scanned = self.stats["total_emails"]
+        return plan
+
+    def _write_metrics(self) -> None:
+        """Escribe el textfile de Prometheus y el resumen JSON de la ejecución"""
+        if not self.config.metrics_file and not self.config.metrics_summary_file:
+            return
         try:
-            max_emails = self.config.max_emails_to_process
-            
-            results = self.service.users().messages().list(userId="me").execute()
-            messages = results.get("messages", [])
+            self.metrics.write(self.config.metrics_file, self.config.metrics_summary_file)
+        except OSError as e:
+            print(f"⚠️ No se pudieron guardar las métricas: {e}")
 
-            # Manejar paginación
-            while "nextPageToken" in results:
-                if max_emails > 0 and len(messages) >= max_emails:
-                    break
-                results = (
-                    self.service.users()
-                    .messages()
-                    .list(userId="me", pageToken=results["nextPageToken"])
-                    .execute()
+    def close(self) -> None:
+        """Libera los recursos persistentes (manifiesto, destino y conexiones HTTP)"""
+        self.storage.close()
+        if self.manifest:
+            self.manifest.close()
+            self.manifest = None
+        if self._shared_http is not None:
+            self._shared_http.close()
+            self._shared_http = None
+
+    def _build_service(self):
+        """
+        Crea un cliente de Gmail API sobre el transporte HTTP configurado
+
+        El documento de descubrimiento se lee una vez por proceso de la copia
+        fijada en disco, y las bibliotecas de Google se importan aquí, al crear
+        el primer cliente, en lugar de al arrancar el programa.
+
+        Returns:
+            Resource: Cliente de Gmail API
+        """
+        if self._service_factory is not None:
+            return self._service_factory()
+        from googleapiclient.discovery import build_from_document
+
+        document = load_discovery_document(
+            self.config.discovery_cache_file, self.config.api_endpoint, self.config.connection_timeout
+        )
+        return build_from_document(document, http=self._http())
+
+    def _http(self):
+        """
+        Transporte HTTP para un cliente nuevo
+
+        Con requests todos los clientes comparten una sesión con pool de
+        conexiones keep-alive; httplib2 no es thread-safe y cada cliente tiene
+        el suyo.
+
+        Returns:
+            Objeto con la interfaz de httplib2.Http
+        """
+        config = self.config
+        if config.http_transport != "requests":
+            return create_transport(config.http_transport, self.credentials,
+                                    connect_timeout=config.connection_timeout)
+        with self._http_lock:
+            if self._shared_http is None:
+                self._shared_http = create_transport(
+                    "requests", self.credentials,
+                    pool_size=config.http_pool_size or config.max_concurrent_requests,
+                    connect_timeout=config.connection_timeout,
+                    read_timeout=config.read_timeout,
                 )
-                messages.extend(results.get("messages", []))
+            return self._shared_http
 
-            # Aplicar límite
-            if max_emails > 0:
-                messages = messages[:max_emails]
+    def _execute(self, request, method: str):
+        """
+        Ejecuta una petición a través del planificador de cuota y reintentos
 
-            return [msg["id"] for msg in messages]
+        Args:
+            request: Petición de googleapiclient
+            method: Método de Gmail API (para el coste en cuota)
 
-        except Exception as e:
-            print(f"❌ Error al obtener mensajes: {e}")
-            return []
+        Returns:
+            dict: Respuesta de la petición
+        """
+        return self.scheduler.execute(request, method)
+
+    def _get_service(self):
+        """
+        Obtiene el cliente de Gmail API del hilo actual
+
+        Cada worker crea el suyo la primera vez que lo necesita: build_from_document()
+        completa el documento de descubrimiento al crear cada recurso, y con httplib2
+        el transporte tampoco es thread-safe. Con el transporte requests todos los
+        clientes comparten el mismo pool de conexiones.
+
+        Returns:
+            Resource: Cliente de Gmail API
+        """
+        if threading.current_thread() is threading.main_thread():
+            return self.service
+        service = getattr(self._thread_local, "service", None)
+        if service is None:
+            service = self._build_service()
+            self._thread_local.service = service
+        return service
+
+    def _increment_stat(self, key: str, amount: int = 1) -> None:
+        """
+        Incrementa un contador de estadísticas de forma thread-safe
+
+        Args:
+            key: Nombre del contador
+            amount: Cantidad a sumar
+        """
+        self.metrics.inc(key, amount)
+
+    def _record_error(self, msg_id: str, message: str) -> None:
+        """
+        Registra el fallo de un mensaje o de uno de sus adjuntos
+
+        Args:
+            msg_id: ID del mensaje afectado
+            message: Aviso a mostrar
+        """
+        print(message)
+        self._increment_stat("download_errors")
+        with self._failed_lock:
+            self._failed_messages.add(msg_id)
+
+    def _message_done(self, msg_id: str) -> None:
+        """
+        Marca un mensaje como terminado en el diario si todos sus adjuntos se guardaron
+
+        Args:
+            msg_id: ID del mensaje
+        """
+        with self._failed_lock:
+            if msg_id in self._failed_messages:
+                return
+        self.journal.message_done(msg_id)
+
+    def iter_message_ids(self) -> Iterator[str]:
+        """
+        Genera los IDs a procesar según el modo de ejecución, página a página
+
+        En modo incremental solo se recogen los mensajes añadidos desde la última
+        sincronización; si no hay historial válido se hace un escaneo completo.
+        El límite max_emails_to_process se aplica sin pedir páginas de más.
+
+        Yields:
+            str: ID de cada mensaje
+        """
+        if self.plan is not None:
+            for msg_id in self._iter_plan_messages():
+                self._increment_stat("total_emails")
+                yield msg_id
+            return
+
+        # Capturar el historyId antes de listar para no perder correos que
+        # lleguen durante la ejecución (solo si se va a usar: cuesta cuota)
+        if self._needs_profile():
+            self._get_profile()
+
+        messages = None
+        if self.config.execution_mode.strip().lower() == "incremental":
+            messages = self._iter_new_messages()
+            if messages is None:
+                print("🔄 Sin historial válido: se realiza un escaneo completo")
+        if messages is None:
+            messages = self._iter_all_messages()
+
+        max_emails = self.config.max_emails_to_process
+        if max_emails > 0:
+            messages = islice(messages, max_emails)
+
+        count = 0
+        for msg_id in messages:
+            count += 1
+            self._increment_stat("total_emails")
+            yield msg_id
+        # Alcanzar el límite cuenta como corte: puede haber mensajes sin procesar
+        if max_emails > 0 and count >= max_emails:
+            self._truncated = True
+
+    def iter_attachments(self) -> Iterator[tuple]:
+        """
+        Genera los adjuntos de los mensajes que pasan los filtros de remitente y fecha
+
+        Yields:
+            tuple: (parte, ID de mensaje, asunto, remitente, fecha) de cada adjunto
+        """
+        for msg_id in self.iter_message_ids():
+            try:
+                message = self._execute(self._message_request(self._get_service(), msg_id), "messages.get")
+                attachments = self._get_message_attachments(message)
+            except Exception as e:
+                self._record_error(msg_id, f"⚠️ Error procesando mensaje {msg_id}: {e}")
+                attachments = []
+
+            for part, subject, sender, email_date in attachments:
+                yield part, msg_id, subject, sender, email_date
+            self._message_done(msg_id)
+
+    def _run_concurrent(self, task: Callable, work: Iterable, max_workers: int) -> None:
+        """
+        Ejecuta las tareas en un pool limitando las que hay pendientes
+
+        Solo se toman nuevos elementos del iterador cuando hay hueco, de modo que
+        la memoria no crece con el tamaño del buzón.
+
+        Args:
+            task: Función a ejecutar por cada elemento
+            work: Iterador de elementos (IDs o grupos de IDs)
+            max_workers: Número de workers
+        """
+        with ThreadPoolExecutor(max_workers=max_workers) as executor:
+            in_flight = set()
+            for item in work:
+                if len(in_flight) >= max_workers * 2:
+                    done, in_flight = wait(in_flight, return_when=FIRST_COMPLETED)
+                    # result() para propagar cualquier excepción de los workers
+                    for future in done:
+                        future.result()
+                in_flight.add(executor.submit(task, item))
+
+            for future in in_flight:
+                future.result()
+
+    @staticmethod
+    def _chunked(iterable: Iterable, size: int) -> Iterator[list]:
+        """
+        Agrupa un iterador en listas de tamaño fijo sin materializarlo
+
+        Args:
+            iterable: Elementos a agrupar
+            size: Tamaño de cada grupo
+
+        Yields:
+            list: Siguiente grupo (el último puede ser menor)
+        """
+        iterator = iter(iterable)
+        while True:
+            chunk = list(islice(iterator, size))
+            if not chunk:
+                return
+            yield chunk
+
+    def _iter_new_messages(self) -> Optional[Iterator[str]]:
+        """
+        Prepara el recorrido de los mensajes añadidos desde el último historyId guardado
+
+        La primera página se pide de inmediato para poder decidir si el historial
+        sigue siendo válido antes de empezar a procesar mensajes.
+
+        Returns:
+            Optional[Iterator[str]]: IDs nuevos, o None si hay que hacer un escaneo completo
+        """
+        profile = self._get_profile()
+        account = profile.get("emailAddress")
+        start_history_id = self.sync_state.get_history_id(account) if account else None
+        if not start_history_id:
+            return None
+
+        print(f"🔄 Sincronización incremental desde historyId {start_history_id}")
+        list_kwargs = {
+            "userId": "me",
+            "startHistoryId": start_history_id,
+            "historyTypes": ["messageAdded"],
+            "maxResults": MAX_PAGE_SIZE,
+        }
+        resume = self.journal.begin({
+            "account": account,
+            "source": "history",
+            "start_history_id": str(start_history_id),
+        })
+        page_token = resume["page_token"] if resume else None
+        if resume and resume["listing_complete"]:
+            self._listing_complete = True
+            return iter(())
+
+        try:
+            results = self._execute(
+                self.service.users().history().list(**list_kwargs, **self._page_kwargs(page_token)),
+                "history.list",
+            )
+        except HttpError as e:
+            # 404: el historyId ha caducado (Gmail solo lo conserva un tiempo limitado)
+            if e.resp.status == 404:
+                print(f"⚠️ El historyId {start_history_id} ha caducado")
+                return None
+            raise
+
+        return self._iter_history_pages(results, list_kwargs, page_token)
+
+    def _iter_history_pages(self, results: dict, list_kwargs: dict, page_token: Optional[str]) -> Iterator[str]:
+        """
+        Recorre las páginas de history.list y genera los mensajes añadidos
+
+        Args:
+            results: Primera página ya obtenida
+            list_kwargs: Parámetros de history.list
+            page_token: Token con el que se pidió la primera página
+
+        Yields:
+            str: ID de cada mensaje nuevo (sin repetidos, sin spam/papelera/borradores)
+        """
+        seen = set()
+        while True:
+            page_ids = []
+            for record in results.get("history", []):
+                for added in record.get("messagesAdded", []):
+                    message = added.get("message", {})
+                    msg_id = message.get("id")
+                    labels = message.get("labelIds", [])
+                    if not msg_id or msg_id in seen:
+                        continue
+                    if any(label in ("SPAM", "TRASH", "DRAFT") for label in labels):
+                        continue
+                    seen.add(msg_id)
+                    page_ids.append(msg_id)
+
+            next_token = results.get("nextPageToken")
+            yield from self.journal.start_page(page_token, page_ids, next_token)
+
+            page_token = next_token
+            if not page_token:
+                self._listing_complete = True
+                return
+            results = self._execute(
+                self.service.users().history().list(pageToken=page_token, **list_kwargs),
+                "history.list",
+            )
+
+    def _needs_profile(self) -> bool:
+        """
+        Indica si la ejecución usa el perfil del buzón
+
+        Se usa en modo incremental, para mantener al día un estado de
+        sincronización ya existente y para contar los correos excluidos por la
+        consulta. Un escaneo completo sin nada de eso no lo pide.
+
+        Returns:
+            bool: True si hay que pedir el perfil antes de listar
+        """
+        if self.config.execution_mode == "incremental" or self.config.sync_state_file.exists():
+            return True
+        return bool(self._build_query()) and self.config.max_emails_to_process <= 0
+
+    def _get_profile(self) -> dict:
+        """
+        Obtiene (una sola vez por ejecución) el perfil del buzón
+
+        Returns:
+            dict: Perfil con emailAddress, messagesTotal e historyId
+        """
+        if self._profile is None:
+            try:
+                self._profile = self._execute(
+                    self.service.users().getProfile(userId="me"), "getProfile"
+                )
+            except Exception as e:
+                print(f"⚠️ No se pudo obtener el perfil del buzón: {e}")
+                return {}
+        return self._profile
+
+    def _save_sync_state(self) -> None:
+        """
+        Guarda el historyId capturado al inicio para la próxima ejecución incremental
+
+        Solo avanza si la ejecución ha cubierto todos los mensajes: con el
+        listado incompleto, cortado por max_emails_to_process o con errores,
+        se conserva el historyId anterior y la próxima ejecución los recupera.
+        """
+        if self._profile is None:
+            # Sin historyId capturado al inicio no hay nada que guardar
+            return
+        if not self._listing_complete or self._truncated or self.stats["download_errors"]:
+            print("⚠️ Ejecución incompleta: no se avanza el estado de sincronización")
+            return
+        profile = self._profile
+        account = profile.get("emailAddress")
+        history_id = profile.get("historyId")
+        if not account or not history_id:
+            return
+        try:
+            self.sync_state.set_history_id(account, history_id, datetime.now().isoformat())
+        except OSError as e:
+            print(f"⚠️ No se pudo guardar el estado de sincronización: {e}")
+
+    def _iter_all_messages(self) -> Iterator[str]:
+        """
+        Genera los IDs de todos los mensajes que cumplen la consulta de Gmail
+
+        Cada página se entrega en cuanto llega, así las descargas empiezan tras
+        la primera página.
+
+        Yields:
+            str: ID de cada mensaje
+        """
+        max_emails = self.config.max_emails_to_process
+        query = self._build_query()
+        list_kwargs = {"userId": "me", "maxResults": MAX_PAGE_SIZE}
+        if max_emails > 0:
+            list_kwargs["maxResults"] = min(max_emails, MAX_PAGE_SIZE)
+        if query:
+            list_kwargs["q"] = query
+            print(f"🔎 Consulta de Gmail: {query}")
+
+        resume = self.journal.begin({
+            "account": (self._profile or {}).get("emailAddress", ""),
+            "source": "messages",
+            "query": query,
+        })
+        page_token = resume["page_token"] if resume else None
+        if resume and resume["listing_complete"]:
+            self._listing_complete = True
+            return
+
+        matched = 0
+        while True:
+            try:
+                results = self._execute(
+                    self.service.users().messages().list(**list_kwargs, **self._page_kwargs(page_token)),
+                    "messages.list",
+                )
+            except Exception as e:
+                # Propagar el error para que el diario se guarde en vez de borrarse
+                print(f"❌ Error al obtener mensajes: {e}")
+                raise
+
+            page_ids = [msg["id"] for msg in results.get("messages", [])]
+            matched += len(page_ids)
+            next_token = results.get("nextPageToken")
+            yield from self.journal.start_page(page_token, page_ids, next_token)
+
+            # Manejar paginación
+            page_token = next_token
+            if not page_token:
+                break
+
+        self._listing_complete = True
+        if query and max_emails <= 0:
+            self._count_excluded_by_query(matched)
+
+    def _iter_plan_messages(self) -> Iterator[str]:
+        """
+        Genera los IDs de los mensajes del plan en ejecución (sin listar el buzón)
+
+        Yields:
+            str: ID de cada mensaje pendiente
+        """
+        msg_ids = list(self.plan.message_ids())
+        digest = hashlib.sha256("\n".join(msg_ids).encode("utf-8")).hexdigest()
+        self.journal.begin({"source": "plan", "plan": digest})
+        yield from self.journal.start_page(None, msg_ids, None)
+
+    @staticmethod
+    def _page_kwargs(page_token: Optional[str]) -> dict:
+        """
+        Parámetros de paginación para una llamada list
+
+        Args:
+            page_token: Token de la página (None = primera)
+
+        Returns:
+            dict: {"pageToken": ...} o vacío
+        """
+        return {"pageToken": page_token} if page_token else {}
+
+    def _build_query(self) -> str:
+        """
+        Construye la consulta q= a partir de los filtros configurados
+
+        Returns:
+            str: Consulta de Gmail (vacía si query_pushdown está desactivado)
+        """
+        if not self.config.query_pushdown:
+            return ""
+        return GmailQueryBuilder(self.config).build()
+
+    def _count_excluded_by_query(self, matched: int) -> None:
+        """
+        Calcula cuántos correos ha descartado Gmail gracias a la consulta
+
+        Args:
+            matched: Número de mensajes devueltos por la consulta
+        """
+        total = int(self._get_profile().get("messagesTotal", 0))
+        if total:
+            self._increment_stat("emails_excluded_by_query", max(total - matched, 0))
 
     def _download_message_attachments(self, msg_id: str) -> None:
         """
@@ -101,53 +716,316 @@ class GmailAttachmentDownloader:
             msg_id: ID del mensaje
         """
         try:
-            message = self.service.users().messages().get(userId="me", id=msg_id).execute()
-            headers = message["payload"].get("headers", [])
+            message = self._execute(self._message_request(self._get_service(), msg_id), "messages.get")
+            for part, subject, sender, email_date in self._get_message_attachments(message):
+                self._download_attachment(part, msg_id, subject, sender, email_date)
 
-            # Obtener asunto y remitente
-            subject = next(
-                (h["value"] for h in headers if h["name"] == "Subject"), "Sin asunto"
-            )
-            sender = next((h["value"] for h in headers if h["name"] == "From"), "Desconocido")
-            
-            # Filtrar por remitente si está configurado
-            if self.config.whitelist_senders:
-                sender_lower = sender.lower()
-                if not any(allowed in sender_lower for allowed in self.config.whitelist_senders):
-                    return
-            
-            if self.config.blacklist_senders:
-                sender_lower = sender.lower()
-                if any(blocked in sender_lower for blocked in self.config.blacklist_senders):
-                    return
-            
-            # Obtener fecha del correo
-            date_str = next(
-                (h["value"] for h in headers if h["name"] == "Date"), None
-            )
-            email_date = self._parse_email_date(date_str) if date_str else datetime.now()
+        except Exception as e:
+            self._record_error(msg_id, f"⚠️ Error procesando mensaje {msg_id}: {e}")
 
-            # Filtrar por rango de fechas si está configurado
-            if not self._is_date_in_range(email_date):
-                return
+        self._message_done(msg_id)
 
-            # Procesar partes del mensaje
-            parts = message["payload"].get("parts", [])
-            if not parts:
-                # Sin partes, no hay adjuntos
-                return
+    def _download_message_batch(self, msg_ids: List[str]) -> None:
+        """
+        Descarga los adjuntos de un grupo de mensajes usando peticiones batch
 
-            has_attachments = False
-            for part in parts:
-                if part["filename"]:
-                    has_attachments = True
-                    self._download_attachment(part, msg_id, subject, sender, email_date)
+        Args:
+            msg_ids: IDs de los mensajes del grupo
+        """
+        jobs = self._prepare_attachment_jobs(msg_ids)
+        for job, encoded_data in self._fetch_attachment_jobs(jobs):
+            if encoded_data is not None:
+                self._write_attachment_job((job, encoded_data))
 
-            if has_attachments:
-                self.stats["emails_with_attachments"] += 1
+        for msg_id in msg_ids:
+            self._message_done(msg_id)
 
+    def _batch_executor(self) -> BatchExecutor:
+        """
+        Crea un ejecutor de lotes sobre el cliente de Gmail API del hilo actual
+
+        Returns:
+            BatchExecutor: Ejecutor configurado con batch_size y reintentos
+        """
+        return BatchExecutor(
+            self._get_service(),
+            batch_size=self.config.batch_size,
+            scheduler=self.scheduler,
+        )
+
+    def _prepare_attachment_jobs(self, msg_ids: List[str]) -> List[tuple]:
+        """
+        Obtiene los metadatos de un grupo de mensajes y filtra sus adjuntos
+
+        Args:
+            msg_ids: IDs de los mensajes del grupo
+
+        Returns:
+            List[tuple]: Trabajos (parte, ID de mensaje, ID de parte, remitente, fecha)
+        """
+        service = self._get_service()
+        if self.config.batch_size > 1:
+            messages, errors = self._batch_executor().execute({
+                msg_id: (lambda msg_id=msg_id: self._message_request(service, msg_id))
+                for msg_id in msg_ids
+            }, "messages.get")
+        else:
+            messages, errors = {}, {}
+            for msg_id in msg_ids:
+                try:
+                    messages[msg_id] = self._execute(
+                        self._message_request(service, msg_id), "messages.get"
+                    )
+                except Exception as e:
+                    errors[msg_id] = e
+        for msg_id, error in errors.items():
+            self._record_error(msg_id, f"⚠️ Error procesando mensaje {msg_id}: {error}")
+
+        jobs = []
+        for msg_id in msg_ids:
+            if msg_id not in messages:
+                continue
+            try:
+                for part, subject, sender, email_date in self._get_message_attachments(messages[msg_id]):
+                    part_id = self._filter_attachment(part, msg_id)
+                    if part_id is not None:
+                        jobs.append((part, msg_id, part_id, sender, email_date))
+            except Exception as e:
+                self._record_error(msg_id, f"⚠️ Error procesando mensaje {msg_id}: {e}")
+        return jobs
+
+    @staticmethod
+    def _group_attachment_jobs(jobs: List[tuple]) -> Iterator[List[tuple]]:
+        """
+        Agrupa los adjuntos para que cada batch no supere BATCH_ATTACHMENT_BYTES
+
+        Los adjuntos que por sí solos alcanzan el tope van en un grupo propio.
+
+        Args:
+            jobs: Trabajos devueltos por _prepare_attachment_jobs
+
+        Yields:
+            List[tuple]: Grupo de trabajos a pedir juntos
+        """
+        group, group_bytes = [], 0
+        for job in jobs:
+            size = int(job[0].get("body", {}).get("size", 0) or 0)
+            if size >= BATCH_ATTACHMENT_BYTES:
+                yield [job]
+                continue
+            if group and group_bytes + size > BATCH_ATTACHMENT_BYTES:
+                yield group
+                group, group_bytes = [], 0
+            group.append(job)
+            group_bytes += size
+        if group:
+            yield group
+
+    def _fetch_attachment_jobs(self, jobs: List[tuple]) -> Iterator[tuple]:
+        """
+        Descarga el contenido (base64) de un grupo de adjuntos
+
+        Los datos se entregan a medida que llega cada batch (o cada petición
+        suelta), de modo que en memoria solo hay un batch acotado a la vez.
+
+        Args:
+            jobs: Trabajos devueltos por _prepare_attachment_jobs
+
+        Yields:
+            tuple: Par (trabajo, datos en base64), con None si el adjunto falló
+        """
+        service = self._get_service()
+        for group in self._group_attachment_jobs(jobs):
+            requests = {
+                f"{job[1]}:{job[2]}": (lambda job=job: service.users().messages().attachments().get(
+                    userId="me", messageId=job[1], id=job[0]["body"]["attachmentId"]
+                ))
+                for job in group
+            }
+            if self.config.batch_size > 1 and len(group) > 1:
+                attachments, errors = self._batch_executor().execute(requests, "attachments.get")
+            else:
+                attachments, errors = {}, {}
+                for key, request in requests.items():
+                    try:
+                        attachments[key] = self._execute(request(), "attachments.get")
+                    except Exception as e:
+                        errors[key] = e
+
+            for job in group:
+                key = f"{job[1]}:{job[2]}"
+                if key in attachments:
+                    # Soltar la respuesta en cuanto se entrega para no retener el batch entero
+                    yield job, attachments.pop(key)["data"]
+                    continue
+                if key in errors:
+                    self._record_error(job[1], f"⚠️ Error descargando adjunto {job[0]['filename']}: {errors[key]}")
+                yield job, None
+
+    def _write_attachment_job(self, fetched: tuple) -> None:
+        """
+        Guarda en disco un adjunto ya descargado
+
+        Args:
+            fetched: Par (trabajo, datos en base64)
+        """
+        (part, msg_id, part_id, sender, email_date), encoded_data = fetched
+        try:
+            self._save_attachment(part, msg_id, part_id, sender, email_date, encoded_data)
         except Exception as e:
-            print(f"⚠️ Error procesando mensaje {msg_id}: {e}")
+            self._record_error(msg_id, f"⚠️ Error descargando adjunto {part['filename']}: {e}")
+
+    def _run_pipeline(self) -> None:
+        """
+        Ejecuta la descarga como pipeline listado → metadatos → descarga → escritura
+
+        Cada etapa tiene sus propios workers y colas acotadas, de modo que un
+        disco lento o una API limitada frenan a las etapas anteriores en lugar
+        de acumular elementos en memoria.
+        """
+        pipeline = Pipeline(
+            queue_size=self.config.pipeline_queue_size,
+            monitor_interval=self.config.pipeline_monitor_interval,
+        )
+        pipeline.add_stage("metadatos", self._pipeline_prepare, self.config.metadata_workers)
+        pipeline.add_stage("descarga", self._pipeline_fetch, self.config.fetch_workers)
+        pipeline.add_stage("escritura", self._pipeline_write, self.config.writer_workers)
+
+        print("🚰 Pipeline: " + ", ".join(
+            f"{stage.name}={stage.workers} workers" for stage in pipeline.stages
+        ))
+        pipeline.run(self._chunked(self.iter_message_ids(), max(self.config.batch_size, 1)))
+
+        for name, summary in pipeline.summary().items():
+            print(
+                f"   🚰 {name}: {summary['processed']} procesados, "
+                f"{summary['errors']} errores, cola máxima {summary['max_queue_depth']}"
+            )
+
+    def _pipeline_prepare(self, msg_ids: List[str]) -> List[List[tuple]]:
+        """
+        Etapa de metadatos: prepara los adjuntos de un grupo de mensajes
+
+        Args:
+            msg_ids: IDs de los mensajes del grupo
+
+        Returns:
+            List[List[tuple]]: Lista con el grupo de trabajos (vacía si no hay adjuntos)
+        """
+        jobs = self._prepare_attachment_jobs(msg_ids)
+        with self._open_jobs_lock:
+            for job in jobs:
+                self._open_jobs[job[1]] = self._open_jobs.get(job[1], 0) + 1
+        for msg_id in msg_ids:
+            if msg_id not in self._open_jobs:
+                self._message_done(msg_id)
+        return [jobs] if jobs else []
+
+    def _pipeline_fetch(self, jobs: List[tuple]) -> Iterator[tuple]:
+        """
+        Etapa de descarga: obtiene el contenido de un grupo de adjuntos
+
+        Cada adjunto pasa a la cola de escritura en cuanto llega su batch, y
+        la cola acotada frena la descarga si la escritura va más lenta.
+
+        Args:
+            jobs: Trabajos de la etapa de metadatos
+
+        Yields:
+            tuple: Par (trabajo, datos en base64)
+        """
+        for job, encoded_data in self._fetch_attachment_jobs(jobs):
+            if encoded_data is None:
+                self._finish_job(job)
+            else:
+                yield job, encoded_data
+
+    def _pipeline_write(self, fetched: tuple) -> None:
+        """
+        Etapa de escritura: guarda un adjunto en disco
+
+        Args:
+            fetched: Par (trabajo, datos en base64)
+        """
+        try:
+            self._write_attachment_job(fetched)
+        finally:
+            self._finish_job(fetched[0])
+
+    def _finish_job(self, job: tuple) -> None:
+        """
+        Marca un adjunto del pipeline como terminado y cierra su mensaje si era el último
+
+        Args:
+            job: Trabajo (parte, ID de mensaje, ID de parte, remitente, fecha)
+        """
+        msg_id = job[1]
+        with self._open_jobs_lock:
+            self._open_jobs[msg_id] -= 1
+            last = self._open_jobs[msg_id] == 0
+            if last:
+                del self._open_jobs[msg_id]
+        if last:
+            self._message_done(msg_id)
+
+    @staticmethod
+    def _message_request(service, msg_id: str):
+        """
+        Construye la petición messages.get con respuesta parcial
+
+        Args:
+            service: Cliente de Gmail API
+            msg_id: ID del mensaje
+
+        Returns:
+            HttpRequest: Petición lista para ejecutar o añadir a un lote
+        """
+        return service.users().messages().get(userId="me", id=msg_id, fields=MESSAGE_FIELDS)
+
+    def _get_message_attachments(self, message: dict) -> List[tuple]:
+        """
+        Extrae las partes con adjunto de un mensaje que pasa los filtros de remitente y fecha
+
+        Args:
+            message: Mensaje devuelto por messages.get
+
+        Returns:
+            List[tuple]: Tuplas (parte, asunto, remitente, fecha) de cada adjunto
+        """
+        # Indexar las cabeceras una sola vez (se conserva la primera aparición)
+        headers = {}
+        for header in message["payload"].get("headers", []):
+            headers.setdefault(header["name"].lower(), header["value"])
+
+        # Obtener asunto y remitente
+        subject = headers.get("subject", "Sin asunto")
+        sender = headers.get("from", "Desconocido")
+        
+        # Filtrar por remitente si está configurado
+        if not self.filters.accepts_sender(sender):
+            return []
+
+        # Obtener fecha del correo: internalDate (ms desde epoch) evita parsear RFC 2822
+        if message.get("internalDate"):
+            email_date = datetime.fromtimestamp(int(message["internalDate"]) / 1000)
+        elif headers.get("date"):
+            email_date = self._parse_email_date(headers["date"])
+        else:
+            email_date = datetime.now()
+
+        # Filtrar por rango de fechas si está configurado
+        if not self._is_date_in_range(email_date):
+            return []
+
+        # Procesar partes del mensaje (sin partes, no hay adjuntos)
+        parts = message["payload"].get("parts", [])
+        attachments = [
+            (part, subject, sender, email_date) for part in parts if part["filename"]
+        ]
+
+        if attachments:
+            self._increment_stat("emails_with_attachments")
+        return attachments
 
     def _download_attachment(self, part: dict, msg_id: str, subject: str, sender: str, email_date: datetime) -> None:
         """
@@ -160,79 +1038,222 @@ class GmailAttachmentDownloader:
             sender: Remitente del correo
             email_date: Fecha del correo
         """
+        filename = part.get("filename")
         try:
-            filename = part["filename"]
-            
-            if not filename:
+            part_id = self._filter_attachment(part, msg_id)
+            if part_id is None:
                 return
-            
-            # Verificar extensión permitida
-            if self.config.allowed_extensions:
-                file_ext = filename.rsplit(".", 1)[-1].lower() if "." in filename else ""
-                if file_ext not in self.config.allowed_extensions:
-                    self.stats["files_filtered"] += 1
-                    return
-            
-            # Aplicar filtros de lista blanca y negra
-            filename_check = filename if self.config.case_sensitive_filters else filename.lower()
-            
-            # Verificar lista blanca
-            if self.config.white_list:
-                white_list = self.config.white_list if self.config.case_sensitive_filters else [w.lower() for w in self.config.white_list]
-                if not any(word in filename_check for word in white_list):
-                    self.stats["files_filtered"] += 1
-                    return
-            
-            # Verificar lista negra
-            if self.config.black_list:
-                black_list = self.config.black_list if self.config.case_sensitive_filters else [b.lower() for b in self.config.black_list]
-                if any(word in filename_check for word in black_list):
-                    self.stats["files_filtered"] += 1
-                    return
-            
-            # Extraer año y trimestre
-            year = email_date.year
-            trimester = self._get_trimester(email_date.month)
-            
-            # Obtener nombre de la carpeta del remitente
-            sender_folder = sender
-            if self.config.use_domain_only and "@" in sender:
-                sender_folder = sender.split("@")[1].replace(">", "").strip()
-            
-            # Crear estructura: <download_folder>/<Año>/<Trimestre>/<Remitente>/
-            folder_path = self.download_folder / str(year) / trimester / self._sanitize_filename(sender_folder)
-            folder_path.mkdir(parents=True, exist_ok=True)
 
             # Obtener datos del adjunto
-            att_id = part["body"].get("attachmentId")
-            if att_id:
-                attachment = (
-                    self.service.users()
-                    .messages()
-                    .attachments()
-                    .get(userId="me", messageId=msg_id, id=att_id)
-                    .execute()
-                )
+            attachment = self._execute(
+                self._get_service().users()
+                .messages()
+                .attachments()
+                .get(userId="me", messageId=msg_id, id=part["body"]["attachmentId"]),
+                "attachments.get",
+            )
+            self._save_attachment(part, msg_id, part_id, sender, email_date, attachment["data"])
 
-                data = base64.urlsafe_b64decode(attachment["data"])
-                filepath = folder_path / self._sanitize_filename(filename)
-                
-                # Manejar duplicados si está configurado
-                if filepath.exists() and self.config.add_timestamp_on_duplicate:
-                    name, ext = filename.rsplit(".", 1) if "." in filename else (filename, "")
-                    timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
-                    new_filename = f"{name}_{timestamp}.{ext}" if ext else f"{name}_{timestamp}"
-                    filepath = folder_path / self._sanitize_filename(new_filename)
+        except Exception as e:
+            self._record_error(msg_id, f"⚠️ Error descargando adjunto {filename}: {e}")
 
-                with open(filepath, "wb") as f:
-                    f.write(data)
+    def _filter_attachment(self, part: dict, msg_id: str) -> Optional[str]:
+        """
+        Aplica los filtros de nombre y el historial a un adjunto
 
-                if self.config.log_successful_downloads:
-                    print(f"✅ Descargado: {filename} -> {filepath}")
-                self.stats["files_downloaded"] += 1
+        Args:
+            part: Parte del mensaje con adjunto
+            msg_id: ID del mensaje
 
-        except Exception as e:
-            print(f"⚠️ Error descargando adjunto {filename}: {e}")
+        Returns:
+            Optional[str]: Identificador de la parte si hay que descargarla, None si no
+        """
+        filename = part["filename"]
+        
+        if not filename or not part.get("body", {}).get("attachmentId"):
+            return None
+        
+        # Verificar extensión, lista blanca y lista negra
+        if not self.filters.accepts_filename(filename):
+            self._increment_stat("files_filtered")
+            return None
+
+        part_id = part.get("partId") or filename
+        if self.plan is not None and not self.plan.includes(msg_id, part_id):
+            self._increment_stat("files_filtered")
+            return None
+
+        # Saltar adjuntos ya descargados en ejecuciones anteriores
+        if self.journal.is_attachment_done(msg_id, part_id) or self._is_already_downloaded(msg_id, part_id):
+            self._increment_stat("files_skipped")
+            return None
+
+        return part_id
+
+    def _save_attachment(self, part: dict, msg_id: str, part_id: str, sender: str, email_date: datetime, encoded_data: str) -> None:
+        """
+        Decodifica y guarda un adjunto en <Año>/<Trimestre>/<Remitente>/ del destino
+
+        El adjunto se decodifica por bloques a medida que se escribe, y el
+        destino calcula su hash a la vez. Si el contenido ya estaba guardado,
+        lo recién escrito se sustituye por un enlace duro (carpetas locales)
+        o se retira y se apunta al existente.
+
+        Args:
+            part: Parte del mensaje con adjunto
+            msg_id: ID del mensaje
+            part_id: Identificador de la parte del mensaje
+            sender: Remitente del correo
+            email_date: Fecha del correo
+            encoded_data: Contenido del adjunto en base64 url-safe
+        """
+        filename = part["filename"]
+        size = decoded_size(encoded_data)
+        folder = self._relative_folder(sender, email_date).as_posix()
+        name = self._sanitize_filename(filename)
+        # Nombre libre según el índice (con timestamp si está configurado)
+        key = self.storage.reserve(folder, name, self._sanitize_filename, self.config.add_timestamp_on_duplicate)
+
+        decode_time = [0.0]
+        start = time.perf_counter()
+        try:
+            sha256 = self.storage.put(
+                key, self._timed_chunks(iter_decoded_chunks(encoded_data), decode_time), size, mtime=email_date
+            )
+        except BaseException:
+            self.storage.discard(key)
+            raise
+        self.metrics.observe("stage_seconds", decode_time[0], stage="decode")
+        # Escritura: temporal, fsync y publicación (sin contar la decodificación)
+        self.metrics.observe("stage_seconds", time.perf_counter() - start - decode_time[0], stage="write")
+        self._increment_stat("bytes_downloaded", size)
+        location = self.storage.location(key)
+
+        # Buscar y registrar bajo bloqueo para que dos copias simultáneas no
+        # se queden las dos
+        with self._write_lock:
+            duplicate = self._find_duplicate(sha256, size)
+            if duplicate is not None and duplicate != location:
+                if (self.config.deduplicate == "hardlink" and self.storage.hardlinks
+                        and duplicate != self.storage.location(f"{folder}/{name}")):
+                    if not self.storage.link(duplicate, key):
+                        duplicate = None
+                elif self.storage.delete(key):
+                    # Mismo contenido ya guardado: basta con apuntar al existente
+                    location = duplicate
+                else:
+                    duplicate = None
+
+            if duplicate is not None:
+                self._increment_stat("files_deduplicated")
+                self._increment_stat("bytes_deduplicated", size)
+                print(f"🔗 Duplicado: {filename} -> {duplicate}")
+
+            if self.manifest:
+                self.manifest.record(msg_id, part_id, location, size, sha256)
+        self.journal.attachment_done(msg_id, part_id)
+
+        if self.config.log_successful_downloads:
+            print(f"✅ Descargado: {filename} -> {location}")
+        self._increment_stat("files_downloaded")
+
+    @staticmethod
+    def _timed_chunks(chunks: Iterable[bytes], elapsed: List[float]) -> Iterator[bytes]:
+        """
+        Acumula en elapsed[0] el tiempo dedicado a producir los bloques (decodificar)
+
+        Args:
+            chunks: Bloques decodificados bajo demanda
+            elapsed: Celda donde se suma el tiempo
+
+        Yields:
+            bytes: Los mismos bloques
+        """
+        chunks = iter(chunks)
+        while True:
+            start = time.perf_counter()
+            chunk = next(chunks, None)
+            elapsed[0] += time.perf_counter() - start
+            if chunk is None:
+                return
+            yield chunk
+
+    def _sender_folder(self, sender: str) -> str:
+        """
+        Nombre (sin sanitizar) de la carpeta del remitente
+
+        Args:
+            sender: Cabecera From del correo
+
+        Returns:
+            str: Remitente completo, o solo su dominio si use_domain_only
+        """
+        if self.config.use_domain_only and "@" in sender:
+            return sender.split("@")[1].replace(">", "").strip()
+        return sender
+
+    def _relative_folder(self, sender: str, email_date: datetime) -> Path:
+        """
+        Carpeta <Año>/<Trimestre>/<Remitente> de un adjunto, relativa a download_folder
+
+        Args:
+            sender: Cabecera From del correo
+            email_date: Fecha del correo
+
+        Returns:
+            Path: Ruta relativa (no se crea)
+        """
+        return (
+            Path(str(email_date.year))
+            / self._get_trimester(email_date.month)
+            / self._sanitize_filename(self._sender_folder(sender))
+        )
+
+    def _find_duplicate(self, sha256: str, size: int) -> Optional[str]:
+        """
+        Busca en el manifiesto un adjunto ya guardado con el mismo contenido
+
+        Args:
+            sha256: Hash SHA-256 del contenido
+            size: Tamaño en bytes
+
+        Returns:
+            Optional[str]: Ubicación del adjunto existente o None
+        """
+        if not self.manifest or self.config.deduplicate == "none":
+            return None
+        return self.manifest.find_by_hash(sha256, size, self._stored)
+
+    def _is_already_downloaded(self, msg_id: str, part_id: str) -> bool:
+        """
+        Comprueba en el manifiesto si el adjunto ya se descargó y sigue en disco
+
+        Args:
+            msg_id: ID del mensaje
+            part_id: Identificador de la parte del mensaje
+
+        Returns:
+            bool: True si el adjunto puede omitirse
+        """
+        if not self.manifest:
+            return False
+        entry = self.manifest.get(msg_id, part_id)
+        return bool(entry) and self._stored(entry["path"])
+
+    def _stored(self, path: str) -> bool:
+        """
+        Comprueba si una ruta del manifiesto sigue guardada
+
+        Args:
+            path: Archivo suelto, miembro de un archivo por trimestre u objeto del destino
+
+        Returns:
+            bool: True si existe
+        """
+        if not self.storage.verify_recorded and self.storage.key(path) is not None:
+            # Objeto remoto ya registrado: no se pide una comprobación por adjunto
+            return True
+        return self.storage.exists(path)
 
     def _is_date_in_range(self, email_date: datetime) -> bool:
         """
@@ -244,33 +1265,7 @@ class GmailAttachmentDownloader:
         Returns:
             bool: True si la fecha está en rango o no hay rango configurado, False si está fuera
         """
-        # Si no hay rango configurado, aceptar todas las fechas
-        if not self.config.date_from and not self.config.date_to:
-            return True
-        
-        try:
-            # Convertir fecha del correo a naive si es aware para comparación consistente
-            if email_date.tzinfo is not None:
-                email_date = email_date.replace(tzinfo=None)
-            
-            # Parsear fecha_desde si está configurada
-            if self.config.date_from:
-                date_from = datetime.strptime(self.config.date_from, "%Y-%m-%d")
-                if email_date < date_from:
-                    return False
-            
-            # Parsear fecha_hasta si está configurada
-            if self.config.date_to:
-                date_to = datetime.strptime(self.config.date_to, "%Y-%m-%d")
-                # Incluir todo el día: hasta las 23:59:59
-                date_to = date_to.replace(hour=23, minute=59, second=59)
-                if email_date > date_to:
-                    return False
-            
-            return True
-        except Exception as e:
-            print(f"⚠️ Error al parsear rango de fechas: {e}")
-            return True
+        return self.filters.accepts_date(email_date)
 
     @staticmethod
     def _get_trimester(month: int) -> str:
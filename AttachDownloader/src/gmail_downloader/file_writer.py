@@ -0,0 +1,104 @@
+"""
+AttachDownloader - Módulo de escritura de adjuntos
+Decodificación base64 por bloques y escritura atómica en archivos temporales
+"""
+
+import base64
+import hashlib
+import os
+import tempfile
+from pathlib import Path
+from typing import Iterable, Iterator, Tuple
+
+
+# Tamaño de cada bloque base64 a decodificar (múltiplo de 4 → 768 KiB decodificados)
+CHUNK_SIZE = 1024 * 1024
+
+# Sufijo de los archivos temporales mientras se escriben
+TEMP_SUFFIX = ".part"
+
+
+def iter_decoded_chunks(encoded_data: str, chunk_size: int = CHUNK_SIZE, digest=None) -> Iterator[bytes]:
+    """
+    Decodifica base64 url-safe por bloques sin crear una copia completa en bytes
+
+    Args:
+        encoded_data: Contenido en base64 url-safe (con o sin relleno '=')
+        chunk_size: Caracteres base64 por bloque (se redondea a múltiplo de 4)
+        digest: Hash de hashlib que se actualiza con cada bloque (opcional)
+
+    Yields:
+        bytes: Siguiente bloque decodificado
+    """
+    chunk_size = max(chunk_size - chunk_size % 4, 4)
+    length = len(encoded_data)
+    for start in range(0, length, chunk_size):
+        chunk = encoded_data[start:start + chunk_size]
+        if start + chunk_size >= length:
+            # Último bloque: completar el relleno si la API lo ha omitido
+            chunk += "=" * (-len(chunk) % 4)
+        decoded = base64.urlsafe_b64decode(chunk)
+        if digest is not None:
+            digest.update(decoded)
+        yield decoded
+
+
+def decoded_size(encoded_data: str) -> int:
+    """
+    Tamaño exacto en bytes del contenido base64, sin decodificarlo
+
+    Args:
+        encoded_data: Contenido en base64 url-safe (con o sin relleno '=')
+
+    Returns:
+        int: Bytes que producirá iter_decoded_chunks
+    """
+    length = len(encoded_data.rstrip("="))
+    return length * 3 // 4
+
+
+def write_temp_file(folder: Path, chunks: Iterable[bytes]) -> Tuple[Path, int, str]:
+    """
+    Escribe los bloques en un archivo temporal de la carpeta destino y lo sincroniza
+
+    El temporal está en la misma carpeta que el destino para que el renombrado
+    final sea atómico (mismo sistema de archivos).
+
+    Args:
+        folder: Carpeta destino
+        chunks: Bloques de contenido
+
+    Returns:
+        Tuple[Path, int, str]: Ruta del temporal, tamaño en bytes y hash SHA-256
+    """
+    fd, tmp_name = tempfile.mkstemp(dir=str(folder), prefix=".", suffix=TEMP_SUFFIX)
+    tmp_path = Path(tmp_name)
+    size = 0
+    digest = hashlib.sha256()
+    try:
+        with os.fdopen(fd, "wb") as f:
+            for chunk in chunks:
+                f.write(chunk)
+                digest.update(chunk)
+                size += len(chunk)
+            f.flush()
+            os.fsync(f.fileno())
+    except BaseException:
+        tmp_path.unlink(missing_ok=True)
+        raise
+    return tmp_path, size, digest.hexdigest()
+
+
+def commit_temp_file(tmp_path: Path, filepath: Path) -> None:
+    """
+    Publica el temporal con su nombre definitivo mediante un renombrado atómico
+
+    Args:
+        tmp_path: Archivo temporal ya escrito y sincronizado
+        filepath: Ruta definitiva
+    """
+    try:
+        os.replace(tmp_path, filepath)
+    except BaseException:
+        tmp_path.unlink(missing_ok=True)
+        raise
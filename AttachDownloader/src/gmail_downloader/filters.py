@@ -0,0 +1,131 @@
+"""
+AttachDownloader - Módulo de filtros
+Plan de filtrado compilado una sola vez a partir de la configuración
+"""
+
+import re
+from datetime import datetime
+from typing import Iterable, Optional, Pattern
+from .config import ConfigSnapshot
+
+
+def compile_keywords(words: Iterable[str]) -> Optional[Pattern]:
+    """
+    Compila una lista de palabras clave en una única expresión regular
+
+    El motor de re recorre el texto una sola vez para todas las alternativas,
+    en lugar de un recorrido por palabra como any(word in text ...).
+
+    Args:
+        words: Palabras clave (subcadenas literales)
+
+    Returns:
+        Optional[Pattern]: Expresión compilada o None si no hay palabras
+    """
+    words = list(words)
+    if not words:
+        return None
+    # Las más largas primero para que no queden ocultas por un prefijo
+    alternatives = sorted(set(words), key=len, reverse=True)
+    return re.compile("|".join(re.escape(word) for word in alternatives))
+
+
+class FilterPlan:
+    """Filtros de extensión, palabras clave, remitente y fechas precompilados"""
+
+    def __init__(self, config: ConfigSnapshot):
+        """
+        Compila los filtros de la configuración
+
+        Args:
+            config: Configuración (ConfigSnapshot o ConfigManager)
+        """
+        self.extensions = frozenset(config.allowed_extensions)
+        self.case_sensitive = config.case_sensitive_filters
+        self.white_list = compile_keywords(config.white_list)
+        self.black_list = compile_keywords(config.black_list)
+        self.whitelist_senders = compile_keywords(config.whitelist_senders)
+        self.blacklist_senders = compile_keywords(config.blacklist_senders)
+        self.date_from, self.date_to = self._parse_date_range(config.date_from, config.date_to)
+
+    @staticmethod
+    def _parse_date_range(date_from: Optional[str], date_to: Optional[str]):
+        """
+        Convierte el rango de fechas configurado en datetimes
+
+        Args:
+            date_from: Fecha inicial (YYYY-MM-DD) o None
+            date_to: Fecha final (YYYY-MM-DD) o None
+
+        Returns:
+            tuple: (desde, hasta); hasta incluye el día completo. (None, None) si no
+            hay rango o no se puede interpretar
+        """
+        try:
+            start = datetime.strptime(date_from, "%Y-%m-%d") if date_from else None
+            end = None
+            if date_to:
+                # Incluir todo el día: hasta las 23:59:59
+                end = datetime.strptime(date_to, "%Y-%m-%d").replace(hour=23, minute=59, second=59)
+            return start, end
+        except ValueError as e:
+            print(f"⚠️ Error al parsear rango de fechas: {e}")
+            return None, None
+
+    def accepts_filename(self, filename: str) -> bool:
+        """
+        Aplica extensión, lista blanca y lista negra a un nombre de archivo
+
+        Args:
+            filename: Nombre del adjunto
+
+        Returns:
+            bool: True si el adjunto pasa los filtros
+        """
+        if self.extensions:
+            file_ext = filename.rsplit(".", 1)[-1].lower() if "." in filename else ""
+            if file_ext not in self.extensions:
+                return False
+
+        filename_check = filename if self.case_sensitive else filename.lower()
+        if self.white_list is not None and not self.white_list.search(filename_check):
+            return False
+        if self.black_list is not None and self.black_list.search(filename_check):
+            return False
+        return True
+
+    def accepts_sender(self, sender: str) -> bool:
+        """
+        Aplica las listas de remitentes
+
+        Args:
+            sender: Cabecera From del correo
+
+        Returns:
+            bool: True si el remitente pasa los filtros
+        """
+        sender_lower = sender.lower()
+        if self.whitelist_senders is not None and not self.whitelist_senders.search(sender_lower):
+            return False
+        if self.blacklist_senders is not None and self.blacklist_senders.search(sender_lower):
+            return False
+        return True
+
+    def accepts_date(self, email_date: datetime) -> bool:
+        """
+        Verifica si la fecha del correo está dentro del rango configurado
+
+        Args:
+            email_date: Fecha del correo
+
+        Returns:
+            bool: True si la fecha está en rango o no hay rango configurado
+        """
+        # Convertir fecha del correo a naive si es aware para comparación consistente
+        if email_date.tzinfo is not None:
+            email_date = email_date.replace(tzinfo=None)
+        if self.date_from is not None and email_date < self.date_from:
+            return False
+        if self.date_to is not None and email_date > self.date_to:
+            return False
+        return True
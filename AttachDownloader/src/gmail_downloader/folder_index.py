@@ -0,0 +1,34 @@
+"""
+AttachDownloader - Módulo de índice de carpetas
+Elección de nombres libres en una carpeta cuyos nombres ocupados ya se conocen
+(los destinos los listan una vez por carpeta, sin consultar el disco por cada adjunto)
+"""
+
+from datetime import datetime
+from typing import Callable, Set
+
+
+def free_name(filename: str, names: Set[str], sanitize: Callable[[str], str]) -> str:
+    """
+    Devuelve filename, o una variante con timestamp si ya está en names
+
+    Args:
+        filename: Nombre deseado (ya sanitizado)
+        names: Nombres ocupados
+        sanitize: Función que sanitiza el nombre generado
+
+    Returns:
+        str: Nombre que no está en names
+    """
+    if filename not in names:
+        return filename
+    name, ext = filename.rsplit(".", 1) if "." in filename else (filename, "")
+    base = f"{name}_{datetime.now().strftime('%Y%m%d_%H%M%S')}"
+    candidate = sanitize(f"{base}.{ext}" if ext else base)
+    counter = 1
+    # Varios archivos con el mismo nombre en el mismo segundo
+    while candidate in names:
+        suffixed = f"{base}_{counter}"
+        candidate = sanitize(f"{suffixed}.{ext}" if ext else suffixed)
+        counter += 1
+    return candidate
@@ -0,0 +1,196 @@
+"""
+AttachDownloader - Módulo de diario de ejecución
+Registra el progreso de una ejecución para poder reanudarla tras un corte
+"""
+
+import json
+import os
+import threading
+import time
+from collections import deque
+from datetime import datetime
+from pathlib import Path
+from typing import Dict, Optional, List
+
+
+class RunJournal:
+    """Diario de progreso: página actual, mensajes procesados y adjuntos completados"""
+
+    def __init__(self, journal_file: Path, flush_interval: float = 30):
+        """
+        Inicializa el diario
+
+        Args:
+            journal_file: Ruta al archivo JSON del diario
+            flush_interval: Segundos mínimos entre dos escrituras a disco
+        """
+        self.journal_file = Path(journal_file)
+        self.flush_interval = flush_interval
+        self._lock = threading.RLock()
+        self._signature: Dict[str, str] = {}
+        self._pages = deque()
+        self._page_of: Dict[str, dict] = {}
+        self._next_token: Optional[str] = None
+        self._listing_complete = False
+        self._processed = set()
+        self._attachments = set()
+        self._loaded: Optional[dict] = None
+        self._last_flush = time.monotonic()
+
+    def exists(self) -> bool:
+        """Indica si hay un diario de una ejecución interrumpida"""
+        return self.journal_file.exists()
+
+    def load(self) -> bool:
+        """
+        Carga el diario existente para reanudar
+
+        Returns:
+            bool: True si se ha cargado un diario válido
+        """
+        if not self.exists():
+            return False
+        try:
+            with open(self.journal_file, encoding="utf-8") as f:
+                self._loaded = json.load(f)
+            return True
+        except (OSError, ValueError) as e:
+            print(f"⚠️ Diario de ejecución ilegible ({self.journal_file}): {e}")
+            self._loaded = None
+            return False
+
+    def begin(self, signature: Dict[str, str]) -> Optional[dict]:
+        """
+        Inicia el registro de un recorrido del buzón
+
+        Si hay un diario cargado con la misma firma, se conserva su progreso.
+
+        Args:
+            signature: Identifica el recorrido (cuenta, origen, consulta, historyId)
+
+        Returns:
+            Optional[dict]: {"page_token", "listing_complete"} si se reanuda, None si no
+        """
+        with self._lock:
+            self._signature = dict(signature)
+            loaded, self._loaded = self._loaded, None
+            if not loaded or loaded.get("signature") != self._signature:
+                if loaded:
+                    print("⚠️ El diario corresponde a otra consulta: se empieza desde el principio")
+                return None
+
+            self._processed = set(loaded.get("processed", []))
+            self._attachments = set(loaded.get("attachments", []))
+            self._next_token = loaded.get("page_token")
+            self._listing_complete = bool(loaded.get("listing_complete"))
+            print(
+                f"⏯️  Reanudando ejecución: {len(self._processed)} correos ya procesados "
+                f"en la página actual"
+            )
+            return {"page_token": self._next_token, "listing_complete": self._listing_complete}
+
+    def start_page(self, page_token: Optional[str], msg_ids: List[str], next_token: Optional[str]) -> List[str]:
+        """
+        Registra una página recién listada
+
+        Args:
+            page_token: Token con el que se pidió la página (None = primera)
+            msg_ids: IDs de la página
+            next_token: Token de la página siguiente (None si es la última)
+
+        Returns:
+            List[str]: IDs de la página que faltan por procesar
+        """
+        with self._lock:
+            pending = [msg_id for msg_id in msg_ids if msg_id not in self._processed]
+            page = {"token": page_token, "ids": list(msg_ids), "pending": set(pending)}
+            self._pages.append(page)
+            for msg_id in pending:
+                self._page_of[msg_id] = page
+            self._next_token = next_token
+            self._listing_complete = next_token is None
+            self._advance()
+            return pending
+
+    def is_processed(self, msg_id: str) -> bool:
+        """Indica si un mensaje ya se procesó (en esta ejecución o en la interrumpida)"""
+        with self._lock:
+            return msg_id in self._processed
+
+    def message_done(self, msg_id: str) -> None:
+        """
+        Marca un mensaje como procesado por completo
+
+        Args:
+            msg_id: ID del mensaje
+        """
+        with self._lock:
+            self._processed.add(msg_id)
+            page = self._page_of.pop(msg_id, None)
+            if page is not None:
+                page["pending"].discard(msg_id)
+                self._advance()
+        self.flush()
+
+    def is_attachment_done(self, msg_id: str, part_id: str) -> bool:
+        """Indica si un adjunto ya se guardó"""
+        with self._lock:
+            return f"{msg_id}:{part_id}" in self._attachments
+
+    def attachment_done(self, msg_id: str, part_id: str) -> None:
+        """
+        Marca un adjunto como guardado
+
+        Args:
+            msg_id: ID del mensaje
+            part_id: Identificador de la parte del mensaje
+        """
+        with self._lock:
+            self._attachments.add(f"{msg_id}:{part_id}")
+
+    def flush(self, force: bool = False) -> None:
+        """
+        Escribe el diario en disco (como mucho una vez cada flush_interval)
+
+        Args:
+            force: Escribir aunque no haya pasado el intervalo
+        """
+        with self._lock:
+            if not force and time.monotonic() - self._last_flush < self.flush_interval:
+                return
+            state = {
+                "signature": self._signature,
+                "page_token": self._pages[0]["token"] if self._pages else self._next_token,
+                "listing_complete": self._listing_complete and not self._pages,
+                "processed": sorted(self._processed),
+                "attachments": sorted(self._attachments),
+                "updated_at": datetime.now().isoformat(),
+            }
+            self._last_flush = time.monotonic()
+
+            # Escritura atómica para no dejar un diario a medias
+            self.journal_file.parent.mkdir(parents=True, exist_ok=True)
+            tmp_file = self.journal_file.with_name(self.journal_file.name + ".tmp")
+            with open(tmp_file, "w", encoding="utf-8") as f:
+                json.dump(state, f, ensure_ascii=False)
+            os.replace(tmp_file, self.journal_file)
+
+    def finish(self) -> None:
+        """Elimina el diario tras una ejecución completa"""
+        with self._lock:
+            self._pages.clear()
+            self._page_of.clear()
+            self._processed.clear()
+            self._attachments.clear()
+            if self.journal_file.exists():
+                self.journal_file.unlink()
+
+    def _advance(self) -> None:
+        """Descarta las páginas iniciales ya completadas para mantener el diario acotado"""
+        while self._pages and not self._pages[0]["pending"]:
+            page = self._pages.popleft()
+            done = set(page["ids"])
+            self._processed -= done
+            self._attachments = {
+                key for key in self._attachments if key.split(":", 1)[0] not in done
+            }
@@ -0,0 +1,131 @@
+"""
+AttachDownloader - Módulo de historial de descargas
+Manifiesto persistente (SQLite) de los adjuntos ya descargados
+"""
+
+import sqlite3
+import threading
+from datetime import datetime
+from pathlib import Path
+from typing import Any, Callable, Dict, Optional
+
+
+class DownloadManifest:
+    """Registro indexado de adjuntos descargados por (mensaje, parte)"""
+
+    # Espera máxima (ms) si otra ejecución tiene bloqueada la base de datos
+    BUSY_TIMEOUT_MS = 30000
+
+    def __init__(self, db_file: Path):
+        """
+        Abre (o crea) el manifiesto de descargas
+
+        Args:
+            db_file: Ruta al archivo SQLite del manifiesto
+        """
+        self.db_file = Path(db_file)
+        self.db_file.parent.mkdir(parents=True, exist_ok=True)
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(
+            str(self.db_file),
+            timeout=self.BUSY_TIMEOUT_MS / 1000,
+            check_same_thread=False,
+        )
+        self._conn.row_factory = sqlite3.Row
+        self._init_db()
+
+    def _init_db(self) -> None:
+        """Configura WAL y crea la tabla si no existe"""
+        with self._lock:
+            # WAL permite lectores concurrentes mientras otra ejecución escribe
+            self._conn.execute("PRAGMA journal_mode=WAL")
+            self._conn.execute("PRAGMA synchronous=NORMAL")
+            self._conn.execute(f"PRAGMA busy_timeout={self.BUSY_TIMEOUT_MS}")
+            with self._conn:
+                self._conn.execute(
+                    """
+                    CREATE TABLE IF NOT EXISTS downloads (
+                        message_id TEXT NOT NULL,
+                        part_id TEXT NOT NULL,
+                        path TEXT NOT NULL,
+                        size INTEGER NOT NULL,
+                        sha256 TEXT NOT NULL,
+                        downloaded_at TEXT NOT NULL,
+                        PRIMARY KEY (message_id, part_id)
+                    ) WITHOUT ROWID
+                    """
+                )
+                self._conn.execute(
+                    "CREATE INDEX IF NOT EXISTS idx_downloads_sha256 ON downloads (sha256, size)"
+                )
+
+    def get(self, message_id: str, part_id: str) -> Optional[Dict[str, Any]]:
+        """
+        Busca un adjunto en el manifiesto
+
+        Args:
+            message_id: ID del mensaje
+            part_id: Identificador de la parte del mensaje que contiene el adjunto
+
+        Returns:
+            Optional[Dict[str, Any]]: Registro del adjunto o None si no se ha descargado
+        """
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT * FROM downloads WHERE message_id = ? AND part_id = ?",
+                (message_id, part_id),
+            ).fetchone()
+        return dict(row) if row else None
+
+    def find_by_hash(self, sha256: str, size: int,
+                     exists: Callable[[str], bool] = lambda path: Path(path).exists()) -> Optional[str]:
+        """
+        Busca un archivo descargado con el mismo contenido que siga en disco
+
+        Args:
+            sha256: Hash SHA-256 del contenido
+            size: Tamaño en bytes
+            exists: Comprueba si una ruta sigue guardada (p. ej. miembros de archivos)
+
+        Returns:
+            Optional[str]: Ruta del archivo existente o None
+        """
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT DISTINCT path FROM downloads WHERE sha256 = ? AND size = ?",
+                (sha256, size),
+            ).fetchall()
+        for row in rows:
+            if exists(row["path"]):
+                return row["path"]
+        return None
+
+    def record(self, message_id: str, part_id: str, path: Path, size: int, sha256: str) -> None:
+        """
+        Registra un adjunto descargado
+
+        Args:
+            message_id: ID del mensaje
+            part_id: Identificador de la parte del mensaje que contiene el adjunto
+            path: Ruta donde se guardó el archivo
+            size: Tamaño en bytes
+            sha256: Hash SHA-256 del contenido
+        """
+        with self._lock, self._conn:
+            self._conn.execute(
+                """
+                INSERT INTO downloads (message_id, part_id, path, size, sha256, downloaded_at)
+                VALUES (?, ?, ?, ?, ?, ?)
+                ON CONFLICT (message_id, part_id) DO UPDATE SET
+                    path = excluded.path,
+                    size = excluded.size,
+                    sha256 = excluded.sha256,
+                    downloaded_at = excluded.downloaded_at
+                """,
+                (message_id, part_id, str(path), size, sha256, datetime.now().isoformat()),
+            )
+
+    def close(self) -> None:
+        """Cierra la conexión con la base de datos"""
+        with self._lock:
+            self._conn.close()
@@ -0,0 +1,254 @@
+"""
+AttachDownloader - Módulo de métricas
+Contadores, indicadores e histogramas de latencia thread-safe, exportables
+como textfile de Prometheus y resumen JSON
+"""
+
+import json
+import os
+import threading
+import time
+from bisect import bisect_left
+from contextlib import contextmanager
+from pathlib import Path
+from typing import Dict, Iterator, Optional, Tuple
+
+
+# Límites superiores (segundos) de los buckets de latencia
+LATENCY_BUCKETS = (0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60)
+
+# Prefijo de las métricas exportadas a Prometheus
+METRIC_PREFIX = "attachdownloader"
+
+# Clave de una serie: nombre y etiquetas ordenadas
+SeriesKey = Tuple[str, Tuple[Tuple[str, str], ...]]
+
+
+def _series_key(name: str, labels: Dict[str, str]) -> SeriesKey:
+    """Construye la clave de una serie a partir del nombre y sus etiquetas"""
+    return name, tuple(sorted((key, str(value)) for key, value in labels.items()))
+
+
+def _format_labels(labels: Tuple[Tuple[str, str], ...], extra: Optional[Tuple[str, str]] = None) -> str:
+    """Formatea las etiquetas en sintaxis de Prometheus ({a="1",b="2"})"""
+    pairs = list(labels) + ([extra] if extra else [])
+    if not pairs:
+        return ""
+    escaped = (
+        key + '="' + value.replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n") + '"'
+        for key, value in pairs
+    )
+    return "{" + ",".join(escaped) + "}"
+
+
+class Histogram:
+    """Histograma de buckets fijos (acumulables al exportar)"""
+
+    __slots__ = ("buckets", "counts", "count", "sum", "max")
+
+    def __init__(self, buckets: Tuple[float, ...] = LATENCY_BUCKETS):
+        """
+        Inicializa un histograma vacío
+
+        Args:
+            buckets: Límites superiores de los buckets, en orden creciente
+        """
+        self.buckets = buckets
+        self.counts = [0] * (len(buckets) + 1)
+        self.count = 0
+        self.sum = 0.0
+        self.max = 0.0
+
+    def observe(self, value: float) -> None:
+        """Registra una observación (llamar con el bloqueo del registro tomado)"""
+        self.counts[bisect_left(self.buckets, value)] += 1
+        self.count += 1
+        self.sum += value
+        if value > self.max:
+            self.max = value
+
+    def quantile(self, q: float) -> float:
+        """
+        Estima un cuantil interpolando dentro del bucket que lo contiene
+
+        Args:
+            q: Cuantil entre 0 y 1
+
+        Returns:
+            float: Valor estimado (0 si no hay observaciones)
+        """
+        if not self.count:
+            return 0.0
+        rank = q * self.count
+        seen = 0
+        for index, bucket_count in enumerate(self.counts):
+            if seen + bucket_count >= rank and bucket_count:
+                lower = self.buckets[index - 1] if index > 0 else 0.0
+                upper = min(self.buckets[index], self.max) if index < len(self.buckets) else self.max
+                return lower + (upper - lower) * (rank - seen) / bucket_count
+            seen += bucket_count
+        return self.max
+
+
+class MetricsRegistry:
+    """Registro de métricas de una ejecución"""
+
+    def __init__(self):
+        """Inicializa un registro vacío"""
+        self._lock = threading.Lock()
+        self._counters: Dict[SeriesKey, float] = {}
+        self._gauges: Dict[SeriesKey, float] = {}
+        self._histograms: Dict[SeriesKey, Histogram] = {}
+        self._started = time.time()
+
+    def inc(self, name: str, amount: float = 1, **labels) -> None:
+        """
+        Incrementa un contador
+
+        Args:
+            name: Nombre del contador
+            amount: Cantidad a sumar
+            **labels: Etiquetas de la serie
+        """
+        key = _series_key(name, labels)
+        with self._lock:
+            self._counters[key] = self._counters.get(key, 0) + amount
+
+    def set(self, name: str, value: float, **labels) -> None:
+        """
+        Fija el valor de un indicador (gauge)
+
+        Args:
+            name: Nombre del indicador
+            value: Valor actual
+            **labels: Etiquetas de la serie
+        """
+        key = _series_key(name, labels)
+        with self._lock:
+            self._gauges[key] = value
+
+    def observe(self, name: str, value: float, **labels) -> None:
+        """
+        Registra una observación en un histograma de latencia
+
+        Args:
+            name: Nombre del histograma
+            value: Valor observado (segundos)
+            **labels: Etiquetas de la serie
+        """
+        key = _series_key(name, labels)
+        with self._lock:
+            histogram = self._histograms.get(key)
+            if histogram is None:
+                histogram = self._histograms[key] = Histogram()
+            histogram.observe(value)
+
+    @contextmanager
+    def timer(self, name: str, **labels) -> Iterator[None]:
+        """
+        Mide la duración del bloque with y la registra en un histograma
+
+        Args:
+            name: Nombre del histograma
+            **labels: Etiquetas de la serie
+        """
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(name, time.perf_counter() - start, **labels)
+
+    def counters(self) -> Dict[str, float]:
+        """
+        Devuelve los contadores sin etiquetas (las estadísticas de la ejecución)
+
+        Returns:
+            Dict[str, float]: Valor de cada contador
+        """
+        with self._lock:
+            return {name: value for (name, labels), value in self._counters.items() if not labels}
+
+    def summary(self) -> dict:
+        """
+        Resumen de todas las métricas con percentiles estimados
+
+        Returns:
+            dict: Contadores, indicadores e histogramas
+        """
+        def series_name(key: SeriesKey) -> str:
+            name, labels = key
+            return name + _format_labels(labels)
+
+        with self._lock:
+            return {
+                "started_at": self._started,
+                "duration_seconds": time.time() - self._started,
+                "counters": {series_name(key): value for key, value in sorted(self._counters.items())},
+                "gauges": {series_name(key): value for key, value in sorted(self._gauges.items())},
+                "histograms": {
+                    series_name(key): {
+                        "count": histogram.count,
+                        "sum": round(histogram.sum, 6),
+                        "mean": round(histogram.sum / histogram.count, 6) if histogram.count else 0.0,
+                        "p50": round(histogram.quantile(0.5), 6),
+                        "p95": round(histogram.quantile(0.95), 6),
+                        "p99": round(histogram.quantile(0.99), 6),
+                        "max": round(histogram.max, 6),
+                    }
+                    for key, histogram in sorted(self._histograms.items())
+                },
+            }
+
+    def to_prometheus(self) -> str:
+        """
+        Serializa las métricas en formato de exposición de Prometheus
+
+        Returns:
+            str: Contenido del textfile
+        """
+        lines = []
+        with self._lock:
+            for kind, series in (("counter", self._counters), ("gauge", self._gauges)):
+                declared = set()
+                for (name, labels), value in sorted(series.items()):
+                    metric = f"{METRIC_PREFIX}_{name}" + ("_total" if kind == "counter" else "")
+                    if metric not in declared:
+                        lines.append(f"# TYPE {metric} {kind}")
+                        declared.add(metric)
+                    lines.append(f"{metric}{_format_labels(labels)} {value}")
+
+            declared = set()
+            for (name, labels), histogram in sorted(self._histograms.items()):
+                metric = f"{METRIC_PREFIX}_{name}"
+                if metric not in declared:
+                    lines.append(f"# TYPE {metric} histogram")
+                    declared.add(metric)
+                cumulative = 0
+                for bound, bucket_count in zip(histogram.buckets + (float("inf"),), histogram.counts):
+                    cumulative += bucket_count
+                    le = "+Inf" if bound == float("inf") else repr(float(bound))
+                    lines.append(f"{metric}_bucket{_format_labels(labels, ('le', le))} {cumulative}")
+                lines.append(f"{metric}_sum{_format_labels(labels)} {histogram.sum}")
+                lines.append(f"{metric}_count{_format_labels(labels)} {histogram.count}")
+        return "\n".join(lines) + "\n"
+
+    def write(self, prometheus_file: Optional[Path], json_file: Optional[Path]) -> None:
+        """
+        Escribe el textfile de Prometheus y el resumen JSON de forma atómica
+
+        Args:
+            prometheus_file: Ruta del textfile (.prom) o None para omitirlo
+            json_file: Ruta del resumen JSON o None para omitirlo
+        """
+        outputs = []
+        if prometheus_file:
+            outputs.append((Path(prometheus_file), self.to_prometheus()))
+        if json_file:
+            outputs.append((Path(json_file), json.dumps(self.summary(), ensure_ascii=False, indent=2)))
+        for path, content in outputs:
+            # El recolector de textfiles de node_exporter nunca debe leer un archivo a medias
+            path.parent.mkdir(parents=True, exist_ok=True)
+            tmp_path = path.with_name(path.name + ".tmp")
+            with open(tmp_path, "w", encoding="utf-8") as f:
+                f.write(content)
+            os.replace(tmp_path, path)
@@ -0,0 +1,228 @@
+"""
+AttachDownloader - Módulo de pipeline por etapas
+Encadena etapas con colas acotadas para que la etapa más lenta frene a las demás
+"""
+
+import queue
+import threading
+import time
+from typing import Callable, Dict, Iterable, List, Optional
+
+
+# Marca de fin de trabajo que recorre las colas entre etapas
+_END = object()
+
+# Tiempo máximo de espera en colas antes de comprobar si hay que abortar
+_POLL_INTERVAL = 0.5
+
+
+class Stage:
+    """Etapa del pipeline: un grupo de workers que consume de una cola y produce en otra"""
+
+    def __init__(self, name: str, func: Callable, workers: int, input_queue: queue.Queue,
+                 output_queue: Optional[queue.Queue]):
+        """
+        Inicializa la etapa
+
+        Args:
+            name: Nombre de la etapa (para logs y métricas)
+            func: Función que recibe un elemento y devuelve un iterable de resultados
+            workers: Número de hilos de la etapa
+            input_queue: Cola de entrada
+            output_queue: Cola de salida (None en la última etapa)
+        """
+        self.name = name
+        self.func = func
+        self.workers = max(workers, 1)
+        self.input_queue = input_queue
+        self.output_queue = output_queue
+        self.processed = 0
+        self.errors = 0
+        self.max_queue_depth = 0
+        self._finished_workers = 0
+        self._lock = threading.Lock()
+
+
+class Pipeline:
+    """Pipeline de etapas concurrentes con colas acotadas (backpressure)"""
+
+    def __init__(self, queue_size: int = 100, monitor_interval: float = 0):
+        """
+        Inicializa el pipeline
+
+        Args:
+            queue_size: Capacidad de cada cola entre etapas
+            monitor_interval: Segundos entre informes de profundidad de colas (0 = sin informe)
+        """
+        self.queue_size = max(queue_size, 1)
+        self.monitor_interval = monitor_interval
+        self.stages: List[Stage] = []
+        self._stop = threading.Event()
+        # Primera excepción no recuperable (KeyboardInterrupt, SystemExit) de un worker
+        self._fatal: Optional[BaseException] = None
+
+    def add_stage(self, name: str, func: Callable, workers: int = 1) -> "Pipeline":
+        """
+        Añade una etapa al final del pipeline
+
+        Args:
+            name: Nombre de la etapa
+            func: Función que recibe un elemento y devuelve un iterable de resultados
+            workers: Número de hilos de la etapa
+
+        Returns:
+            Pipeline: El propio pipeline, para encadenar llamadas
+        """
+        input_queue = queue.Queue(maxsize=self.queue_size)
+        if self.stages:
+            self.stages[-1].output_queue = input_queue
+        self.stages.append(Stage(name, func, workers, input_queue, None))
+        return self
+
+    def run(self, source: Iterable) -> None:
+        """
+        Alimenta el pipeline con los elementos de source y espera a que termine
+
+        Args:
+            source: Elementos de entrada de la primera etapa
+        """
+        threads = []
+        for stage in self.stages:
+            for index in range(stage.workers):
+                thread = threading.Thread(
+                    target=self._worker, args=(stage,), name=f"{stage.name}-{index}", daemon=True
+                )
+                thread.start()
+                threads.append(thread)
+
+        monitor = None
+        if self.monitor_interval > 0:
+            monitor = threading.Thread(target=self._monitor, name="pipeline-monitor", daemon=True)
+            monitor.start()
+
+        try:
+            first = self.stages[0]
+            for item in source:
+                if not self._put(first, item):
+                    break
+            for _ in range(first.workers):
+                self._put(first, _END)
+
+            while any(thread.is_alive() for thread in threads):
+                for thread in threads:
+                    thread.join(_POLL_INTERVAL)
+        finally:
+            # Ctrl-C o error en el origen: detener todas las etapas
+            self._stop.set()
+        if self._fatal is not None:
+            # Un worker murió por Ctrl-C o SystemExit: se propaga como en modo secuencial
+            raise self._fatal
+
+    def queue_depths(self) -> Dict[str, int]:
+        """
+        Devuelve la profundidad actual de la cola de entrada de cada etapa
+
+        Returns:
+            Dict[str, int]: Elementos pendientes por etapa
+        """
+        return {stage.name: stage.input_queue.qsize() for stage in self.stages}
+
+    def summary(self) -> Dict[str, dict]:
+        """
+        Devuelve las estadísticas de cada etapa
+
+        Returns:
+            Dict[str, dict]: Elementos procesados, errores y profundidad máxima por etapa
+        """
+        return {
+            stage.name: {
+                "workers": stage.workers,
+                "processed": stage.processed,
+                "errors": stage.errors,
+                "max_queue_depth": stage.max_queue_depth,
+            }
+            for stage in self.stages
+        }
+
+    def _worker(self, stage: Stage) -> None:
+        """
+        Bucle de un worker: consume, procesa y pasa los resultados a la siguiente etapa
+
+        Args:
+            stage: Etapa a la que pertenece el worker
+        """
+        try:
+            self._consume(stage)
+        except BaseException as e:
+            # KeyboardInterrupt o SystemExit dentro de una etapa: detener todo el
+            # pipeline para que run() no espere a etapas que ya no avanzan
+            if self._fatal is None:
+                self._fatal = e
+            self._stop.set()
+        finally:
+            # El último worker de la etapa propaga el fin a la siguiente
+            with stage._lock:
+                stage._finished_workers += 1
+                last = stage._finished_workers == stage.workers
+            if last and stage.output_queue is not None:
+                next_stage = self._next(stage)
+                for _ in range(next_stage.workers):
+                    self._put(next_stage, _END)
+
+    def _consume(self, stage: Stage) -> None:
+        """
+        Procesa elementos de la cola de la etapa hasta el fin o la detención
+
+        Args:
+            stage: Etapa a la que pertenece el worker
+        """
+        while not self._stop.is_set():
+            try:
+                item = stage.input_queue.get(timeout=_POLL_INTERVAL)
+            except queue.Empty:
+                continue
+            if item is _END:
+                return
+
+            try:
+                for result in stage.func(item) or ():
+                    if stage.output_queue is not None and not self._put(self._next(stage), result):
+                        return
+                with stage._lock:
+                    stage.processed += 1
+            except Exception as e:
+                with stage._lock:
+                    stage.errors += 1
+                print(f"⚠️ Error en la etapa {stage.name}: {e}")
+
+    def _put(self, stage: Stage, item) -> bool:
+        """
+        Encola un elemento bloqueando mientras la cola esté llena
+
+        Args:
+            stage: Etapa destino
+            item: Elemento a encolar
+
+        Returns:
+            bool: False si el pipeline se ha detenido antes de poder encolar
+        """
+        while not self._stop.is_set():
+            try:
+                stage.input_queue.put(item, timeout=_POLL_INTERVAL)
+            except queue.Full:
+                continue
+            depth = stage.input_queue.qsize()
+            if depth > stage.max_queue_depth:
+                stage.max_queue_depth = depth
+            return True
+        return False
+
+    def _next(self, stage: Stage) -> Stage:
+        """Devuelve la etapa siguiente a stage"""
+        return self.stages[self.stages.index(stage) + 1]
+
+    def _monitor(self) -> None:
+        """Imprime periódicamente la profundidad de las colas"""
+        while not self._stop.wait(self.monitor_interval):
+            depths = ", ".join(f"{name}={depth}" for name, depth in self.queue_depths().items())
+            print(f"📊 Colas del pipeline: {depths}")
@@ -0,0 +1,170 @@
+"""
+AttachDownloader - Módulo de plan de descarga
+Inventario de lo que descargaría una ejecución, sin descargar nada,
+que después se puede ejecutar directamente
+"""
+
+import csv
+import json
+import os
+from collections import OrderedDict
+from datetime import datetime
+from pathlib import Path
+from typing import Dict, Iterator, List, Optional, Set
+
+
+# Columnas de cada adjunto en el plan (también cabecera del CSV)
+PLAN_COLUMNS = ["folder", "filename", "message_id", "part_id", "size"]
+
+
+class DownloadPlan:
+    """Adjuntos previstos por carpeta <Año>/<Trimestre>/<Remitente>, con tamaños y cuota"""
+
+    def __init__(self, query: str = "", listing_units: int = 0, metadata_units: int = 0):
+        """
+        Inicializa un plan vacío
+
+        Args:
+            query: Consulta de Gmail usada para listar los mensajes
+            listing_units: Unidades de cuota gastadas en listar mensajes
+            metadata_units: Unidades de cuota gastadas en obtener metadatos
+        """
+        self.query = query
+        self.listing_units = listing_units
+        self.metadata_units = metadata_units
+        self.messages_scanned = 0
+        self.attachments: List[dict] = []
+        self._parts: Dict[str, Set[str]] = OrderedDict()
+
+    def add(self, folder: str, filename: str, message_id: str, part_id: str, size: int) -> None:
+        """
+        Añade un adjunto al plan
+
+        Args:
+            folder: Carpeta relativa <Año>/<Trimestre>/<Remitente>
+            filename: Nombre del adjunto (sanitizado)
+            message_id: ID del mensaje
+            part_id: Identificador de la parte del mensaje
+            size: Tamaño en bytes según body.size
+        """
+        self.attachments.append({
+            "folder": folder,
+            "filename": filename,
+            "message_id": message_id,
+            "part_id": part_id,
+            "size": int(size or 0),
+        })
+        self._parts.setdefault(message_id, set()).add(part_id)
+
+    def message_ids(self) -> Iterator[str]:
+        """Genera los IDs de los mensajes con algún adjunto previsto, en orden"""
+        return iter(self._parts)
+
+    def includes(self, message_id: str, part_id: str) -> bool:
+        """Indica si un adjunto forma parte del plan"""
+        return part_id in self._parts.get(message_id, ())
+
+    @property
+    def total_bytes(self) -> int:
+        """Bytes totales previstos"""
+        return sum(item["size"] for item in self.attachments)
+
+    @property
+    def quota_units(self) -> int:
+        """Unidades de cuota de una ejecución normal (listado + metadatos + adjuntos)"""
+        return self.listing_units + self.metadata_units + self._attachment_units
+
+    @property
+    def execution_units(self) -> int:
+        """Unidades de cuota al ejecutar este plan (sin listar el buzón)"""
+        # scheduler carga googleapiclient: importarlo aquí mantiene ligero --help
+        from .scheduler import QUOTA_UNITS
+
+        return len(self._parts) * QUOTA_UNITS["messages.get"] + self._attachment_units
+
+    @property
+    def _attachment_units(self) -> int:
+        """Unidades de cuota de descargar los adjuntos previstos"""
+        from .scheduler import QUOTA_UNITS
+
+        return len(self.attachments) * QUOTA_UNITS["attachments.get"]
+
+    def folders(self) -> List[dict]:
+        """
+        Agrupa el plan por carpeta destino
+
+        Returns:
+            List[dict]: {"folder", "attachments", "bytes"} por carpeta, ordenado
+        """
+        totals: Dict[str, dict] = {}
+        for item in self.attachments:
+            entry = totals.setdefault(item["folder"], {"folder": item["folder"], "attachments": 0, "bytes": 0})
+            entry["attachments"] += 1
+            entry["bytes"] += item["size"]
+        return [totals[folder] for folder in sorted(totals)]
+
+    def save(self, path: Path) -> None:
+        """
+        Guarda el plan en JSON (resumen y adjuntos) o CSV (un adjunto por fila)
+
+        Args:
+            path: Archivo destino; el formato se elige por la extensión
+        """
+        path = Path(path)
+        path.parent.mkdir(parents=True, exist_ok=True)
+        tmp_path = path.with_name(path.name + ".tmp")
+        with open(tmp_path, "w", encoding="utf-8", newline="") as f:
+            if path.suffix.lower() == ".csv":
+                writer = csv.DictWriter(f, fieldnames=PLAN_COLUMNS)
+                writer.writeheader()
+                writer.writerows(self.attachments)
+            else:
+                json.dump({
+                    "created_at": datetime.now().isoformat(),
+                    "query": self.query,
+                    "totals": {
+                        "messages_scanned": self.messages_scanned,
+                        "messages": len(self._parts),
+                        "attachments": len(self.attachments),
+                        "bytes": self.total_bytes,
+                        "quota_units": self.quota_units,
+                        "quota_units_from_plan": self.execution_units,
+                    },
+                    "quota": {
+                        "listing_units": self.listing_units,
+                        "metadata_units": self.metadata_units,
+                    },
+                    "folders": self.folders(),
+                    "attachments": self.attachments,
+                }, f, ensure_ascii=False, indent=2)
+        os.replace(tmp_path, path)
+
+    @classmethod
+    def load(cls, path: Path) -> "DownloadPlan":
+        """
+        Carga un plan guardado con save()
+
+        Args:
+            path: Archivo JSON o CSV
+
+        Returns:
+            DownloadPlan: Plan cargado
+        """
+        path = Path(path)
+        with open(path, encoding="utf-8", newline="") as f:
+            if path.suffix.lower() == ".csv":
+                data: Optional[dict] = None
+                rows = list(csv.DictReader(f))
+            else:
+                data = json.load(f)
+                rows = data.get("attachments", [])
+
+        plan = cls()
+        if data:
+            plan.query = data.get("query", "")
+            plan.messages_scanned = data.get("totals", {}).get("messages_scanned", 0)
+            plan.listing_units = data.get("quota", {}).get("listing_units", 0)
+            plan.metadata_units = data.get("quota", {}).get("metadata_units", 0)
+        for row in rows:
+            plan.add(row["folder"], row["filename"], row["message_id"], row["part_id"], row["size"])
+        return plan
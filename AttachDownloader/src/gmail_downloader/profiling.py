@@ -0,0 +1,168 @@
+"""
+AttachDownloader - Módulo de perfilado
+Ejecuta una función bajo cProfile, un perfilador de muestreo o tracemalloc y
+deja los informes en logs/ (también desde el ejecutable de PyInstaller)
+"""
+
+import sys
+import threading
+import time
+from collections import Counter
+from contextlib import contextmanager
+from datetime import datetime
+from pathlib import Path
+from typing import Iterator, List, Optional
+
+
+# Modos de perfilado de CPU disponibles
+PROFILE_MODES = ("cprofile", "sample")
+
+# Intervalo entre muestras del perfilador de muestreo (segundos)
+SAMPLE_INTERVAL = 0.005
+
+# Entradas de los informes de texto (funciones y asignaciones)
+TOP_N = 30
+
+
+class SamplingProfiler:
+    """Perfilador de muestreo de todos los hilos, con salida en pilas colapsadas"""
+
+    def __init__(self, interval: float = SAMPLE_INTERVAL):
+        """
+        Inicializa el perfilador
+
+        Args:
+            interval: Segundos entre muestras
+        """
+        self.interval = interval
+        self.stacks = Counter()
+        self.samples = 0
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+
+    def start(self) -> None:
+        """Empieza a tomar muestras en un hilo en segundo plano"""
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._run, name="sampling-profiler", daemon=True)
+        self._thread.start()
+
+    def stop(self) -> None:
+        """Deja de tomar muestras"""
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join()
+
+    def _run(self) -> None:
+        """Bucle de muestreo: pila de cada hilo vivo, salvo el propio perfilador"""
+        own_id = threading.get_ident()
+        while not self._stop.wait(self.interval):
+            names = {thread.ident: thread.name for thread in threading.enumerate()}
+            for thread_id, frame in sys._current_frames().items():
+                if thread_id == own_id:
+                    continue
+                stack: List[str] = []
+                while frame is not None:
+                    code = frame.f_code
+                    stack.append(f"{code.co_name} ({Path(code.co_filename).name}:{frame.f_lineno})")
+                    frame = frame.f_back
+                stack.append(names.get(thread_id, str(thread_id)))
+                self.stacks[";".join(reversed(stack))] += 1
+            self.samples += 1
+
+    def write_collapsed(self, path: Path) -> None:
+        """
+        Escribe las pilas en formato colapsado (flamegraph.pl, speedscope, inferno)
+
+        Args:
+            path: Archivo destino
+        """
+        with open(path, "w", encoding="utf-8") as f:
+            for stack, count in self.stacks.most_common():
+                f.write(f"{stack} {count}\n")
+
+
+def _write_cprofile_report(profiler, prof_file: Path, report_file: Path) -> None:
+    """Guarda el .prof (para snakeviz/gprof2dot) y el top-N por tiempo acumulado"""
+    import pstats
+
+    profiler.dump_stats(str(prof_file))
+    with open(report_file, "w", encoding="utf-8") as f:
+        stats = pstats.Stats(profiler, stream=f)
+        stats.sort_stats("cumulative").print_stats(TOP_N)
+
+
+def _write_memory_report(snapshot, peak: int, report_file: Path) -> None:
+    """Guarda el top-N de asignaciones vivas por línea y el pico de memoria"""
+    with open(report_file, "w", encoding="utf-8") as f:
+        f.write(f"Pico de memoria trazada: {peak / 1024 / 1024:.1f} MB\n\n")
+        f.write(f"Top {TOP_N} asignaciones por línea (memoria viva al terminar):\n")
+        for index, stat in enumerate(snapshot.statistics("lineno")[:TOP_N], start=1):
+            frame = stat.traceback[0]
+            f.write(f"{index:3}. {frame.filename}:{frame.lineno}: "
+                    f"{stat.size / 1024:.1f} KiB en {stat.count} bloques\n")
+
+
+@contextmanager
+def profile_run(mode: Optional[str] = None, trace_memory: bool = False,
+                output_dir: Path = Path("logs")) -> Iterator[List[Path]]:
+    """
+    Perfila el bloque with y escribe los informes en output_dir
+
+    Args:
+        mode: "cprofile", "sample" o None para no perfilar CPU
+        trace_memory: Trazar asignaciones con tracemalloc
+        output_dir: Carpeta de los informes
+
+    Yields:
+        List[Path]: Se rellena con los archivos generados al salir del bloque
+    """
+    if mode is not None and mode not in PROFILE_MODES:
+        raise ValueError(f"Modo de perfilado desconocido: {mode} (usa {', '.join(PROFILE_MODES)})")
+
+    output_dir = Path(output_dir)
+    prefix = output_dir / f"profile_{datetime.now().strftime('%Y%m%d_%H%M%S')}"
+    written: List[Path] = []
+
+    if trace_memory:
+        import tracemalloc
+        # 25 marcos por asignación para poder agrupar también por traza completa
+        tracemalloc.start(25)
+
+    profiler = None
+    if mode == "cprofile":
+        import cProfile
+        profiler = cProfile.Profile()
+        profiler.enable()
+    elif mode == "sample":
+        profiler = SamplingProfiler()
+        profiler.start()
+
+    start = time.perf_counter()
+    try:
+        yield written
+    finally:
+        elapsed = time.perf_counter() - start
+        if mode == "cprofile":
+            profiler.disable()
+        elif mode == "sample":
+            profiler.stop()
+
+        output_dir.mkdir(parents=True, exist_ok=True)
+        if mode == "cprofile":
+            written += [prefix.with_suffix(".prof"), prefix.with_suffix(".txt")]
+            _write_cprofile_report(profiler, written[-2], written[-1])
+        elif mode == "sample":
+            written.append(prefix.with_suffix(".collapsed"))
+            profiler.write_collapsed(written[-1])
+        if trace_memory:
+            import tracemalloc
+            snapshot = tracemalloc.take_snapshot()
+            _, peak = tracemalloc.get_traced_memory()
+            tracemalloc.stop()
+            written.append(prefix.with_name(prefix.name + "_memory.txt"))
+            _write_memory_report(snapshot, peak, written[-1])
+
+        for path in written:
+            print(f"🔬 Perfil guardado: {path}")
+        if written:
+            print(f"   Duración perfilada: {elapsed:.1f} s")
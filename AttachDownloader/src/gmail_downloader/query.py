@@ -0,0 +1,178 @@
+"""
+AttachDownloader - Módulo de construcción de consultas de Gmail
+Traduce los filtros de config.cfg a una expresión de búsqueda q= de Gmail
+"""
+
+import re
+from datetime import datetime, timedelta
+from typing import List, Optional
+from .config import ConfigManager
+
+
+# Tamaño máximo de página admitido por users.messages.list
+MAX_PAGE_SIZE = 500
+
+# Remitentes que Gmail puede buscar tal cual: dirección completa (a@b.com)
+# o dominio completo (@b.com). from: compara palabras completas, no fragmentos
+FULL_ADDRESS = re.compile(r"^[^@\s]+@[a-z0-9-]+(\.[a-z0-9-]+)+$", re.IGNORECASE)
+FULL_DOMAIN = re.compile(r"^@[a-z0-9-]+(\.[a-z0-9-]+)+$", re.IGNORECASE)
+
+
+class GmailQueryBuilder:
+    """Compila las secciones FILTERS/SENDERS/DATES en una consulta de Gmail"""
+
+    def __init__(self, config: ConfigManager):
+        """
+        Inicializa el compilador de consultas
+
+        Args:
+            config: Instancia de ConfigManager con los filtros a trasladar
+        """
+        self.config = config
+
+    def build(self) -> str:
+        """
+        Construye la expresión de búsqueda para el parámetro q=
+
+        Solo se trasladan los filtros que Gmail evalúa igual que los filtros
+        locales (fechas ampliadas, extensiones, direcciones y dominios
+        completos); los fragmentos de remitente se quedan en el filtro local,
+        que se sigue aplicando siempre. has:attachment deja fuera las partes
+        inline con nombre de archivo: se puede desactivar con
+        [ADVANCED] query_has_attachment = False.
+
+        Returns:
+            str: Consulta de Gmail (ej: "has:attachment after:2025/12/04 {filename:pdf}")
+        """
+        terms = ["has:attachment"] if self.config.query_has_attachment else []
+        terms.extend(self._date_terms())
+        terms.extend(self._extension_terms())
+        terms.extend(self._sender_terms())
+        terms.extend(self._label_terms())
+        return " ".join(term for term in terms if term)
+
+    def _date_terms(self) -> List[str]:
+        """
+        Genera los términos after:/before: a partir del rango de fechas
+
+        Gmail evalúa las fechas en la zona horaria del Pacífico, por lo que el
+        rango se amplía un día por cada lado para no perder correos en los bordes.
+
+        Returns:
+            List[str]: Términos de fecha
+        """
+        terms = []
+        date_from = self._parse_date(self.config.date_from)
+        if date_from:
+            terms.append(f"after:{(date_from - timedelta(days=1)):%Y/%m/%d}")
+
+        date_to = self._parse_date(self.config.date_to)
+        if date_to:
+            # before: es exclusivo y date_to incluye todo el día
+            terms.append(f"before:{(date_to + timedelta(days=2)):%Y/%m/%d}")
+        return terms
+
+    def _extension_terms(self) -> List[str]:
+        """
+        Genera el término filename: con las extensiones permitidas
+
+        Returns:
+            List[str]: Término con las extensiones agrupadas en OR
+        """
+        extensions = [ext.lstrip(".") for ext in self.config.allowed_extensions if ext]
+        return [self._any_of("filename", extensions)] if extensions else []
+
+    def _sender_terms(self) -> List[str]:
+        """
+        Genera los términos from: (lista blanca) y -from: (lista negra)
+
+        Gmail compara from: por palabras completas y los filtros locales por
+        fragmentos: "factur" o "@empresa" no casan en Gmail con
+        facturas@empresa.com. Solo se trasladan direcciones y dominios
+        completos, y la lista blanca solo si lo son todas sus entradas (la
+        disyunción no puede perder ningún remitente que el filtro local acepte).
+
+        Returns:
+            List[str]: Términos de remitente
+        """
+        terms = []
+        whitelist = [sender.strip() for sender in self.config.whitelist_senders if sender.strip()]
+        if whitelist and all(self._is_searchable_sender(sender) for sender in whitelist):
+            terms.append(self._any_of("from", whitelist))
+        for sender in self.config.blacklist_senders:
+            sender = sender.strip()
+            if sender and self._is_searchable_sender(sender):
+                terms.append(f"-from:{self._quote(sender)}")
+        return terms
+
+    @staticmethod
+    def _is_searchable_sender(sender: str) -> bool:
+        """
+        Indica si un remitente de la configuración es una dirección o un dominio completo
+
+        Args:
+            sender: Entrada de whitelist_senders o blacklist_senders
+
+        Returns:
+            bool: True si from: de Gmail lo busca igual que el filtro local
+        """
+        return bool(FULL_ADDRESS.match(sender) or FULL_DOMAIN.match(sender))
+
+    def _label_terms(self) -> List[str]:
+        """
+        Genera el término label: con las etiquetas configuradas
+
+        Returns:
+            List[str]: Término con las etiquetas agrupadas en OR
+        """
+        labels = [label.replace(" ", "-") for label in self.config.gmail_labels]
+        return [self._any_of("label", labels)] if labels else []
+
+    @classmethod
+    def _any_of(cls, operator: str, values: List[str]) -> str:
+        """
+        Agrupa varios valores de un operador en una disyunción de Gmail
+
+        Args:
+            operator: Operador de búsqueda (filename, from, label)
+            values: Valores a combinar
+
+        Returns:
+            str: "op:valor" o "{op:a op:b}" si hay varios valores
+        """
+        terms = [f"{operator}:{cls._quote(value)}" for value in values if value]
+        if len(terms) == 1:
+            return terms[0]
+        return "{" + " ".join(terms) + "}"
+
+    @staticmethod
+    def _quote(value: str) -> str:
+        """
+        Entrecomilla valores con espacios para que Gmail los trate como un término
+
+        Args:
+            value: Valor a entrecomillar
+
+        Returns:
+            str: Valor listo para la consulta
+        """
+        value = value.strip().replace('"', "")
+        return f'"{value}"' if " " in value else value
+
+    @staticmethod
+    def _parse_date(value: Optional[str]) -> Optional[datetime]:
+        """
+        Parsea una fecha YYYY-MM-DD de la configuración
+
+        Args:
+            value: Fecha en formato YYYY-MM-DD o None
+
+        Returns:
+            Optional[datetime]: Fecha parseada o None si no es válida
+        """
+        if not value:
+            return None
+        try:
+            return datetime.strptime(value.strip(), "%Y-%m-%d")
+        except ValueError:
+            return None
@@ -0,0 +1,245 @@
+"""
+AttachDownloader - Módulo de planificación de peticiones
+Limita el ritmo de llamadas a Gmail API según la cuota por usuario,
+ajusta la concurrencia (AIMD) y reintenta con backoff exponencial
+"""
+
+import random
+import threading
+import time
+from typing import Any, Dict, Optional
+from googleapiclient.errors import HttpError
+from .metrics import MetricsRegistry
+
+
+# Coste en unidades de cuota de cada método de Gmail API
+QUOTA_UNITS: Dict[str, int] = {
+    "getProfile": 1,
+    "history.list": 2,
+    "messages.list": 5,
+    "messages.get": 5,
+    "attachments.get": 5,
+}
+
+# Coste por defecto de métodos no listados
+DEFAULT_QUOTA_UNITS = 5
+
+# Etapa de la descarga a la que pertenece cada método
+METHOD_STAGES: Dict[str, str] = {
+    "getProfile": "list",
+    "history.list": "list",
+    "messages.list": "list",
+    "messages.get": "metadata",
+    "attachments.get": "fetch",
+}
+
+# Códigos HTTP transitorios que se reintentan
+RETRYABLE_STATUS = (429, 500, 502, 503, 504)
+
+# Espera máxima entre reintentos (segundos)
+MAX_BACKOFF = 64
+
+# Intervalo mínimo entre dos reducciones de concurrencia (segundos)
+DECREASE_INTERVAL = 1.0
+
+
+def is_throttle_error(exception: Exception) -> bool:
+    """
+    Indica si un error es una limitación de cuota de Gmail
+
+    Args:
+        exception: Excepción recibida
+
+    Returns:
+        bool: True para 429 y 403 rateLimitExceeded/userRateLimitExceeded
+    """
+    if not isinstance(exception, HttpError):
+        return False
+    if exception.resp.status == 429:
+        return True
+    return exception.resp.status == 403 and "ratelimitexceeded" in str(exception.content).lower()
+
+
+def is_retryable_error(exception: Exception) -> bool:
+    """
+    Indica si un error es transitorio y merece un reintento
+
+    Args:
+        exception: Excepción recibida
+
+    Returns:
+        bool: True para limitaciones de cuota, errores 5xx y fallos de conexión
+    """
+    if is_throttle_error(exception):
+        return True
+    if isinstance(exception, HttpError):
+        return exception.resp.status in RETRYABLE_STATUS
+    return isinstance(exception, (ConnectionError, TimeoutError))
+
+
+class RequestScheduler:
+    """Planificador thread-safe de las llamadas .execute() a Gmail API"""
+
+    def __init__(self, quota_units_per_second: int = 250, max_concurrency: int = 10,
+                 retry_attempts: int = 3, retry_delay: float = 5,
+                 metrics: Optional[MetricsRegistry] = None):
+        """
+        Inicializa el planificador
+
+        Args:
+            quota_units_per_second: Unidades de cuota por segundo y usuario
+            max_concurrency: Máximo de peticiones simultáneas
+            retry_attempts: Reintentos ante errores transitorios
+            retry_delay: Espera base del backoff exponencial (segundos)
+            metrics: Registro donde anotar latencias, reintentos y concurrencia
+        """
+        self.metrics = metrics or MetricsRegistry()
+
+        # Cubo de tokens: capacidad de un segundo de cuota
+        self.rate = max(quota_units_per_second, 1)
+        self._tokens = float(self.rate)
+        self._last_refill = time.monotonic()
+        self._bucket_lock = threading.Lock()
+
+        # Concurrencia adaptativa (AIMD)
+        self.max_concurrency = max(max_concurrency, 1)
+        self._limit = float(self.max_concurrency)
+        self._in_flight = 0
+        self._peak_in_flight = 0
+        self._last_decrease = 0.0
+        self._slots = threading.Condition()
+
+        self.retry_attempts = max(retry_attempts, 0)
+        self.retry_delay = retry_delay
+        self.retries = 0
+        self.throttled = 0
+        # Unidades de cuota consumidas por método (incluye reintentos)
+        self.units_used: Dict[str, int] = {}
+
+    @property
+    def concurrency_limit(self) -> int:
+        """Límite de concurrencia actual"""
+        return int(self._limit)
+
+    def execute(self, request, method: str, units: int = None, retry: bool = True) -> Any:
+        """
+        Ejecuta una petición respetando cuota y concurrencia, con reintentos
+
+        Args:
+            request: HttpRequest o BatchHttpRequest de googleapiclient
+            method: Nombre del método (clave de QUOTA_UNITS)
+            units: Unidades de cuota a consumir (por defecto, las del método)
+            retry: Reintentar errores transitorios (False si el llamante gestiona
+                los reintentos, como en las peticiones batch)
+
+        Returns:
+            Any: Respuesta de la petición
+        """
+        units = units if units is not None else QUOTA_UNITS.get(method, DEFAULT_QUOTA_UNITS)
+        attempt = 0
+        # La etapa incluye esperas de cuota y reintentos; api_request_seconds, solo la petición HTTP
+        with self.metrics.timer("stage_seconds", stage=METHOD_STAGES.get(method, method)):
+            while True:
+                self._acquire_tokens(units, method)
+                self._acquire_slot()
+                start = time.perf_counter()
+                try:
+                    response = request.execute()
+                except Exception as e:
+                    self._observe_request(method, start, "error")
+                    self._release_slot()
+                    if is_throttle_error(e):
+                        self.record_throttle()
+                    if not retry or attempt >= self.retry_attempts or not is_retryable_error(e):
+                        raise
+                    self.backoff(attempt)
+                    attempt += 1
+                    continue
+
+                self._observe_request(method, start, "ok")
+                self._release_slot()
+                self.record_success()
+                return response
+
+    def _observe_request(self, method: str, start: float, outcome: str) -> None:
+        """Registra la latencia de una petición HTTP"""
+        self.metrics.observe(
+            "api_request_seconds", time.perf_counter() - start, method=method, outcome=outcome
+        )
+
+    def backoff(self, attempt: int) -> None:
+        """
+        Espera antes de un reintento con backoff exponencial y jitter
+
+        Args:
+            attempt: Número de reintento (0 = primero)
+        """
+        with self._slots:
+            self.retries += 1
+        self.metrics.inc("api_retries")
+        cap = min(self.retry_delay * (2 ** attempt), MAX_BACKOFF)
+        time.sleep(cap / 2 + random.uniform(0, cap / 2))
+
+    def record_success(self) -> None:
+        """Incremento aditivo del límite de concurrencia tras una respuesta correcta"""
+        with self._slots:
+            self._limit = min(self._limit + 1 / self._limit, self.max_concurrency)
+            self._slots.notify_all()
+
+    def record_throttle(self) -> None:
+        """Reducción multiplicativa del límite de concurrencia tras un 429"""
+        with self._slots:
+            self.throttled += 1
+            now = time.monotonic()
+            # Una ráfaga de 429 simultáneos cuenta como una sola señal
+            if now - self._last_decrease >= DECREASE_INTERVAL:
+                self._limit = max(self._limit / 2, 1.0)
+                self._last_decrease = now
+                self.metrics.set("api_concurrency_limit", int(self._limit))
+        self.metrics.inc("api_throttled")
+
+    def _acquire_tokens(self, units: int, method: str) -> None:
+        """
+        Consume unidades de cuota del cubo, esperando si no hay suficientes
+
+        Una petición mayor que la capacidad del cubo (un batch de 100
+        messages.get = 500 unidades) se cobra entera y deja el cubo en
+        negativo: las siguientes esperan a que se recupere esa deuda, así el
+        ritmo medio nunca supera quota_units_per_second.
+
+        Args:
+            units: Unidades a consumir
+            method: Método que las consume (para units_used)
+        """
+        # Con el cubo lleno una petición grande sale ya; si no, espera a que lo esté
+        needed = min(units, self.rate)
+        while True:
+            with self._bucket_lock:
+                now = time.monotonic()
+                self._tokens = min(self.rate, self._tokens + (now - self._last_refill) * self.rate)
+                self._last_refill = now
+                if self._tokens >= needed:
+                    self._tokens -= units
+                    self.units_used[method] = self.units_used.get(method, 0) + units
+                    self.metrics.inc("api_quota_units", units, method=method)
+                    return
+                wait = (needed - self._tokens) / self.rate
+            time.sleep(wait)
+
+    def _acquire_slot(self) -> None:
+        """Espera a que haya hueco dentro del límite de concurrencia"""
+        with self._slots:
+            while self._in_flight >= int(self._limit):
+                self._slots.wait()
+            self._in_flight += 1
+            self.metrics.set("api_in_flight", self._in_flight)
+            if self._in_flight > self._peak_in_flight:
+                self._peak_in_flight = self._in_flight
+                self.metrics.set("api_in_flight_max", self._in_flight)
+
+    def _release_slot(self) -> None:
+        """Libera un hueco de concurrencia"""
+        with self._slots:
+            self._in_flight -= 1
+            self.metrics.set("api_in_flight", self._in_flight)
+            self._slots.notify_all()
@@ -0,0 +1,609 @@
+"""
+AttachDownloader - Módulo de destinos de almacenamiento
+Destinos de los adjuntos: carpetas locales, memoria (pruebas) y almacenamiento
+de objetos compatible con S3 (AWS, MinIO...). La estructura
+<Año>/<Trimestre>/<Remitente>/<archivo> se convierte en la clave del objeto.
+"""
+
+import hashlib
+import hmac
+import os
+import threading
+import time
+import xml.etree.ElementTree as ET
+from abc import ABC, abstractmethod
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timezone
+from pathlib import Path
+from typing import Callable, Dict, Iterable, Optional, Set
+from urllib.parse import parse_qsl, quote, urlencode, urlsplit
+
+from .file_writer import TEMP_SUFFIX, commit_temp_file, write_temp_file
+from .folder_index import free_name
+
+
+# Destinos disponibles ([DOWNLOADS] storage_backend); local = carpetas en download_folder
+STORAGE_BACKENDS = ("local", "memory", "s3")
+
+# Hash SHA-256 de un cuerpo vacío (cabecera x-amz-content-sha256)
+EMPTY_SHA256 = hashlib.sha256(b"").hexdigest()
+
+# Tamaño mínimo de parte de S3 (salvo la última)
+MIN_PART_SIZE = 5 * 1024 * 1024
+
+# Intentos de cada petición a S3 ante errores de conexión y respuestas 5xx
+S3_ATTEMPTS = 3
+
+
+class StorageError(IOError):
+    """Error devuelto por el almacenamiento de objetos"""
+
+
+class StorageBackend(ABC):
+    """
+    Destino de adjuntos direccionado por claves <Año>/<Trimestre>/<Remitente>/<archivo>
+
+    Los nombres ocupados de cada carpeta se consultan una sola vez (list_names)
+    y después se reservan en memoria, sin tocar el destino por cada adjunto.
+    En el manifiesto se guarda la ubicación completa (location()).
+    """
+
+    # Prefijo de las ubicaciones (<scheme>://...)
+    scheme = ""
+
+    # Comprobar que sigue guardado un objeto que el manifiesto ya registra
+    # (False si cada comprobación es una petición de red)
+    verify_recorded = True
+
+    # Admite enlaces duros (link()) para los duplicados
+    hardlinks = False
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._names: Dict[str, Set[str]] = {}
+
+    def reserve(self, folder: str, filename: str, sanitize: Callable[[str], str],
+                keep_existing: bool = True) -> str:
+        """
+        Reserva una clave libre en la carpeta
+
+        Args:
+            folder: Carpeta <Año>/<Trimestre>/<Remitente> (ya sanitizada)
+            filename: Nombre deseado (ya sanitizado)
+            sanitize: Función que sanitiza los nombres con timestamp
+            keep_existing: Si el nombre está ocupado, generar otro con timestamp
+                en lugar de sobrescribir el objeto
+
+        Returns:
+            str: Clave reservada
+        """
+        with self._lock:
+            names = self._names.get(folder)
+        if names is None:
+            # Fuera del bloqueo: listar una carpeta remota no frena a las demás
+            listed = self.list_names(folder)
+            with self._lock:
+                names = self._names.setdefault(folder, listed)
+        with self._lock:
+            if keep_existing:
+                filename = free_name(filename, names, sanitize)
+            names.add(filename)
+        return f"{folder}/{filename}"
+
+    def discard(self, key: str) -> None:
+        """Libera una clave reservada que finalmente no se ha escrito"""
+        folder, _, filename = key.rpartition("/")
+        with self._lock:
+            self._names.get(folder, set()).discard(filename)
+
+    def delete(self, key: str) -> bool:
+        """
+        Borra un objeto recién guardado (p. ej. un duplicado) y libera su clave
+
+        Args:
+            key: Clave devuelta por reserve()
+
+        Returns:
+            bool: True si se ha borrado
+        """
+        if not self._delete(key):
+            return False
+        self.discard(key)
+        return True
+
+    def location(self, key: str) -> str:
+        """Ubicación de una clave tal como se guarda en el manifiesto"""
+        return f"{self.scheme}://{key}"
+
+    def key(self, location: str) -> Optional[str]:
+        """Clave de una ubicación de este destino (None si es de otro)"""
+        prefix = self.location("")
+        return location[len(prefix):] if location.startswith(prefix) else None
+
+    def exists(self, location: str) -> bool:
+        """
+        Indica si una ubicación del manifiesto sigue guardada
+
+        Args:
+            location: Ubicación de este destino o ruta de una descarga local anterior
+
+        Returns:
+            bool: True si existe
+        """
+        key = self.key(location)
+        if key is None:
+            return Path(location).exists()
+        return self._exists(key)
+
+    def link(self, location: str, key: str) -> bool:
+        """
+        Sustituye un objeto recién guardado por un enlace duro a otro con el mismo contenido
+
+        Args:
+            location: Ubicación del objeto existente
+            key: Clave del objeto a sustituir
+
+        Returns:
+            bool: True si se ha enlazado (False: se conserva la copia)
+        """
+        return False
+
+    @abstractmethod
+    def list_names(self, folder: str) -> Set[str]:
+        """Nombres de los objetos guardados directamente en una carpeta"""
+
+    @abstractmethod
+    def put(self, key: str, chunks: Iterable[bytes], size: int, sha256: Optional[str] = None,
+            mtime: Optional[datetime] = None) -> str:
+        """
+        Guarda un objeto a medida que llegan sus bloques
+
+        Args:
+            key: Clave devuelta por reserve()
+            chunks: Bloques del contenido
+            size: Tamaño exacto del contenido
+            sha256: Hash del contenido si ya se conoce (no se vuelve a calcular)
+            mtime: Fecha del correo (solo la usan los archivos por trimestre)
+
+        Raises:
+            ValueError: Si los bloques no suman size bytes (no se guarda nada)
+
+        Returns:
+            str: Hash SHA-256 del contenido
+        """
+
+    @abstractmethod
+    def _delete(self, key: str) -> bool:
+        """Borra un objeto (True si ya no existe)"""
+
+    @abstractmethod
+    def _exists(self, key: str) -> bool:
+        """Indica si existe un objeto"""
+
+    @abstractmethod
+    def read(self, key: str) -> bytes:
+        """Contenido de un objeto"""
+
+    def close(self) -> None:
+        """Libera conexiones e hilos"""
+
+
+class LocalStorage(StorageBackend):
+    """
+    Destino en carpetas locales <raíz>/<Año>/<Trimestre>/<Remitente>/<archivo>
+
+    Cada adjunto se escribe en un temporal de su carpeta, se sincroniza y se
+    publica con un renombrado atómico: nunca queda un archivo a medias con el
+    nombre definitivo. En el manifiesto se guardan rutas normales.
+    """
+
+    hardlinks = True
+
+    def __init__(self, root: Path):
+        """
+        Args:
+            root: Carpeta raíz de descargas
+        """
+        super().__init__()
+        self.root = Path(root)
+        self.root.mkdir(parents=True, exist_ok=True)
+        self._folders: Set[Path] = set()
+
+    def location(self, key: str) -> str:
+        return str(self.root / key)
+
+    def key(self, location: str) -> Optional[str]:
+        try:
+            return Path(location).relative_to(self.root).as_posix()
+        except ValueError:
+            return None
+
+    def list_names(self, folder: str) -> Set[str]:
+        try:
+            with os.scandir(self.root / folder) as entries:
+                return {entry.name for entry in entries}
+        except FileNotFoundError:
+            return set()
+
+    def put(self, key: str, chunks: Iterable[bytes], size: int, sha256: Optional[str] = None,
+            mtime: Optional[datetime] = None) -> str:
+        path = self.root / key
+        self._make_folder(path.parent)
+        # Temporal en la misma carpeta para que el renombrado final sea atómico
+        tmp_path, written, digest = write_temp_file(path.parent, chunks)
+        if written != size:
+            tmp_path.unlink()
+            raise ValueError(f"Contenido incompleto: {written} de {size} bytes")
+        commit_temp_file(tmp_path, path)
+        return sha256 or digest
+
+    def _make_folder(self, folder: Path) -> None:
+        """Crea la carpeta la primera vez que se usa (después no se toca el disco)"""
+        with self._lock:
+            if folder in self._folders:
+                return
+        folder.mkdir(parents=True, exist_ok=True)
+        with self._lock:
+            self._folders.add(folder)
+
+    def link(self, location: str, key: str) -> bool:
+        path = self.root / key
+        # El enlace se crea aparte y sustituye a la copia de forma atómica
+        tmp_path = path.with_name(f".{path.name}.link{TEMP_SUFFIX}")
+        try:
+            os.link(location, tmp_path)
+        except OSError:
+            # Sistema de archivos sin enlaces duros: se conserva la copia
+            return False
+        commit_temp_file(tmp_path, path)
+        return True
+
+    def _delete(self, key: str) -> bool:
+        (self.root / key).unlink(missing_ok=True)
+        return True
+
+    def _exists(self, key: str) -> bool:
+        return (self.root / key).exists()
+
+    def read(self, key: str) -> bytes:
+        return (self.root / key).read_bytes()
+
+
+class MemoryStorage(StorageBackend):
+    """Destino en memoria (pruebas y benchmarks sin disco)"""
+
+    scheme = "memory"
+
+    def __init__(self):
+        super().__init__()
+        self.objects: Dict[str, bytes] = {}
+
+    def list_names(self, folder: str) -> Set[str]:
+        prefix = folder + "/"
+        return {key[len(prefix):] for key in list(self.objects)
+                if key.startswith(prefix) and "/" not in key[len(prefix):]}
+
+    def put(self, key: str, chunks: Iterable[bytes], size: int, sha256: Optional[str] = None,
+            mtime: Optional[datetime] = None) -> str:
+        data = b"".join(chunks)
+        if len(data) != size:
+            raise ValueError(f"Contenido incompleto: {len(data)} de {size} bytes")
+        self.objects[key] = data
+        return sha256 or hashlib.sha256(data).hexdigest()
+
+    def _delete(self, key: str) -> bool:
+        self.objects.pop(key, None)
+        return True
+
+    def _exists(self, key: str) -> bool:
+        return key in self.objects
+
+    def read(self, key: str) -> bytes:
+        return self.objects[key]
+
+
+def sign_v4(method: str, url: str, payload_hash: str, access_key: str, secret_key: str,
+            region: str, amz_date: Optional[str] = None, session_token: Optional[str] = None,
+            extra_headers: Optional[Dict[str, str]] = None, service: str = "s3") -> Dict[str, str]:
+    """
+    Firma una petición con AWS Signature Version 4
+
+    Args:
+        method: Método HTTP
+        url: URL completa, con la ruta y la consulta ya codificadas
+        payload_hash: SHA-256 del cuerpo en hexadecimal
+        access_key: Clave de acceso
+        secret_key: Clave secreta
+        region: Región (p. ej. us-east-1)
+        amz_date: Fecha de la firma (AAAAMMDDTHHMMSSZ, por defecto ahora)
+        session_token: Token de sesión temporal (opcional)
+        extra_headers: Otras cabeceras que se firman
+        service: Servicio de AWS
+
+    Returns:
+        Dict[str, str]: Cabeceras a enviar (firmadas y Authorization)
+    """
+    amz_date = amz_date or datetime.now(timezone.utc).strftime("%Y%m%dT%H%M%SZ")
+    parts = urlsplit(url)
+    headers = {"x-amz-date": amz_date, "x-amz-content-sha256": payload_hash}
+    if session_token:
+        headers["x-amz-security-token"] = session_token
+    headers.update(extra_headers or {})
+
+    signed = dict((name.lower(), " ".join(str(value).split())) for name, value in headers.items())
+    signed["host"] = parts.netloc
+    signed_names = ";".join(sorted(signed))
+    canonical_query = "&".join(
+        f"{quote(name, safe='-_.~')}={quote(value, safe='-_.~')}"
+        for name, value in sorted(parse_qsl(parts.query, keep_blank_values=True))
+    )
+    canonical_request = "\n".join([
+        method,
+        parts.path or "/",
+        canonical_query,
+        "".join(f"{name}:{signed[name]}\n" for name in sorted(signed)),
+        signed_names,
+        payload_hash,
+    ])
+    scope = f"{amz_date[:8]}/{region}/{service}/aws4_request"
+    string_to_sign = "\n".join([
+        "AWS4-HMAC-SHA256", amz_date, scope,
+        hashlib.sha256(canonical_request.encode("utf-8")).hexdigest(),
+    ])
+
+    key = ("AWS4" + secret_key).encode("utf-8")
+    for part in (amz_date[:8], region, service, "aws4_request"):
+        key = hmac.new(key, part.encode("utf-8"), hashlib.sha256).digest()
+    signature = hmac.new(key, string_to_sign.encode("utf-8"), hashlib.sha256).hexdigest()
+    headers["Authorization"] = (f"AWS4-HMAC-SHA256 Credential={access_key}/{scope}, "
+                                f"SignedHeaders={signed_names}, Signature={signature}")
+    return headers
+
+
+class S3Storage(StorageBackend):
+    """
+    Destino en un bucket compatible con S3 (API REST, direccionamiento por ruta)
+
+    Todas las peticiones comparten una sesión con pool de conexiones keep-alive.
+    Los objetos de hasta part_size bytes se suben con un único PUT; los mayores
+    con una subida multiparte cuyas partes se envían en paralelo (como mucho
+    upload_workers partes en vuelo por objeto, así la memoria queda acotada).
+    """
+
+    scheme = "s3"
+    # Un HEAD por adjunto al reanudar: se confía en el manifiesto
+    verify_recorded = False
+
+    def __init__(self, bucket: str, endpoint: Optional[str] = None, prefix: str = "",
+                 region: str = "us-east-1", access_key: Optional[str] = None,
+                 secret_key: Optional[str] = None, session_token: Optional[str] = None,
+                 part_size: int = 8 * 1024 * 1024, upload_workers: int = 4, pool_size: int = 10,
+                 connect_timeout: float = 30, read_timeout: float = 60):
+        """
+        Args:
+            bucket: Nombre del bucket
+            endpoint: URL del servicio (por defecto, S3 de AWS en la región)
+            prefix: Prefijo de todas las claves (p. ej. "facturas/")
+            region: Región de la firma
+            access_key: Clave de acceso (por defecto, AWS_ACCESS_KEY_ID)
+            secret_key: Clave secreta (por defecto, AWS_SECRET_ACCESS_KEY)
+            session_token: Token de sesión (por defecto, AWS_SESSION_TOKEN)
+            part_size: Tamaño de cada parte de una subida multiparte (mínimo 5 MiB)
+            upload_workers: Partes que se suben en paralelo
+            pool_size: Conexiones keep-alive máximas
+            connect_timeout: Timeout de conexión (segundos)
+            read_timeout: Timeout de lectura (segundos)
+        """
+        from .transport import pooled_session
+
+        super().__init__()
+        self.bucket = bucket
+        self.endpoint = (endpoint or f"https://s3.{region}.amazonaws.com").rstrip("/") + "/"
+        self.prefix = prefix.strip("/") + "/" if prefix.strip("/") else ""
+        self.region = region
+        self.access_key = access_key or os.environ.get("AWS_ACCESS_KEY_ID", "")
+        self.secret_key = secret_key or os.environ.get("AWS_SECRET_ACCESS_KEY", "")
+        self.session_token = session_token or os.environ.get("AWS_SESSION_TOKEN")
+        if not self.access_key or not self.secret_key:
+            raise ValueError("Faltan las credenciales de S3 (AWS_ACCESS_KEY_ID y AWS_SECRET_ACCESS_KEY)")
+        self.part_size = max(part_size, MIN_PART_SIZE)
+        self.upload_workers = max(upload_workers, 1)
+        self.timeout = (connect_timeout, read_timeout)
+        # Conexiones para las partes en vuelo y para los workers de descarga
+        self.session = pooled_session(max(pool_size, self.upload_workers))
+        self._executor = ThreadPoolExecutor(max_workers=self.upload_workers, thread_name_prefix="s3-part")
+
+    def location(self, key: str) -> str:
+        return f"s3://{self.bucket}/{self.prefix}{key}"
+
+    def _url(self, key: str = "", params: Optional[dict] = None) -> str:
+        """URL firmable de un objeto (o del bucket si key está vacía)"""
+        url = self.endpoint + quote(self.bucket, safe="")
+        if key:
+            url += "/" + quote(self.prefix + key, safe="/~")
+        if params is not None:
+            url += "?" + urlencode(sorted(params.items()), quote_via=quote, safe="~")
+        return url
+
+    def _request(self, method: str, key: str = "", params: Optional[dict] = None, data: bytes = b"",
+                 ok: tuple = (200,), payload_hash: Optional[str] = None):
+        """
+        Envía una petición firmada, reintentando fallos de conexión y 5xx
+
+        payload_hash es el SHA-256 de data si ya se conoce (no se vuelve a calcular).
+
+        Raises:
+            StorageError: Si la respuesta no está en ok tras los reintentos
+
+        Returns:
+            requests.Response: Respuesta
+        """
+        import requests
+
+        url = self._url(key, params)
+        if payload_hash is None:
+            payload_hash = hashlib.sha256(data).hexdigest() if data else EMPTY_SHA256
+        for attempt in range(S3_ATTEMPTS):
+            headers = sign_v4(method, url, payload_hash, self.access_key, self.secret_key,
+                              self.region, session_token=self.session_token)
+            try:
+                response = self.session.request(method, url, data=data or None, headers=headers,
+                                                timeout=self.timeout)
+            except (requests.ConnectionError, requests.Timeout) as e:
+                if attempt + 1 == S3_ATTEMPTS:
+                    raise StorageError(f"S3 {method} {key or self.bucket}: {e}") from e
+            else:
+                if response.status_code in ok:
+                    return response
+                if response.status_code < 500 or attempt + 1 == S3_ATTEMPTS:
+                    code = self._xml_text(response.content, "Code") or response.reason
+                    raise StorageError(f"S3 {method} {key or self.bucket}: {response.status_code} {code}")
+            time.sleep(0.5 * 2 ** attempt)
+
+    @staticmethod
+    def _xml_text(content: bytes, tag: str) -> Optional[str]:
+        """Texto del primer elemento tag de una respuesta XML (None si no hay)"""
+        try:
+            element = ET.fromstring(content).find(f".//{{*}}{tag}")
+        except ET.ParseError:
+            return None
+        return element.text if element is not None else None
+
+    def list_names(self, folder: str) -> Set[str]:
+        prefix = self.prefix + folder + "/"
+        names = set()
+        params = {"list-type": "2", "prefix": prefix, "delimiter": "/"}
+        while True:
+            root = ET.fromstring(self._request("GET", params=params).content)
+            for element in root.iterfind("{*}Contents/{*}Key"):
+                names.add(element.text[len(prefix):])
+            token = root.findtext("{*}NextContinuationToken")
+            if root.findtext("{*}IsTruncated") != "true" or not token:
+                return names
+            params["continuation-token"] = token
+
+    def put(self, key: str, chunks: Iterable[bytes], size: int, sha256: Optional[str] = None,
+            mtime: Optional[datetime] = None) -> str:
+        if size <= self.part_size:
+            data = b"".join(chunks)
+            if len(data) != size:
+                raise ValueError(f"Contenido incompleto: {len(data)} de {size} bytes")
+            # El hash del contenido es también el de la firma del PUT
+            sha256 = sha256 or hashlib.sha256(data).hexdigest()
+            self._request("PUT", key, data=data, payload_hash=sha256)
+            return sha256
+
+        digest = None if sha256 else hashlib.sha256()
+
+        upload_id = self._xml_text(self._request("POST", key, {"uploads": ""}).content, "UploadId")
+        try:
+            etags = self._upload_parts(key, upload_id, chunks, size, digest)
+            body = "".join(f"<Part><PartNumber>{number}</PartNumber><ETag>{etag}</ETag></Part>"
+                           for number, etag in enumerate(etags, 1))
+            response = self._request("POST", key, {"uploadId": upload_id},
+                                     f"<CompleteMultipartUpload>{body}</CompleteMultipartUpload>".encode("utf-8"))
+            # S3 puede devolver 200 con un error en el cuerpo
+            if self._xml_text(response.content, "Code"):
+                raise StorageError(f"S3 POST {key}: {self._xml_text(response.content, 'Code')}")
+        except Exception:
+            self._abort_upload(key, upload_id)
+            raise
+        except BaseException:
+            # Ctrl-C: no se añade otra petición bloqueante; la subida queda abierta
+            # hasta que la retire la regla AbortIncompleteMultipartUpload del bucket
+            print(f"⚠️  Subida multiparte de {key} interrumpida sin cancelar (uploadId {upload_id})")
+            raise
+        return sha256 or digest.hexdigest()
+
+    def _abort_upload(self, key: str, upload_id: str) -> None:
+        """Cancela una subida multiparte fallida sin ocultar el error original"""
+        try:
+            self._request("DELETE", key, {"uploadId": upload_id}, ok=(200, 204, 404))
+        except Exception as e:
+            print(f"⚠️  No se pudo cancelar la subida multiparte de {key} (uploadId {upload_id}): {e}")
+
+    def _upload_parts(self, key: str, upload_id: str, chunks: Iterable[bytes], size: int, digest) -> list:
+        """
+        Sube las partes en paralelo a medida que se llenan
+
+        Returns:
+            list: ETag de cada parte, en orden
+        """
+        pending = deque()
+        etags = []
+        buffer = bytearray()
+        written = 0
+
+        def submit(data: bytes) -> None:
+            # Como mucho upload_workers partes en memoria por objeto
+            if len(pending) >= self.upload_workers:
+                etags.append(pending.popleft().result())
+            number = len(etags) + len(pending) + 1
+            pending.append(self._executor.submit(self._upload_part, key, upload_id, number, data))
+
+        try:
+            for chunk in chunks:
+                written += len(chunk)
+                if digest is not None:
+                    digest.update(chunk)
+                buffer += chunk
+                while len(buffer) >= self.part_size:
+                    submit(bytes(buffer[:self.part_size]))
+                    del buffer[:self.part_size]
+            if written != size:
+                raise ValueError(f"Contenido incompleto: {written} de {size} bytes")
+            if buffer:
+                submit(bytes(buffer))
+            while pending:
+                etags.append(pending.popleft().result())
+        finally:
+            for future in pending:
+                future.cancel()
+        return etags
+
+    def _upload_part(self, key: str, upload_id: str, number: int, data: bytes) -> str:
+        """Sube una parte y devuelve su ETag"""
+        response = self._request("PUT", key, {"partNumber": str(number), "uploadId": upload_id}, data)
+        return response.headers["ETag"]
+
+    def _delete(self, key: str) -> bool:
+        self._request("DELETE", key, ok=(200, 204, 404))
+        return True
+
+    def _exists(self, key: str) -> bool:
+        return self._request("HEAD", key, ok=(200, 404)).status_code == 200
+
+    def read(self, key: str) -> bytes:
+        return self._request("GET", key).content
+
+    def close(self) -> None:
+        self._executor.shutdown(wait=True)
+        self.session.close()
+
+
+def create_storage(config) -> StorageBackend:
+    """
+    Crea el destino configurado en [DOWNLOADS] storage_backend
+
+    Args:
+        config: ConfigManager o ConfigSnapshot
+
+    Returns:
+        StorageBackend: Destino de los adjuntos
+    """
+    if config.storage_backend == "memory":
+        return MemoryStorage()
+    if config.storage_backend == "s3":
+        return S3Storage(
+            config.s3_bucket,
+            endpoint=config.s3_endpoint,
+            prefix=config.s3_prefix,
+            region=config.s3_region,
+            part_size=config.s3_part_size_mb * 1024 * 1024,
+            upload_workers=config.s3_upload_workers,
+            pool_size=config.http_pool_size or config.max_concurrent_requests,
+            connect_timeout=config.connection_timeout,
+            read_timeout=config.read_timeout,
+        )
+    return LocalStorage(config.download_folder)
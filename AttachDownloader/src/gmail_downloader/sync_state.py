@@ -0,0 +1,71 @@
+"""
+AttachDownloader - Módulo de estado de sincronización
+Guarda el último historyId procesado por cuenta para el modo incremental
+"""
+
+import json
+import os
+from pathlib import Path
+from typing import Dict, Optional
+
+
+class SyncStateStore:
+    """Almacén del último historyId sincronizado de cada cuenta"""
+
+    def __init__(self, state_file: Path):
+        """
+        Inicializa el almacén de estado
+
+        Args:
+            state_file: Ruta al archivo JSON de estado
+        """
+        self.state_file = Path(state_file)
+
+    def get_history_id(self, account: str) -> Optional[str]:
+        """
+        Obtiene el último historyId guardado para una cuenta
+
+        Args:
+            account: Dirección de correo de la cuenta
+
+        Returns:
+            Optional[str]: historyId o None si la cuenta nunca se ha sincronizado
+        """
+        entry = self._load().get(account)
+        return str(entry["history_id"]) if entry and entry.get("history_id") else None
+
+    def set_history_id(self, account: str, history_id: str, synced_at: str) -> None:
+        """
+        Guarda el historyId de una cuenta tras una ejecución correcta
+
+        Args:
+            account: Dirección de correo de la cuenta
+            history_id: historyId del buzón al inicio de la ejecución
+            synced_at: Fecha de la sincronización (ISO 8601)
+        """
+        state = self._load()
+        state[account] = {"history_id": str(history_id), "synced_at": synced_at}
+
+        # Escritura atómica para no corromper el estado si se interrumpe
+        self.state_file.parent.mkdir(parents=True, exist_ok=True)
+        tmp_file = self.state_file.with_name(self.state_file.name + ".tmp")
+        with open(tmp_file, "w", encoding="utf-8") as f:
+            json.dump(state, f, indent=2, ensure_ascii=False)
+        os.replace(tmp_file, self.state_file)
+
+    def _load(self) -> Dict[str, dict]:
+        """
+        Carga el estado desde disco
+
+        Returns:
+            Dict[str, dict]: Estado por cuenta (vacío si no existe o está dañado)
+        """
+        if not self.state_file.exists():
+            return {}
+        try:
+            with open(self.state_file, encoding="utf-8") as f:
+                state = json.load(f)
+            return state if isinstance(state, dict) else {}
+        except (OSError, ValueError) as e:
+            print(f"⚠️ Estado de sincronización ilegible ({self.state_file}): {e}")
+            return {}
@@ -0,0 +1,146 @@
+"""
+AttachDownloader - Módulo de transporte HTTP
+Transportes para los clientes de Gmail API: una sesión requests con pool de
+conexiones keep-alive compartida por todos los hilos, o httplib2 (una conexión
+por cliente, como el cliente por defecto de googleapiclient)
+"""
+
+import os
+from typing import Optional, Tuple
+from urllib.request import getproxies
+
+
+# Transportes disponibles ([ADVANCED] http_transport)
+TRANSPORTS = ("requests", "httplib2")
+
+
+def pooled_session(pool_size: int = 10, session=None):
+    """
+    Prepara una sesión requests con un pool de conexiones keep-alive acotado
+
+    El pool se bloquea al llenarse en vez de abrir conexiones de más: nunca
+    hay más de pool_size conexiones abiertas por host. Sin reintentos de
+    urllib3 (los gestiona quien hace las peticiones).
+
+    Args:
+        pool_size: Conexiones keep-alive máximas por host
+        session: Sesión a preparar (por defecto, una requests.Session nueva)
+
+    Returns:
+        requests.Session: La sesión preparada
+    """
+    import requests
+    from requests.adapters import HTTPAdapter
+
+    if session is None:
+        session = requests.Session()
+    adapter = HTTPAdapter(pool_connections=1, pool_maxsize=max(pool_size, 1),
+                          max_retries=0, pool_block=True)
+    session.mount("https://", adapter)
+    session.mount("http://", adapter)
+    if not getproxies():
+        # Sin proxies en el entorno no hace falta releerlo (proxies, .netrc,
+        # CA) en cada petición, que cuesta más que la propia petición en local
+        session.verify = os.environ.get("REQUESTS_CA_BUNDLE") or os.environ.get("CURL_CA_BUNDLE") or True
+        session.trust_env = False
+    return session
+
+
+class PooledHttp:
+    """
+    Adaptador con la interfaz de httplib2.Http sobre una sesión requests
+
+    googleapiclient solo necesita request(uri, method, body, headers) devolviendo
+    (respuesta, contenido). La sesión (AuthorizedSession si hay credenciales)
+    es thread-safe y reutiliza conexiones HTTP/1.1 del pool, de modo que los
+    workers no repiten el handshake TLS. El pool se bloquea al llenarse en vez
+    de abrir conexiones de más: nunca hay más de pool_size conexiones abiertas.
+    """
+
+    def __init__(self, credentials=None, pool_size: int = 10,
+                 connect_timeout: float = 30, read_timeout: float = 60):
+        """
+        Crea la sesión y su pool de conexiones
+
+        Args:
+            credentials: Credenciales de Google (None = sin autenticación)
+            pool_size: Conexiones keep-alive máximas por host
+            connect_timeout: Timeout de conexión (segundos)
+            read_timeout: Timeout de lectura de cada respuesta (segundos)
+        """
+        import httplib2
+        import requests
+
+        if credentials is not None:
+            from google.auth.transport.requests import AuthorizedSession
+            session = AuthorizedSession(credentials)
+        else:
+            session = None
+        self.session = pooled_session(pool_size, session)
+        self.session.headers["Accept-Encoding"] = "gzip, deflate"
+        # googleapiclient lo usa para autenticar las partes de un lote y refrescar tras un 401
+        self.credentials = credentials
+        self.timeout: Tuple[float, float] = (connect_timeout, read_timeout)
+        self._requests = requests
+        self._response_class = httplib2.Response
+
+    def request(self, uri: str, method: str = "GET", body=None, headers: Optional[dict] = None,
+                redirections: int = 5, connection_type=None):
+        """
+        Ejecuta una petición con la interfaz de httplib2.Http.request
+
+        Raises:
+            TimeoutError: Si vence el timeout de conexión o de lectura
+            ConnectionError: Si falla la conexión (reintentables por el planificador)
+
+        Returns:
+            Tuple[httplib2.Response, bytes]: Respuesta y contenido ya descomprimido
+        """
+        try:
+            response = self.session.request(method, uri, data=body, headers=headers,
+                                            timeout=self.timeout, allow_redirects=redirections > 0)
+        except self._requests.Timeout as e:
+            raise TimeoutError(str(e)) from e
+        except self._requests.ConnectionError as e:
+            raise ConnectionError(str(e)) from e
+
+        info = {key.lower(): value for key, value in response.headers.items()}
+        # requests ya ha descomprimido el cuerpo (gzip)
+        info.pop("content-encoding", None)
+        info["status"] = str(response.status_code)
+        resp = self._response_class(info)
+        resp.reason = response.reason
+        return resp, response.content
+
+    def close(self) -> None:
+        """Cierra las conexiones del pool"""
+        self.session.close()
+
+
+def create_transport(name: str, credentials=None, pool_size: int = 10,
+                     connect_timeout: float = 30, read_timeout: float = 60):
+    """
+    Crea el transporte HTTP de un cliente de Gmail API
+
+    Args:
+        name: "requests" (pool compartido, thread-safe) o "httplib2" (uno por hilo)
+        credentials: Credenciales de Google (None = sin autenticación)
+        pool_size: Conexiones del pool (solo requests)
+        connect_timeout: Timeout de conexión (segundos)
+        read_timeout: Timeout de lectura (solo requests; httplib2 usa connect_timeout para todo)
+
+    Returns:
+        Objeto con la interfaz de httplib2.Http
+    """
+    if name not in TRANSPORTS:
+        raise ValueError(f"Transporte HTTP desconocido: {name} (usa {', '.join(TRANSPORTS)})")
+    if name == "requests":
+        return PooledHttp(credentials, pool_size, connect_timeout, read_timeout)
+
+    import httplib2
+
+    http = httplib2.Http(timeout=connect_timeout)
+    if credentials is not None:
+        from google_auth_httplib2 import AuthorizedHttp
+        http = AuthorizedHttp(credentials, http=http)
+    return http
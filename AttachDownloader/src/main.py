@@ -6,19 +6,108 @@ AttachDownloader - Herramienta profesional para descargar y organizar adjuntos d
 Estructura inteligente: <Año>/<Trimestre>/<Remitente>/
 """
 
+import argparse
+import signal
 import sys
 from pathlib import Path
 
 # Añadir el directorio src al path
 sys.path.insert(0, str(Path(__file__).parent))
 
-from gmail_downloader.auth import GmailAuthenticator
-from gmail_downloader.downloader import GmailAttachmentDownloader
+# Las bibliotecas de Google (auth, downloader) se importan en main() cuando
+# hacen falta: --help o un error de configuración no pagan su carga
 from gmail_downloader.config import ConfigManager
+from gmail_downloader.plan import DownloadPlan
+from gmail_downloader.profiling import PROFILE_MODES, profile_run
+
+
+# Archivo del plan de descarga si --plan no indica otro
+DEFAULT_PLAN_FILE = "logs/download_plan.json"
+
+
+def parse_args(argv=None) -> argparse.Namespace:
+    """
+    Parsea los argumentos de línea de comandos
+
+    Args:
+        argv: Argumentos (por defecto, los de sys.argv)
+
+    Returns:
+        argparse.Namespace: Opciones de ejecución
+    """
+    parser = argparse.ArgumentParser(
+        description="Descarga y organiza adjuntos de Gmail en <Año>/<Trimestre>/<Remitente>/"
+    )
+    parser.add_argument(
+        "--resume",
+        action="store_true",
+        help="continuar una ejecución interrumpida desde su diario",
+    )
+    parser.add_argument(
+        "--profile",
+        nargs="?",
+        const="cprofile",
+        choices=PROFILE_MODES,
+        help="perfilar la descarga: cprofile (por defecto; .prof y top de funciones, "
+             "solo el hilo principal) o sample (muestreo de todos los hilos, pilas "
+             "colapsadas para flamegraph). Informes en logs/",
+    )
+    parser.add_argument(
+        "--trace-memory",
+        action="store_true",
+        help="trazar asignaciones de memoria con tracemalloc (top de líneas y pico en logs/)",
+    )
+    mode = parser.add_mutually_exclusive_group()
+    mode.add_argument(
+        "--plan",
+        nargs="?",
+        const=DEFAULT_PLAN_FILE,
+        metavar="ARCHIVO",
+        help="calcular qué se descargaría, sin descargar nada, y guardarlo en "
+             f"ARCHIVO .json o .csv (por defecto {DEFAULT_PLAN_FILE})",
+    )
+    mode.add_argument(
+        "--from-plan",
+        metavar="ARCHIVO",
+        help="descargar exactamente los adjuntos de un plan generado con --plan",
+    )
+    return parser.parse_args(argv)
+
+
+def print_plan(plan: DownloadPlan, plan_file: str) -> None:
+    """
+    Muestra el resumen de un plan de descarga
+
+    Args:
+        plan: Plan calculado
+        plan_file: Archivo donde se ha guardado
+    """
+    print("\n" + "=" * 70)
+    print("📋 PLAN DE DESCARGA (no se ha descargado nada):")
+    print("=" * 70)
+    for folder in plan.folders():
+        print(f"   📁 {folder['folder']}: {folder['attachments']} adjuntos, "
+              f"{folder['bytes'] / 1024 / 1024:.1f} MB")
+    print("-" * 70)
+    print(f"📧 Correos revisados: {plan.messages_scanned}")
+    print(f"📎 Adjuntos previstos: {len(plan.attachments)} ({plan.total_bytes / 1024 / 1024:.1f} MB)")
+    print(f"🎟️  Cuota de una ejecución normal: {plan.quota_units} unidades "
+          f"({plan.execution_units} ejecutando el plan)")
+    print(f"💾 Plan guardado en {plan_file}")
+    print(f"   Para ejecutarlo: python src/main.py --from-plan {plan_file}")
+    print("=" * 70)
+
+
+def _raise_keyboard_interrupt(signum, frame):
+    """Convierte SIGTERM en KeyboardInterrupt para guardar el progreso antes de salir"""
+    raise KeyboardInterrupt
 
 
 def main():
     """Función principal"""
+    args = parse_args()
+    signal.signal(signal.SIGTERM, _raise_keyboard_interrupt)
+
     print("=" * 90)
     print("🚀 AttachDownloader - Descargador inteligente de adjuntos de Gmail")
     print("     NOTA IMPORTAMTE:")
@@ -26,21 +115,37 @@ def main():
     print("     Para autorizar su uso a otra persona u empresa, contacta con kromersoft@gmail.com")
     print("=" * 90)
 
+    authenticator = None
     try:
         # Paso 0: Cargar configuración
         print("\n⚙️  Cargando configuración...")
-        config = ConfigManager()
+        try:
+            config = ConfigManager()
+        except ValueError as e:
+            print(f"\n❌ Error en config/config.cfg: {e}")
+            sys.exit(2)
         config.print_summary()
         
-        # Paso 1: Autenticación
-        print("📝 Autenticando con Gmail API...")
-        authenticator = GmailAuthenticator(config)
-        credentials = authenticator.authenticate()
-        print("✅ Autenticación exitosa")
+        # Paso 1: Autenticación (no se envían credenciales a un endpoint alternativo)
+        if config.api_endpoint:
+            print(f"🧪 Usando Gmail API en {config.api_endpoint} (sin autenticación)")
+            credentials = None
+        else:
+            from gmail_downloader.auth import GmailAuthenticator
+
+            print("📝 Autenticando con Gmail API...")
+            authenticator = GmailAuthenticator(config)
+            credentials = authenticator.authenticate()
+            print("✅ Autenticación exitosa")
 
         # Paso 2: Descargar adjuntos
         print("\n📥 Iniciando descarga de adjuntos...")
-        print(f"   📂 Carpeta destino: {config.download_folder}")
+        if config.storage_backend == "s3":
+            print(f"   ☁️  Destino: s3://{config.s3_bucket}/{config.s3_prefix} ({config.s3_endpoint or config.s3_region})")
+        elif config.storage_backend == "memory":
+            print("   🧪 Destino: memoria (no se guarda nada en disco)")
+        else:
+            print(f"   📂 Carpeta destino: {config.download_folder}")
         print(f"   📋 Estructura: {config.folder_structure}")
         print(f"   🔍 Filtros: {config.white_list if config.white_list else 'ninguno'}")
         
@@ -49,17 +154,38 @@ def main():
             date_range = f"{config.date_from or '∞'} → {config.date_to or '∞'}"
             print(f"   📅 Rango de fechas: {date_range}")
         
+        from gmail_downloader.downloader import GmailAttachmentDownloader
+
         downloader = GmailAttachmentDownloader(credentials, config)
-        stats = downloader.download_all_attachments()
+        try:
+            with profile_run(args.profile, args.trace_memory):
+                if args.plan:
+                    plan = downloader.build_plan()
+                    plan.save(Path(args.plan))
+                    print_plan(plan, args.plan)
+                    return
+                plan = DownloadPlan.load(Path(args.from_plan)) if args.from_plan else None
+                stats = downloader.download_all_attachments(resume=args.resume, plan=plan)
+        finally:
+            downloader.close()
 
         # Paso 3: Mostrar resultados
         print("\n" + "=" * 70)
         print("📊 ESTADÍSTICAS DE DESCARGA:")
         print("=" * 70)
         print(f"📧 Total de correos procesados: {stats['total_emails']}")
+        print(f"🔎 Correos descartados por la consulta: {stats.get('emails_excluded_by_query', 0)}")
         print(f"📎 Correos con adjuntos: {stats['emails_with_attachments']}")
         print(f"✅ Archivos descargados: {stats['files_downloaded']}")
         print(f"⏭️  Archivos filtrados: {stats.get('files_filtered', 0)}")
+        print(f"♻️  Archivos ya descargados (omitidos): {stats.get('files_skipped', 0)}")
+        print(f"🔗 Duplicados por contenido: {stats.get('files_deduplicated', 0)} "
+              f"({stats.get('bytes_deduplicated', 0) / 1024 / 1024:.1f} MB ahorrados)")
+        print(f"🔁 Reintentos de la API: {stats.get('api_retries', 0)} "
+              f"(limitaciones de cuota: {stats.get('api_throttled', 0)})")
+        print(f"💽 Datos descargados: {stats.get('bytes_downloaded', 0) / 1024 / 1024:.1f} MB")
+        if config.metrics_summary_file:
+            print(f"📈 Métricas detalladas: {config.metrics_summary_file}")
         print("=" * 70)
         print("✨ ¡Descarga completada con éxito!")
 
@@ -74,12 +200,21 @@ def main():
         print("   → Ubicación: AttachDownloader/config/credentials.json")
         print("\n6. Edita config/config.cfg con tus preferencias de filtrado")
 
+    except KeyboardInterrupt:
+        print("\n⏸️  Ejecución interrumpida. Para continuar donde se quedó:")
+        print("   python src/main.py --resume")
+        sys.exit(130)
+
     except Exception as e:
         print(f"\n❌ Error inesperado: {e}")
         import traceback
         traceback.print_exc()
         sys.exit(1)
 
+    finally:
+        if authenticator:
+            authenticator.close()
+
 
 if __name__ == "__main__":
     main()
\ No newline at end of file